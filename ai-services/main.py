@@ -3,11 +3,16 @@ AI Services - Main FastAPI application
 Provides product recognition and profitability analysis
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import logging
+import os
+import time
 import structlog
 from datetime import datetime
 
@@ -17,6 +22,7 @@ from services.palette_analyzer import PaletteAnalyzer
 from services.cache_manager import cache_manager
 from services.price_collector import PriceCollector, PriceData
 from services.price_analyzer import PriceAnalyzer
+from services.palette_sharding import PaletteShardPool, analyze_product_batch
 
 # Configure structured logging
 structlog.configure(
@@ -55,11 +61,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counters reported by /ai/cache/stats
+request_metrics = {"total_requests": 0, "total_response_time": 0.0}
+
+@app.middleware("http")
+async def track_request_metrics(request: Request, call_next):
+    """Count requests and accumulate response time"""
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    request_metrics["total_requests"] += 1
+    request_metrics["total_response_time"] += time.perf_counter() - start_time
+    return response
+
 # Initialize AI services
-product_normalizer = ProductNormalizer()
+product_normalizer = ProductNormalizer(
+    fast_mode=os.getenv("NORMALIZER_FAST_MODE", "false").lower() == "true"
+)
+normalizer_batch_size = int(os.getenv("NORMALIZER_BATCH_SIZE", "256"))
+normalizer_n_process = int(os.getenv("NORMALIZER_N_PROCESS", "1"))
 profitability_analyzer = ProfitabilityAnalyzer()
-palette_analyzer = PaletteAnalyzer()
-price_collector = PriceCollector()
+# Bounded executor for CPU-bound analysis, keeps the event loop free (0 runs inline)
+analysis_executor_workers = int(os.getenv("ANALYSIS_EXECUTOR_WORKERS", "4"))
+analysis_executor = (
+    ThreadPoolExecutor(max_workers=analysis_executor_workers, thread_name_prefix="analysis")
+    if analysis_executor_workers > 0 else None
+)
+palette_shard_pool = PaletteShardPool(
+    max_workers=int(os.getenv("PALETTE_SHARD_WORKERS", "0")) or None,
+    shard_size=int(os.getenv("PALETTE_SHARD_SIZE", "500")),
+    threshold=int(os.getenv("PALETTE_SHARD_THRESHOLD", "2000")),
+    fast_mode=product_normalizer.fast_mode,
+    profitability_analyzer=profitability_analyzer
+)
+palette_analyzer = PaletteAnalyzer(
+    max_open_palettes=int(os.getenv("PALETTE_STATE_MAX_ENTRIES", "128")),
+    palette_ttl=float(os.getenv("PALETTE_STATE_TTL", "1800")),
+    max_open_lines=int(os.getenv("PALETTE_STATE_MAX_LINES", "200000")),
+    columnar_threshold=int(os.getenv("PALETTE_COLUMNAR_THRESHOLD", "200"))
+)
+price_collector = PriceCollector(
+    max_connections=int(os.getenv("PRICE_MAX_CONNECTIONS", "64")),
+    max_connections_per_host=int(os.getenv("PRICE_MAX_CONNECTIONS_PER_HOST", "8")),
+    keepalive_timeout=float(os.getenv("PRICE_KEEPALIVE_TIMEOUT", "30")),
+    dns_cache_ttl=int(os.getenv("PRICE_DNS_CACHE_TTL", "300")),
+    requests_per_second=float(os.getenv("PRICE_REQUESTS_PER_SECOND", "2")),
+    burst=int(os.getenv("PRICE_RATE_BURST", "4")),
+    parse_workers=int(os.getenv("PRICE_PARSE_WORKERS", "2")),
+    parse_processes=os.getenv("PRICE_PARSE_PROCESSES", "false").lower() == "true",
+    max_page_bytes=int(os.getenv("PRICE_MAX_PAGE_BYTES", str(3 * 1024 * 1024))),
+    stream_chunk_bytes=int(os.getenv("PRICE_STREAM_CHUNK_BYTES", str(64 * 1024))),
+    cache_ttl=int(os.getenv("PRICE_CACHE_TTL", "900")),
+    stale_ttl=int(os.getenv("PRICE_CACHE_STALE_TTL", "3600")),
+    negative_ttl=int(os.getenv("PRICE_CACHE_NEGATIVE_TTL", "60")),
+    request_timeout=float(os.getenv("PRICE_REQUEST_TIMEOUT", "10")),
+    max_retries=int(os.getenv("PRICE_MAX_RETRIES", "2")),
+    retry_backoff=float(os.getenv("PRICE_RETRY_BACKOFF", "0.2")),
+    breaker_failures=int(os.getenv("PRICE_BREAKER_FAILURES", "5")),
+    breaker_reset=float(os.getenv("PRICE_BREAKER_RESET", "30")),
+    hedge_delay=float(os.getenv("PRICE_HEDGE_DELAY", "0")),
+    scrape_deadline=float(os.getenv("PRICE_SCRAPE_DEADLINE", "15"))
+)
 price_analyzer = PriceAnalyzer()
 
 # Pydantic models
@@ -80,6 +141,11 @@ class ProductResponse(BaseModel):
 
 class PaletteRequest(BaseModel):
     products: List[str]
+    keep_open: bool = False  # Keep the palette for delta updates
+
+class PaletteDeltaRequest(BaseModel):
+    added_products: List[str] = []
+    removed_products: List[str] = []
 
 class CollectPricesRequest(BaseModel):
     products: List[str]
@@ -97,6 +163,77 @@ class PaletteResponse(BaseModel):
     risk_assessment: str
     estimated_roi: float
     product_analyses: List[ProductResponse]
+    analysis_id: Optional[str] = None
+
+async def run_analysis(func: Callable, *args, **kwargs) -> Any:
+    """Run CPU-bound analysis in the analysis executor"""
+    if analysis_executor is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(analysis_executor, functools.partial(func, *args, **kwargs))
+
+def analyze_product(product_name: str, description: str = "") -> ProductResponse:
+    """Normalize and score a single product"""
+    normalized = product_normalizer.normalize_product(product_name, description)
+    profitability = profitability_analyzer.analyze_product(
+        normalized["brand"],
+        normalized["category"],
+        normalized["model"]
+    )
+    return build_product_response(product_name, normalized, profitability)
+
+def build_product_response(product_name: str, normalized: Dict[str, Any],
+                           profitability: Dict[str, Any]) -> ProductResponse:
+    """Combine normalization and profitability results into a response item"""
+    return ProductResponse(
+        original_name=product_name,
+        normalized_name=normalized["normalized_name"],
+        brand=normalized["brand"],
+        model=normalized["model"],
+        category=normalized["category"],
+        profitability_score=profitability["score"],
+        risk_level=profitability["risk_level"],
+        confidence=normalized["confidence"],
+        recommendation=profitability["recommendation"]
+    )
+
+def analyze_products(product_names: List[str]) -> List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """Normalize and score products in this process, None where analysis failed"""
+    return analyze_product_batch(
+        product_normalizer,
+        profitability_analyzer,
+        product_names,
+        batch_size=normalizer_batch_size,
+        n_process=normalizer_n_process
+    )
+
+async def analyze_palette_products(product_names: List[str]) -> List[ProductResponse]:
+    """Analyze palette lines, sharding large manifests across worker processes"""
+    if palette_shard_pool.should_shard(len(product_names)):
+        analyzed_products = await palette_shard_pool.analyze_products(product_names)
+    else:
+        analyzed_products = await run_analysis(analyze_products, product_names)
+    
+    # Merge results in palette order, skipping products that failed
+    return [
+        build_product_response(product_name, *analyzed)
+        for product_name, analyzed in zip(product_names, analyzed_products)
+        if analyzed is not None
+    ]
+
+def build_palette_response(palette_analysis: Dict[str, Any], product_analyses: List[ProductResponse],
+                           analysis_id: Optional[str]) -> PaletteResponse:
+    """Combine palette aggregates and product results into a response"""
+    return PaletteResponse(
+        average_profitability=palette_analysis["average_profitability"],
+        high_risk_count=palette_analysis["high_risk_count"],
+        recommended_categories=palette_analysis["recommended_categories"],
+        buy_recommendation=palette_analysis["buy_recommendation"],
+        risk_assessment=palette_analysis["risk_assessment"],
+        estimated_roi=palette_analysis["estimated_roi"],
+        product_analyses=product_analyses,
+        analysis_id=analysis_id
+    )
 
 # API Endpoints
 @app.get("/health")
@@ -112,32 +249,13 @@ async def normalize_product(request: ProductRequest):
     try:
         logger.info("Normalizing product", product_name=request.name)
         
-        # Normalize product
-        normalized = product_normalizer.normalize_product(request.name, request.description)
-        
-        # Analyze profitability
-        profitability = profitability_analyzer.analyze_product(
-            normalized["brand"],
-            normalized["category"],
-            normalized["model"]
-        )
-        
-        response = ProductResponse(
-            original_name=request.name,
-            normalized_name=normalized["normalized_name"],
-            brand=normalized["brand"],
-            model=normalized["model"],
-            category=normalized["category"],
-            profitability_score=profitability["score"],
-            risk_level=profitability["risk_level"],
-            confidence=normalized["confidence"],
-            recommendation=profitability["recommendation"]
-        )
+        # Normalize product and analyze profitability off the event loop
+        response = await run_analysis(analyze_product, request.name, request.description)
         
         logger.info("Product normalized successfully", 
                    original_name=request.name,
-                   normalized_name=normalized["normalized_name"],
-                   profitability_score=profitability["score"])
+                   normalized_name=response.normalized_name,
+                   profitability_score=response.profitability_score)
         
         return response
         
@@ -156,45 +274,20 @@ async def analyze_palette(request: PaletteRequest, background_tasks: BackgroundT
         logger.info("Analyzing palette", product_count=len(request.products))
         
         # Analyze each product
-        product_analyses = []
-        for product_name in request.products:
-            try:
-                normalized = product_normalizer.normalize_product(product_name)
-                profitability = profitability_analyzer.analyze_product(
-                    normalized["brand"],
-                    normalized["category"],
-                    normalized["model"]
-                )
-                
-                product_analyses.append(ProductResponse(
-                    original_name=product_name,
-                    normalized_name=normalized["normalized_name"],
-                    brand=normalized["brand"],
-                    model=normalized["model"],
-                    category=normalized["category"],
-                    profitability_score=profitability["score"],
-                    risk_level=profitability["risk_level"],
-                    confidence=normalized["confidence"],
-                    recommendation=profitability["recommendation"]
-                ))
-            except Exception as e:
-                logger.warning("Error analyzing product in palette", 
-                              product_name=product_name, 
-                              error=str(e))
-                # Continue with other products
-        
-        # Analyze entire palette
-        palette_analysis = palette_analyzer.analyze_palette(product_analyses)
-        
-        response = PaletteResponse(
-            average_profitability=palette_analysis["average_profitability"],
-            high_risk_count=palette_analysis["high_risk_count"],
-            recommended_categories=palette_analysis["recommended_categories"],
-            buy_recommendation=palette_analysis["buy_recommendation"],
-            risk_assessment=palette_analysis["risk_assessment"],
-            estimated_roi=palette_analysis["estimated_roi"],
-            product_analyses=product_analyses
-        )
+        product_analyses = await analyze_palette_products(request.products)
+        
+        # Analyze entire palette (the analyzer works on plain dicts)
+        product_dicts = [analysis.model_dump() for analysis in product_analyses]
+        if request.keep_open:
+            # Keep the palette open for add/remove deltas, from the same aggregate
+            palette_analysis, analysis_id = await run_analysis(
+                palette_analyzer.analyze_and_open_palette, product_dicts
+            )
+        else:
+            palette_analysis = await run_analysis(palette_analyzer.analyze_palette, product_dicts)
+            analysis_id = None
+        
+        response = build_palette_response(palette_analysis, product_analyses, analysis_id)
         
         # Log analysis in background for learning
         background_tasks.add_task(
@@ -217,6 +310,53 @@ async def analyze_palette(request: PaletteRequest, background_tasks: BackgroundT
                     error=str(e))
         raise HTTPException(status_code=500, detail=f"Error analyzing palette: {str(e)}")
 
+@app.post("/ai/analyze-palette/{analysis_id}/delta", response_model=PaletteResponse)
+async def update_palette(analysis_id: str, request: PaletteDeltaRequest):
+    """
+    Add and remove lines of an analyzed palette without resubmitting it
+    """
+    try:
+        logger.info("Updating palette",
+                   analysis_id=analysis_id,
+                   added_count=len(request.added_products),
+                   removed_count=len(request.removed_products))
+        
+        # Only added lines need product analysis
+        added_analyses = []
+        if request.added_products:
+            added_analyses = await analyze_palette_products(request.added_products)
+        
+        update = await run_analysis(
+            palette_analyzer.apply_palette_delta,
+            analysis_id,
+            [analysis.model_dump() for analysis in added_analyses],
+            request.removed_products
+        )
+        if update is None:
+            raise HTTPException(status_code=404, detail="Palette analysis not found or expired, resubmit the palette")
+        
+        palette_analysis, product_dicts = update
+        return build_palette_response(
+            palette_analysis,
+            [ProductResponse(**product) for product in product_dicts],
+            analysis_id
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error updating palette",
+                    analysis_id=analysis_id,
+                    error=str(e))
+        raise HTTPException(status_code=500, detail=f"Error updating palette: {str(e)}")
+
+@app.delete("/ai/analyze-palette/{analysis_id}")
+async def close_palette(analysis_id: str):
+    """Release an analyzed palette kept for deltas"""
+    if not palette_analyzer.close_palette(analysis_id):
+        raise HTTPException(status_code=404, detail="Palette analysis not found or expired")
+    return {"message": "Palette analysis released"}
+
 @app.get("/ai/categories")
 async def get_categories():
     """Get available product categories"""
@@ -242,12 +382,25 @@ async def get_cache_stats():
     """Get cache statistics and performance metrics"""
     try:
         stats = cache_manager.get_stats()
+        total_requests = request_metrics["total_requests"]
+        average_response_time = (
+            request_metrics["total_response_time"] / total_requests if total_requests else 0.0
+        )
         return {
             "cache_stats": stats,
             "performance": {
-                "cache_hit_rate": "N/A",  # Would need to track hits/misses
-                "average_response_time": "N/A",  # Would need timing
-                "total_requests": "N/A"
+                "cache_hit_rate": round(stats["hit_rate"], 1),
+                "average_response_time": round(average_response_time, 4),
+                "total_requests": total_requests,
+                "coalesced_computations": (
+                    product_normalizer.in_flight.coalesced
+                    + palette_analyzer.in_flight.coalesced
+                    + price_collector.in_flight.coalesced
+                ),
+                "source_rate_limits": price_collector.rate_limiter.get_stats(),
+                "price_pipeline": price_collector.get_pipeline_stats(),
+                "price_cache": price_collector.get_cache_stats(),
+                "source_resilience": price_collector.get_resilience_stats()
             }
         }
     except Exception as e:
@@ -292,7 +445,8 @@ async def collect_prices_endpoint(request: CollectPricesRequest):
                     "timestamp": p.timestamp.isoformat(),
                     "condition": p.condition,
                     "seller_rating": p.seller_rating,
-                    "availability": p.availability
+                    "availability": p.availability,
+                    "title": p.title
                 }
                 for p in prices
             ]
@@ -331,7 +485,8 @@ async def analyze_prices_endpoint(request: AnalyzePricesRequest):
                 timestamp=datetime.fromisoformat(price_dict["timestamp"]),
                 condition=price_dict.get("condition", "new"),
                 seller_rating=price_dict.get("seller_rating"),
-                availability=price_dict.get("availability", True)
+                availability=price_dict.get("availability", True),
+                title=price_dict.get("title")
             )
             prices.append(price_data)
         
@@ -399,6 +554,24 @@ async def get_market_summary(products: str = ""):
         logger.error("Error generating market summary", error=str(e))
         raise HTTPException(status_code=500, detail=f"Error generating market summary: {str(e)}")
 
+@app.on_event("startup")
+async def warm_load_cache():
+    """Preload persisted cache entries so a restart does not start cold"""
+    cache_manager.warm_load()
+
+@app.on_event("startup")
+async def open_http_session():
+    """Open the pooled HTTP session used for price collection"""
+    await price_collector.start()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    """Release worker processes, threads and HTTP connections on shutdown"""
+    await price_collector.close()
+    palette_shard_pool.shutdown()
+    if analysis_executor is not None:
+        analysis_executor.shutdown(wait=False)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
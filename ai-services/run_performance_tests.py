@@ -22,7 +22,7 @@ def run_performance_tests():
         result = subprocess.run([
             sys.executable, "-m", "pytest", 
             "tests/test_performance.py", 
-            "-v", "--tb=short"
+            "-v", "--tb=short", "--runslow"
         ], capture_output=True, text=True, cwd=Path(__file__).parent)
         
         test_time = time.time() - start_time
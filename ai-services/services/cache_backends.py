@@ -0,0 +1,965 @@
+"""
+Cache Backends
+Storage implementations behind CacheManager: in-process memory, Redis, SQLite and two-tier
+"""
+
+import heapq
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional, Dict, List, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+# Serialized values above this size are zlib-compressed before storing
+COMPRESS_THRESHOLD = 1024
+
+def dump_value(value: Any) -> bytes:
+    """Serialize to pickle, compressing large values (first byte flags compression)"""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data)
+    return b"p" + data
+
+def load_value(data: bytes) -> Any:
+    """Deserialize a value written by dump_value"""
+    if data[:1] == b"z":
+        return pickle.loads(zlib.decompress(data[1:]))
+    return pickle.loads(data[1:])
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes"""
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value))
+
+    return size
+
+class CacheBackend:
+    """Interface for cache storage backends"""
+
+    name = "base"
+
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """Get value, None if missing or expired"""
+        raise NotImplementedError
+
+    def get_many(self, keys: List[str], namespace: str = "default") -> Dict[str, Any]:
+        """Get several values at once, only found keys are returned"""
+        results = {}
+        for key in keys:
+            value = self.get(key, namespace)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def get_many_with_ttl(self, keys: List[str], namespace: str = "default") -> Dict[str, Tuple[Any, Optional[float]]]:
+        """
+        Get several values with the seconds each has left to live
+
+        Returns:
+            (value, remaining seconds) per found key, remaining is None if unknown
+        """
+        return {key: (value, None) for key, value in self.get_many(keys, namespace).items()}
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "default") -> None:
+        """Store value for ttl seconds"""
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, Any], ttl: float, namespace: str = "default") -> None:
+        """Store several values with the same ttl"""
+        for key, value in items.items():
+            self.set(key, value, ttl, namespace)
+
+    def delete(self, key: str, namespace: str = "default") -> None:
+        """Remove value"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Remove all values"""
+        raise NotImplementedError
+
+    def load_entries(self, limit: Optional[int] = None) -> List[Tuple[str, str, Any, float]]:
+        """
+        Read live entries from persistent storage, most recently written first
+
+        Returns:
+            (namespace, key, value, expires_at) tuples; empty for non-persistent backends
+        """
+        return []
+
+    def warm_load(self, limit: Optional[int] = None) -> int:
+        """Preload entries into process memory at startup, returns the number loaded"""
+        return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get backend statistics
+
+        Returns:
+            Dict with total_entries, max_size, average_age_seconds and
+            per-namespace resident counters under "namespaces"
+        """
+        raise NotImplementedError
+
+class CacheEntry:
+    """Cached value with its expiry metadata"""
+    __slots__ = ("value", "expires_at", "created_at", "namespace", "size")
+
+    def __init__(self, value: Any, expires_at: float, created_at: float,
+                 namespace: str = "default", size: int = 0):
+        self.value = value
+        self.expires_at = expires_at
+        self.created_at = created_at
+        self.namespace = namespace
+        self.size = size
+
+class MemoryCacheBackend(CacheBackend):
+    """Process-local LRU cache with lazy expiry"""
+
+    name = "memory"
+
+    def __init__(self, max_size: int = 10000, max_bytes: Optional[int] = None,
+                 namespace_budgets: Optional[Dict[str, int]] = None):
+        """
+        Initialize the in-memory backend
+
+        Args:
+            max_size: Maximum number of cached items
+            max_bytes: Memory budget for all values together, unbounded if None
+            namespace_budgets: Memory budget in bytes per namespace
+
+        Values are only sized when a budget applies to them, so without any
+        budget the cache is bounded by max_size alone and reports 0 bytes.
+        """
+        self.logger = logger.bind(service="cache_manager", backend=self.name)
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.namespace_budgets = dict(namespace_budgets or {})
+
+        # Entries kept in LRU order: oldest first
+        self.cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+        # Per-namespace LRU order, so a namespace over budget evicts its own entries
+        self.namespace_keys: Dict[str, "OrderedDict[str, None]"] = {}
+        self.total_bytes = 0
+
+        # Min-heap of (expires_at, key) so expired entries are found without a full scan
+        self.expiry_heap: List[Tuple[float, str]] = []
+
+        # Analysis runs in executor threads, so guard every operation
+        self.lock = threading.RLock()
+
+        # Resident counters per namespace, maintained on every change
+        self.namespace_stats: Dict[str, Dict[str, int]] = {}
+        self.created_at_total = 0.0  # Sum of created_at over resident entries
+
+    def _stats_for(self, namespace: str) -> Dict[str, int]:
+        """Get resident counters for a namespace, creating them on first use"""
+        stats = self.namespace_stats.get(namespace)
+        if stats is None:
+            stats = self.namespace_stats[namespace] = {
+                'evictions': 0,
+                'expirations': 0,
+                'entries': 0,
+                'bytes': 0
+            }
+        return stats
+
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """Get value from cache"""
+        with self.lock:
+            return self._get(key)
+
+    def get_many(self, keys: List[str], namespace: str = "default") -> Dict[str, Any]:
+        """Get several values under one lock acquisition"""
+        with self.lock:
+            results = {}
+            for key in keys:
+                value = self._get(key)
+                if value is not None:
+                    results[key] = value
+            return results
+
+    def get_many_with_ttl(self, keys: List[str], namespace: str = "default") -> Dict[str, Tuple[Any, Optional[float]]]:
+        """Get several values with their remaining lifetime under one lock acquisition"""
+        with self.lock:
+            results = {}
+            for key in keys:
+                value = self._get(key)
+                if value is not None:
+                    results[key] = (value, self.cache[key].expires_at - time.time())
+            return results
+
+    def _get(self, key: str) -> Optional[Any]:
+        """Get value from cache (caller holds the lock)"""
+        cache_entry = self.cache.get(key)
+        if cache_entry is None:
+            return None
+
+        # Check if expired
+        if time.time() > cache_entry.expires_at:
+            self._remove_entry(key, 'expirations')
+            return None
+
+        # Mark as most recently used
+        self.cache.move_to_end(key)
+        self.namespace_keys[cache_entry.namespace].move_to_end(key)
+
+        self.logger.debug("Cache hit", key=key[:8] + "...")
+        return cache_entry.value
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "default") -> None:
+        """Set value in cache"""
+        with self.lock:
+            self._set(key, value, ttl, namespace)
+
+    def set_many(self, items: Dict[str, Any], ttl: float, namespace: str = "default") -> None:
+        """Set several values under one lock acquisition"""
+        with self.lock:
+            for key, value in items.items():
+                self._set(key, value, ttl, namespace)
+
+    def _set(self, key: str, value: Any, ttl: float, namespace: str) -> None:
+        """Set value in cache (caller holds the lock)"""
+        current_time = time.time()
+
+        # Drop entries that have expired by now
+        self._remove_expired(current_time)
+
+        # Replace an existing entry without counting it as evicted
+        if key in self.cache:
+            self._remove_entry(key)
+
+        # Sizing walks the value, so it is skipped unless a budget needs it
+        budget = self.namespace_budgets.get(namespace)
+        size = estimate_size(value) if budget is not None or self.max_bytes is not None else 0
+
+        # A value larger than its budget would only flush everything else
+        if (budget is not None and size > budget) or (self.max_bytes is not None and size > self.max_bytes):
+            self.logger.debug("Value exceeds cache budget, not cached",
+                            key=key[:8] + "...", namespace=namespace, size=size)
+            return
+
+        expires_at = current_time + ttl
+        cache_entry = CacheEntry(value, expires_at, current_time, namespace, size)
+
+        self.cache[key] = cache_entry
+        self.namespace_keys.setdefault(namespace, OrderedDict())[key] = None
+        heapq.heappush(self.expiry_heap, (expires_at, key))
+
+        stats = self._stats_for(namespace)
+        stats['entries'] += 1
+        stats['bytes'] += size
+        self.total_bytes += size
+        self.created_at_total += current_time
+
+        # Evict least recently used entries of this namespace beyond its budget
+        if budget is not None:
+            namespace_keys = self.namespace_keys[namespace]
+            while stats['bytes'] > budget:
+                self._remove_entry(next(iter(namespace_keys)), 'evictions')
+
+        # Evict least recently used entries beyond the size and memory limits
+        while len(self.cache) > self.max_size or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            self._remove_entry(next(iter(self.cache)), 'evictions')
+
+        # Overwritten and evicted keys leave stale heap items behind
+        if len(self.expiry_heap) > 2 * len(self.cache) + 1024:
+            self._rebuild_expiry_heap()
+
+        self.logger.debug("Cache set", key=key[:8] + "...", ttl=ttl)
+
+    def delete(self, key: str, namespace: str = "default") -> None:
+        """Delete value from cache"""
+        with self.lock:
+            if key in self.cache:
+                self._remove_entry(key)
+                self.logger.debug("Cache deleted", key=key[:8] + "...")
+
+    def clear(self) -> None:
+        """Clear all cache"""
+        with self.lock:
+            self.cache.clear()
+            self.namespace_keys.clear()
+            self.expiry_heap.clear()
+            self.total_bytes = 0
+            self.created_at_total = 0.0
+            for stats in self.namespace_stats.values():
+                stats['entries'] = 0
+                stats['bytes'] = 0
+
+    def _remove_entry(self, key: str, reason: Optional[str] = None) -> None:
+        """Remove an entry and update counters (reason: 'evictions' or 'expirations')"""
+        cache_entry = self.cache.pop(key)
+        del self.namespace_keys[cache_entry.namespace][key]
+
+        stats = self._stats_for(cache_entry.namespace)
+        stats['entries'] -= 1
+        stats['bytes'] -= cache_entry.size
+        self.total_bytes -= cache_entry.size
+        if reason:
+            stats[reason] += 1
+
+        self.created_at_total -= cache_entry.created_at
+        if not self.cache:
+            # Reset float drift once the cache is empty
+            self.created_at_total = 0.0
+
+    def _remove_expired(self, current_time: float) -> None:
+        """Pop expired items off the expiry heap and drop their entries"""
+        expired_count = 0
+
+        while self.expiry_heap and self.expiry_heap[0][0] < current_time:
+            expires_at, key = heapq.heappop(self.expiry_heap)
+            cache_entry = self.cache.get(key)
+
+            # Skip heap items for keys that were since overwritten or evicted
+            if cache_entry is not None and cache_entry.expires_at == expires_at:
+                self._remove_entry(key, 'expirations')
+                expired_count += 1
+
+        if expired_count:
+            self.logger.debug("Cache cleaned up",
+                            expired_removed=expired_count,
+                            current_size=len(self.cache))
+
+    def _rebuild_expiry_heap(self) -> None:
+        """Rebuild the expiry heap from live entries only"""
+        self.expiry_heap = [(entry.expires_at, key) for key, entry in self.cache.items()]
+        heapq.heapify(self.expiry_heap)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics from maintained counters"""
+        with self.lock:
+            current_time = time.time()
+
+            # Purge what has expired so far; amortized, each entry expires once
+            self._remove_expired(current_time)
+
+            namespaces = {namespace: dict(stats) for namespace, stats in self.namespace_stats.items()}
+            for namespace, budget in self.namespace_budgets.items():
+                namespaces.setdefault(namespace, {
+                    'evictions': 0, 'expirations': 0, 'entries': 0, 'bytes': 0
+                })['budget_bytes'] = budget
+
+            total_entries = len(self.cache)
+            return {
+                'backend': self.name,
+                'total_entries': total_entries,
+                'max_size': self.max_size,
+                'max_bytes': self.max_bytes,
+                'average_age_seconds': current_time - self.created_at_total / total_entries if total_entries else 0,
+                'namespaces': namespaces
+            }
+
+class RedisCacheBackend(CacheBackend):
+    """Shared cache in Redis with server-side TTLs"""
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "paleta:cache", client=None):
+        """
+        Initialize the Redis backend
+
+        Args:
+            url: Redis connection URL, used when no client is given
+            prefix: Key prefix, namespaces are appended to it
+            client: Existing redis.Redis compatible client
+        """
+        self.logger = logger.bind(service="cache_manager", backend=self.name)
+        self.prefix = prefix
+
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def _key(self, key: str, namespace: str) -> str:
+        """Build the Redis key for a cache key"""
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """Get value from Redis"""
+        try:
+            data = self.client.get(self._key(key, namespace))
+            return load_value(data) if data is not None else None
+        except Exception as e:
+            self.logger.warning("Redis get failed", error=str(e))
+            return None
+
+    def get_many(self, keys: List[str], namespace: str = "default") -> Dict[str, Any]:
+        """Get several values with a single MGET round trip"""
+        if not keys:
+            return {}
+
+        try:
+            values = self.client.mget([self._key(key, namespace) for key in keys])
+        except Exception as e:
+            self.logger.warning("Redis mget failed", error=str(e), key_count=len(keys))
+            return {}
+
+        return {key: load_value(data) for key, data in zip(keys, values) if data is not None}
+
+    def get_many_with_ttl(self, keys: List[str], namespace: str = "default") -> Dict[str, Tuple[Any, Optional[float]]]:
+        """Get several values and their PTTLs in one pipelined round trip"""
+        if not keys:
+            return {}
+
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            redis_keys = [self._key(key, namespace) for key in keys]
+            pipeline.mget(redis_keys)
+            for redis_key in redis_keys:
+                pipeline.pttl(redis_key)
+            values, *ttls = pipeline.execute()
+        except Exception as e:
+            self.logger.warning("Redis mget failed", error=str(e), key_count=len(keys))
+            return {}
+
+        # PTTL is negative for keys without an expiry or gone since the MGET
+        return {
+            key: (load_value(data), ttl / 1000 if ttl >= 0 else None)
+            for key, data, ttl in zip(keys, values, ttls) if data is not None
+        }
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "default") -> None:
+        """Set value in Redis with a server-side TTL"""
+        try:
+            self.client.set(self._key(key, namespace), dump_value(value), px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            self.logger.warning("Redis set failed", error=str(e))
+
+    def set_many(self, items: Dict[str, Any], ttl: float, namespace: str = "default") -> None:
+        """Set several values in one pipelined round trip"""
+        if not items:
+            return
+
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(self._key(key, namespace), dump_value(value), px=max(1, int(ttl * 1000)))
+            pipeline.execute()
+        except Exception as e:
+            self.logger.warning("Redis pipelined set failed", error=str(e), key_count=len(items))
+
+    def delete(self, key: str, namespace: str = "default") -> None:
+        """Delete value from Redis"""
+        try:
+            self.client.delete(self._key(key, namespace))
+        except Exception as e:
+            self.logger.warning("Redis delete failed", error=str(e))
+
+    def clear(self) -> None:
+        """Delete all keys under the prefix"""
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=f"{self.prefix}:*", count=1000):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        except Exception as e:
+            self.logger.warning("Redis clear failed", error=str(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get entry count and server memory (per-namespace residency is not tracked in Redis)
+
+        Entries are counted by a SCAN over the prefix, so other applications'
+        keys in the same database are left out. Redis expires keys on its
+        own, which rules out a maintained counter; keys written or expiring
+        during the scan may be missed, so the count is approximate.
+        """
+        stats = {
+            'backend': self.name,
+            'total_entries': 0,
+            'total_entries_approximate': True,
+            'max_size': None,
+            'average_age_seconds': 0,
+            'namespaces': {}
+        }
+
+        try:
+            stats['total_entries'] = sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}:*", count=1000))
+            stats['used_memory_bytes'] = self.client.info("memory").get("used_memory", 0)
+        except Exception as e:
+            self.logger.warning("Redis stats failed", error=str(e))
+
+        return stats
+
+class SqliteCacheBackend(CacheBackend):
+    """Persistent on-disk cache in SQLite (WAL mode) whose entries and TTLs survive restarts"""
+
+    name = "sqlite"
+
+    # Writes between sweeps of expired rows
+    PURGE_INTERVAL = 1000
+
+    # Keys per query in batch reads, below SQLite's bound parameter limit
+    BATCH_SIZE = 500
+
+    def __init__(self, path: str = "cache/paleta_cache.db"):
+        """
+        Initialize the SQLite backend
+
+        Args:
+            path: Database file, shared by all worker processes on the host
+        """
+        self.logger = logger.bind(service="cache_manager", backend=self.name)
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # One connection per thread; WAL lets readers run alongside a writer
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writes_since_purge = 0
+        self.expirations: Dict[str, int] = {}
+
+        with self._connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at)"
+            )
+        self._create_stats_table()
+
+        self.logger.info("SQLite cache opened", path=path)
+
+    def _create_stats_table(self) -> None:
+        """
+        Create per-namespace counters kept up to date by triggers
+
+        Counters live in the database, so they cover writes from every
+        process sharing the file; a database created before them is counted
+        once here.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cache_namespace_stats'"
+            ).fetchone()
+            if exists is None:
+                connection.execute("""
+                    CREATE TABLE cache_namespace_stats (
+                        namespace TEXT PRIMARY KEY,
+                        entries INTEGER NOT NULL,
+                        bytes INTEGER NOT NULL,
+                        created_at_total REAL NOT NULL
+                    )
+                """)
+                connection.execute("""
+                    CREATE TRIGGER cache_entries_inserted AFTER INSERT ON cache_entries BEGIN
+                        INSERT INTO cache_namespace_stats VALUES (NEW.namespace, 1, LENGTH(NEW.value), NEW.created_at)
+                        ON CONFLICT (namespace) DO UPDATE SET
+                            entries = entries + 1,
+                            bytes = bytes + LENGTH(NEW.value),
+                            created_at_total = created_at_total + NEW.created_at;
+                    END
+                """)
+                connection.execute("""
+                    CREATE TRIGGER cache_entries_updated AFTER UPDATE ON cache_entries BEGIN
+                        UPDATE cache_namespace_stats SET
+                            bytes = bytes - LENGTH(OLD.value) + LENGTH(NEW.value),
+                            created_at_total = created_at_total - OLD.created_at + NEW.created_at
+                        WHERE namespace = NEW.namespace;
+                    END
+                """)
+                connection.execute("""
+                    CREATE TRIGGER cache_entries_deleted AFTER DELETE ON cache_entries BEGIN
+                        UPDATE cache_namespace_stats SET
+                            entries = entries - 1,
+                            bytes = bytes - LENGTH(OLD.value),
+                            created_at_total = created_at_total - OLD.created_at
+                        WHERE namespace = OLD.namespace;
+                    END
+                """)
+                connection.execute(
+                    "INSERT INTO cache_namespace_stats "
+                    "SELECT namespace, COUNT(*), SUM(LENGTH(value)), SUM(created_at) FROM cache_entries "
+                    "GROUP BY namespace"
+                )
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """Get value from disk"""
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite get failed", error=str(e))
+            return None
+
+        return load_value(row[0]) if row is not None else None
+
+    def get_many(self, keys: List[str], namespace: str = "default") -> Dict[str, Any]:
+        """Get several values with one query per batch of keys"""
+        results = {}
+        current_time = time.time()
+
+        try:
+            connection = self._connection()
+            for start in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[start:start + self.BATCH_SIZE]
+                rows = connection.execute(
+                    "SELECT key, value FROM cache_entries WHERE namespace = ? AND expires_at > ? "
+                    f"AND key IN ({','.join('?' * len(batch))})",
+                    (namespace, current_time, *batch)
+                )
+                results.update((key, load_value(data)) for key, data in rows)
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite batch get failed", error=str(e), key_count=len(keys))
+            return {}
+
+        return results
+
+    def get_many_with_ttl(self, keys: List[str], namespace: str = "default") -> Dict[str, Tuple[Any, Optional[float]]]:
+        """Get several values with their remaining lifetime, one query per batch of keys"""
+        results = {}
+        current_time = time.time()
+
+        try:
+            connection = self._connection()
+            for start in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[start:start + self.BATCH_SIZE]
+                rows = connection.execute(
+                    "SELECT key, value, expires_at FROM cache_entries WHERE namespace = ? AND expires_at > ? "
+                    f"AND key IN ({','.join('?' * len(batch))})",
+                    (namespace, current_time, *batch)
+                )
+                results.update((key, (load_value(data), expires_at - current_time))
+                               for key, data, expires_at in rows)
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite batch get failed", error=str(e), key_count=len(keys))
+            return {}
+
+        return results
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "default") -> None:
+        """Set value on disk with an absolute expiry"""
+        self.set_many({key: value}, ttl, namespace)
+
+    def set_many(self, items: Dict[str, Any], ttl: float, namespace: str = "default") -> None:
+        """Set several values in one transaction"""
+        if not items:
+            return
+
+        current_time = time.time()
+        rows = [
+            (namespace, key, dump_value(value), current_time + ttl, current_time)
+            for key, value in items.items()
+        ]
+
+        try:
+            with self._connection() as connection:
+                connection.executemany(
+                    "INSERT INTO cache_entries (namespace, key, value, expires_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (namespace, key) DO UPDATE SET "
+                    "value = excluded.value, expires_at = excluded.expires_at, created_at = excluded.created_at",
+                    rows
+                )
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite set failed", error=str(e), key_count=len(items))
+            return
+
+        with self.lock:
+            self.writes_since_purge += len(rows)
+            purge = self.writes_since_purge >= self.PURGE_INTERVAL
+            if purge:
+                self.writes_since_purge = 0
+        if purge:
+            self._purge_expired(current_time)
+
+    def _purge_expired(self, current_time: float) -> None:
+        """Delete expired rows, counting them per namespace"""
+        try:
+            with self._connection() as connection:
+                expired = connection.execute(
+                    "SELECT namespace, COUNT(*) FROM cache_entries WHERE expires_at <= ? GROUP BY namespace",
+                    (current_time,)
+                ).fetchall()
+                connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (current_time,))
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite purge failed", error=str(e))
+            return
+
+        with self.lock:
+            for namespace, count in expired:
+                self.expirations[namespace] = self.expirations.get(namespace, 0) + count
+
+    def delete(self, key: str, namespace: str = "default") -> None:
+        """Delete value from disk"""
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+                )
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite delete failed", error=str(e))
+
+    def clear(self) -> None:
+        """Delete all entries"""
+        try:
+            with self._connection() as connection:
+                connection.execute("DELETE FROM cache_entries")
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite clear failed", error=str(e))
+
+    def load_entries(self, limit: Optional[int] = None) -> List[Tuple[str, str, Any, float]]:
+        """Read live entries, most recently written first"""
+        try:
+            rows = self._connection().execute(
+                "SELECT namespace, key, value, expires_at FROM cache_entries WHERE expires_at > ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (time.time(), -1 if limit is None else limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite load failed", error=str(e))
+            return []
+
+        return [(namespace, key, load_value(data), expires_at) for namespace, key, data, expires_at in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics from the trigger-maintained counters, O(#namespaces)
+
+        Rows that expired since the last purge are still counted.
+        """
+        current_time = time.time()
+        stats = {
+            'backend': self.name,
+            'total_entries': 0,
+            'max_size': None,
+            'average_age_seconds': 0,
+            'namespaces': {}
+        }
+
+        try:
+            rows = self._connection().execute(
+                "SELECT namespace, entries, bytes, created_at_total FROM cache_namespace_stats WHERE entries > 0"
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.warning("SQLite stats failed", error=str(e))
+            return stats
+
+        with self.lock:
+            expirations = dict(self.expirations)
+
+        created_at_total = 0.0
+        for namespace, entries, size, created_at in rows:
+            stats['namespaces'][namespace] = {
+                'evictions': 0,
+                'expirations': expirations.pop(namespace, 0),
+                'entries': entries,
+                'bytes': size
+            }
+            stats['total_entries'] += entries
+            created_at_total += created_at
+        for namespace, count in expirations.items():
+            stats['namespaces'][namespace] = {'evictions': 0, 'expirations': count, 'entries': 0, 'bytes': 0}
+
+        if stats['total_entries']:
+            stats['average_age_seconds'] = current_time - created_at_total / stats['total_entries']
+
+        return stats
+
+class TwoTierCacheBackend(CacheBackend):
+    """Small in-process L1 in front of a shared L2, promoting L2 hits into L1"""
+
+    name = "tiered"
+
+    def __init__(self, l1: MemoryCacheBackend, l2: CacheBackend, l1_ttl: float = 300):
+        """
+        Initialize the two-tier backend
+
+        Args:
+            l1: Process-local LRU holding hot entries
+            l2: Shared backend (Redis, on-disk) holding everything
+            l1_ttl: Upper bound on L1 lifetime, so L1 copies stay fresh
+        """
+        self.logger = logger.bind(service="cache_manager", backend=self.name)
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+
+        # Which tier served each hit, per namespace
+        self.lock = threading.Lock()
+        self.tier_hits: Dict[str, Dict[str, int]] = {}
+
+    def _count_hits(self, namespace: str, l1_hits: int, l2_hits: int) -> None:
+        """Record hits per tier"""
+        if not (l1_hits or l2_hits):
+            return
+        with self.lock:
+            hits = self.tier_hits.setdefault(namespace, {'l1_hits': 0, 'l2_hits': 0})
+            hits['l1_hits'] += l1_hits
+            hits['l2_hits'] += l2_hits
+
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
+        """Get from L1, falling back to L2 and promoting the hit"""
+        value = self.l1.get(key, namespace)
+        if value is not None:
+            self._count_hits(namespace, 1, 0)
+            return value
+
+        promoted = self._promote([key], namespace)
+        self._count_hits(namespace, 0, len(promoted))
+        return promoted.get(key)
+
+    def get_many(self, keys: List[str], namespace: str = "default") -> Dict[str, Any]:
+        """Get from L1, then fetch all L1 misses from L2 in one batch"""
+        results = self.l1.get_many(keys, namespace)
+
+        missing = [key for key in keys if key not in results]
+        promoted = self._promote(missing, namespace) if missing else {}
+        results.update(promoted)
+
+        self._count_hits(namespace, len(results) - len(promoted), len(promoted))
+        return results
+
+    def _promote(self, keys: List[str], namespace: str) -> Dict[str, Any]:
+        """Read keys from L2 and copy hits into L1, never outliving their L2 expiry"""
+        found = self.l2.get_many_with_ttl(keys, namespace)
+        for key, (value, remaining) in found.items():
+            ttl = self.l1_ttl if remaining is None else min(self.l1_ttl, remaining)
+            self.l1.set(key, value, ttl, namespace)
+        return {key: value for key, (value, _) in found.items()}
+
+    def set(self, key: str, value: Any, ttl: float, namespace: str = "default") -> None:
+        """Write through to both tiers"""
+        self.l2.set(key, value, ttl, namespace)
+        self.l1.set(key, value, min(ttl, self.l1_ttl), namespace)
+
+    def set_many(self, items: Dict[str, Any], ttl: float, namespace: str = "default") -> None:
+        """Write through to both tiers in batches"""
+        self.l2.set_many(items, ttl, namespace)
+        self.l1.set_many(items, min(ttl, self.l1_ttl), namespace)
+
+    def delete(self, key: str, namespace: str = "default") -> None:
+        """Delete from both tiers"""
+        self.l2.delete(key, namespace)
+        self.l1.delete(key, namespace)
+
+    def clear(self) -> None:
+        """Clear both tiers"""
+        self.l2.clear()
+        self.l1.clear()
+
+    def warm_load(self, limit: Optional[int] = None) -> int:
+        """Fill L1 with the most recently written L2 entries"""
+        entries = self.l2.load_entries(limit or self.l1.max_size)
+        current_time = time.time()
+
+        # Oldest first, so the newest entries end up most recently used
+        for namespace, key, value, expires_at in reversed(entries):
+            self.l1.set(key, value, min(expires_at - current_time, self.l1_ttl), namespace)
+
+        return len(entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get L1 residency with per-tier hit counts, plus both tiers' own stats"""
+        l1_stats = self.l1.get_stats()
+        l2_stats = self.l2.get_stats()
+
+        namespaces = {namespace: dict(stats) for namespace, stats in l1_stats['namespaces'].items()}
+        with self.lock:
+            for namespace, hits in self.tier_hits.items():
+                namespaces.setdefault(namespace, {}).update(hits)
+
+        return {
+            'backend': self.name,
+            'total_entries': l1_stats['total_entries'],
+            'max_size': l1_stats['max_size'],
+            'max_bytes': l1_stats['max_bytes'],
+            'average_age_seconds': l1_stats['average_age_seconds'],
+            'namespaces': namespaces,
+            'tiers': {'l1': l1_stats, 'l2': l2_stats}
+        }
+
+def memory_backend_from_env(max_size: int) -> MemoryCacheBackend:
+    """
+    Create a memory backend with byte budgets from the environment
+
+    CACHE_MAX_MEMORY_MB bounds all values together; CACHE_NAMESPACE_BUDGETS_MB
+    holds per-namespace budgets as "product_analysis=64,palette_analysis=128".
+    With neither set, entries are bounded by count only and never sized.
+    """
+    max_memory_mb = os.getenv("CACHE_MAX_MEMORY_MB")
+
+    namespace_budgets = {}
+    for budget in os.getenv("CACHE_NAMESPACE_BUDGETS_MB", "").split(","):
+        if budget.strip():
+            namespace, megabytes = budget.split("=")
+            namespace_budgets[namespace.strip()] = int(float(megabytes) * 1024 * 1024)
+
+    return MemoryCacheBackend(
+        max_size=max_size,
+        max_bytes=int(float(max_memory_mb) * 1024 * 1024) if max_memory_mb else None,
+        namespace_budgets=namespace_budgets
+    )
+
+def create_cache_backend(backend_name: Optional[str] = None) -> CacheBackend:
+    """Create the cache backend selected by CACHE_BACKEND (memory, redis, sqlite or tiered)"""
+    backend_name = (backend_name or os.getenv("CACHE_BACKEND", "memory")).lower()
+
+    if backend_name == "redis":
+        return RedisCacheBackend(
+            url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            prefix=os.getenv("REDIS_CACHE_PREFIX", "paleta:cache")
+        )
+
+    if backend_name == "sqlite":
+        return SqliteCacheBackend(path=os.getenv("CACHE_SQLITE_PATH", "cache/paleta_cache.db"))
+
+    if backend_name == "tiered":
+        l2_name = os.getenv("CACHE_L2_BACKEND", "redis").lower()
+        if l2_name in ("tiered", "memory"):
+            raise ValueError(f"Unsupported L2 cache backend: {l2_name}")
+
+        return TwoTierCacheBackend(
+            l1=memory_backend_from_env(int(os.getenv("CACHE_L1_MAX_ENTRIES", "2000"))),
+            l2=create_cache_backend(l2_name),
+            l1_ttl=float(os.getenv("CACHE_L1_TTL", "300"))
+        )
+
+    return memory_backend_from_env(int(os.getenv("CACHE_MAX_ENTRIES", "10000")))
@@ -3,182 +3,238 @@ Cache Manager Service
 Handles caching for AI services to improve performance
 """
 
-import json
 import hashlib
-from typing import Any, Optional, Dict
+import threading
+import time
+from typing import Any, Optional, Dict, List, Tuple
 import structlog
-from datetime import datetime, timedelta
+from .cache_backends import CacheBackend, create_cache_backend
 
 logger = structlog.get_logger()
 
+# Namespaces reported by get_stats even before their first use
+CACHE_NAMESPACES = ("product_analysis", "palette_analysis", "prices")
+
+def canonical_key(kind: str, fields: List[str]) -> str:
+    """
+    Hash an ordered list of string fields into a cache key
+    
+    Fields are NUL-separated and hashed with blake2b in a single update;
+    if a field itself contains NUL, fields are length-prefixed instead and
+    hashed under a different personalization, so keys stay unambiguous.
+    
+    Args:
+        kind: Key type, part of the hashed data
+        fields: Fields in canonical order
+        
+    Returns:
+        32 character hex digest
+    """
+    data = "\0".join(fields)
+    if data.count("\0") == len(fields) - 1 or not fields:
+        person = b"paleta:nul"
+    else:
+        data = "".join(f"{len(field)}:{field}" for field in fields)
+        person = b"paleta:len"
+    
+    digest = hashlib.blake2b(kind.encode() + b"\0", digest_size=16, person=person)
+    digest.update(data.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
 class CacheManager:
-    def __init__(self):
-        """Initialize cache manager"""
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        """
+        Initialize cache manager
+        
+        Args:
+            backend: Storage backend, selected from configuration by default
+        """
         self.logger = logger.bind(service="cache_manager")
         
-        # In-memory cache (in production, use Redis)
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        # Storage (in-process memory or Redis shared between workers)
+        self.backend = backend or create_cache_backend()
+        
+        # Lookup counters per namespace, so stats are O(1)
+        self.lock = threading.Lock()
+        self.namespace_stats: Dict[str, Dict[str, int]] = {
+            namespace: self._new_namespace_stats() for namespace in CACHE_NAMESPACES
+        }
         
         # Cache configuration
         self.default_ttl = 3600  # 1 hour
-        self.max_cache_size = 10000  # Maximum number of cached items
         
-        self.logger.info("Cache manager initialized")
+        self.logger.info("Cache manager initialized", backend=self.backend.name)
+    
+    def _new_namespace_stats(self) -> Dict[str, int]:
+        """Create zeroed counters for a namespace"""
+        return {'hits': 0, 'misses': 0, 'sets': 0}
     
-    def _generate_key(self, data: Any) -> str:
-        """Generate cache key from data"""
-        # Create a hash of the data for the cache key
-        data_str = json.dumps(data, sort_keys=True, default=str)
-        return hashlib.md5(data_str.encode()).hexdigest()
+    def _count(self, namespace: str, counter: str, amount: int = 1) -> None:
+        """Increment a namespace counter"""
+        if not amount:
+            return
+        with self.lock:
+            stats = self.namespace_stats.get(namespace)
+            if stats is None:
+                stats = self.namespace_stats[namespace] = self._new_namespace_stats()
+            stats[counter] += amount
     
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: str, namespace: str = "default") -> Optional[Any]:
         """Get value from cache"""
-        if key not in self.cache:
-            return None
-        
-        cache_entry = self.cache[key]
-        
-        # Check if expired
-        if datetime.now() > cache_entry['expires_at']:
-            del self.cache[key]
-            return None
-        
-        # Update access time
-        cache_entry['last_accessed'] = datetime.now()
-        
-        self.logger.debug("Cache hit", key=key[:8] + "...")
-        return cache_entry['value']
+        value = self.backend.get(key, namespace)
+        self._count(namespace, 'hits' if value is not None else 'misses')
+        return value
+    
+    def get_many(self, keys: List[str], namespace: str = "default") -> Dict[str, Any]:
+        """Get several values in one backend round trip, only found keys are returned"""
+        values = self.backend.get_many(keys, namespace)
+        self._count(namespace, 'hits', len(values))
+        self._count(namespace, 'misses', len(keys) - len(values))
+        return values
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, namespace: str = "default") -> None:
         """Set value in cache"""
         if ttl is None:
             ttl = self.default_ttl
-        
-        # Clean up cache if it's getting too large
-        self._cleanup_cache()
-        
-        expires_at = datetime.now() + timedelta(seconds=ttl)
-        
-        self.cache[key] = {
-            'value': value,
-            'expires_at': expires_at,
-            'created_at': datetime.now(),
-            'last_accessed': datetime.now()
-        }
-        
-        self.logger.debug("Cache set", key=key[:8] + "...", ttl=ttl)
+        self.backend.set(key, value, ttl, namespace)
+        self._count(namespace, 'sets')
     
-    def delete(self, key: str) -> None:
+    def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None, namespace: str = "default") -> None:
+        """Set several values in one backend round trip"""
+        if ttl is None:
+            ttl = self.default_ttl
+        self.backend.set_many(items, ttl, namespace)
+        self._count(namespace, 'sets', len(items))
+    
+    def delete(self, key: str, namespace: str = "default") -> None:
         """Delete value from cache"""
-        if key in self.cache:
-            del self.cache[key]
-            self.logger.debug("Cache deleted", key=key[:8] + "...")
+        self.backend.delete(key, namespace)
     
     def clear(self) -> None:
         """Clear all cache"""
-        self.cache.clear()
+        self.backend.clear()
         self.logger.info("Cache cleared")
     
-    def _cleanup_cache(self) -> None:
-        """Clean up expired entries and enforce size limit"""
-        current_time = datetime.now()
-        
-        # Remove expired entries
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if current_time > entry['expires_at']
-        ]
-        
-        for key in expired_keys:
-            del self.cache[key]
-        
-        # If still too large, remove least recently accessed
-        if len(self.cache) > self.max_cache_size:
-            # Sort by last accessed time
-            sorted_items = sorted(
-                self.cache.items(),
-                key=lambda x: x[1]['last_accessed']
-            )
+    def warm_load(self, limit: Optional[int] = None) -> int:
+        """
+        Preload persisted entries into process memory
+        
+        Args:
+            limit: Maximum number of entries, defaults to what the backend can hold
             
-            # Remove oldest entries
-            entries_to_remove = len(self.cache) - self.max_cache_size + 100  # Remove extra to avoid frequent cleanup
-            for key, _ in sorted_items[:entries_to_remove]:
-                del self.cache[key]
+        Returns:
+            Number of entries loaded
+        """
+        start_time = time.time()
+        loaded = self.backend.warm_load(limit)
         
-        if expired_keys or len(self.cache) > self.max_cache_size:
-            self.logger.debug("Cache cleaned up", 
-                            expired_removed=len(expired_keys),
-                            current_size=len(self.cache))
+        if loaded:
+            self.logger.info("Cache warm-loaded",
+                           entries=loaded,
+                           duration_seconds=round(time.time() - start_time, 3))
+        return loaded
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        current_time = datetime.now()
-        
-        # Count expired entries
-        expired_count = sum(
-            1 for entry in self.cache.values()
-            if current_time > entry['expires_at']
-        )
-        
-        # Calculate average age
-        total_age = sum(
-            (current_time - entry['created_at']).total_seconds()
-            for entry in self.cache.values()
-        )
-        avg_age = total_age / len(self.cache) if self.cache else 0
-        
-        return {
-            'total_entries': len(self.cache),
-            'expired_entries': expired_count,
-            'active_entries': len(self.cache) - expired_count,
-            'average_age_seconds': avg_age,
-            'max_size': self.max_cache_size,
-            'usage_percentage': (len(self.cache) / self.max_cache_size) * 100
+        """Get cache statistics from maintained counters"""
+        backend_stats = self.backend.get_stats()
+        
+        with self.lock:
+            lookup_stats = {namespace: dict(stats) for namespace, stats in self.namespace_stats.items()}
+        
+        namespaces = {}
+        total_hits = 0
+        total_lookups = 0
+        resident_bytes = 0
+        for namespace in list(lookup_stats) + [n for n in backend_stats['namespaces'] if n not in lookup_stats]:
+            stats = {
+                **self._new_namespace_stats(),
+                'evictions': 0,
+                'expirations': 0,
+                'entries': 0,
+                'bytes': 0,
+                **lookup_stats.get(namespace, {}),
+                **backend_stats['namespaces'].get(namespace, {})
+            }
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = (stats['hits'] / lookups) * 100 if lookups else 0.0
+            
+            total_hits += stats['hits']
+            total_lookups += lookups
+            resident_bytes += stats['bytes']
+            namespaces[namespace] = stats
+        
+        total_entries = backend_stats['total_entries']
+        max_size = backend_stats['max_size']
+        
+        stats = {
+            'backend': self.backend.name,
+            'total_entries': total_entries,
+            'total_entries_approximate': backend_stats.get('total_entries_approximate', False),
+            'expired_entries': 0,
+            'active_entries': total_entries,
+            'average_age_seconds': backend_stats['average_age_seconds'],
+            'max_size': max_size,
+            'usage_percentage': (total_entries / max_size) * 100 if max_size else 0.0,
+            'resident_bytes': backend_stats.get('used_memory_bytes', resident_bytes),
+            'max_bytes': backend_stats.get('max_bytes'),
+            'hit_rate': (total_hits / total_lookups) * 100 if total_lookups else 0.0,
+            'namespaces': namespaces
         }
+        
+        # Layered backends also report each tier separately
+        if 'tiers' in backend_stats:
+            stats['tiers'] = backend_stats['tiers']
+        
+        return stats
     
     def cache_product_analysis(self, product_name: str, description: str, result: Any) -> None:
         """Cache product analysis result"""
-        key_data = {
-            'type': 'product_analysis',
-            'product_name': product_name,
-            'description': description
-        }
-        key = self._generate_key(key_data)
+        key = self._product_analysis_key(product_name, description)
         
         # Cache for 2 hours (product analysis results don't change often)
-        self.set(key, result, ttl=7200)
+        self.set(key, result, ttl=7200, namespace='product_analysis')
     
     def get_cached_product_analysis(self, product_name: str, description: str) -> Optional[Any]:
         """Get cached product analysis result"""
-        key_data = {
-            'type': 'product_analysis',
-            'product_name': product_name,
-            'description': description
-        }
-        key = self._generate_key(key_data)
+        key = self._product_analysis_key(product_name, description)
         
-        return self.get(key)
+        return self.get(key, namespace='product_analysis')
     
-    def cache_palette_analysis(self, products: list, result: Any) -> None:
-        """Cache palette analysis result"""
-        key_data = {
-            'type': 'palette_analysis',
-            'products': sorted(products)  # Sort for consistent key generation
-        }
-        key = self._generate_key(key_data)
+    def _product_analysis_key(self, product_name: str, description: str) -> str:
+        """Generate cache key for a product analysis"""
+        return canonical_key('product_analysis', [product_name, description])
+    
+    def get_cached_product_analyses(self, products: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Any]:
+        """Get cached analyses for (product_name, description) pairs in one lookup"""
+        keys = {self._product_analysis_key(name, description): (name, description)
+                for name, description in products}
+        found = self.get_many(list(keys), namespace='product_analysis')
+        return {keys[key]: value for key, value in found.items()}
+    
+    def cache_product_analyses(self, results: Dict[Tuple[str, str], Any]) -> None:
+        """Cache analyses keyed by (product_name, description) in one write"""
+        items = {self._product_analysis_key(name, description): result
+                 for (name, description), result in results.items()}
+        self.set_many(items, ttl=7200, namespace='product_analysis')
+    
+    def palette_analysis_key(self, products: list) -> str:
+        """Generate the cache key for a palette, independent of product order"""
+        return canonical_key('palette_analysis', sorted(products))
+    
+    def cache_palette_analysis(self, products: list, result: Any, key: Optional[str] = None) -> None:
+        """Cache palette analysis result (pass key to reuse one from palette_analysis_key)"""
+        if key is None:
+            key = self.palette_analysis_key(products)
         
         # Cache for 1 hour (palette analysis might change more frequently)
-        self.set(key, result, ttl=3600)
+        self.set(key, result, ttl=3600, namespace='palette_analysis')
     
-    def get_cached_palette_analysis(self, products: list) -> Optional[Any]:
-        """Get cached palette analysis result"""
-        key_data = {
-            'type': 'palette_analysis',
-            'products': sorted(products)
-        }
-        key = self._generate_key(key_data)
+    def get_cached_palette_analysis(self, products: list, key: Optional[str] = None) -> Optional[Any]:
+        """Get cached palette analysis result (pass key to reuse one from palette_analysis_key)"""
+        if key is None:
+            key = self.palette_analysis_key(products)
         
-        return self.get(key)
+        return self.get(key, namespace='palette_analysis')
 
 # Global cache instance
 cache_manager = CacheManager()
@@ -0,0 +1,163 @@
+"""
+Keyword Automaton
+Multi-pattern keyword matching and rewriting for product normalization
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class KeywordAutomaton:
+    """Finds every keyword of a labelled dictionary in a single pass over text"""
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        """
+        Build the automaton from a label -> keywords mapping
+
+        Args:
+            keywords: Mapping of label (brand, category) to its keywords.
+                Declaration order is preserved, so results can reproduce
+                first-match semantics of a nested loop over the mapping.
+        """
+        # (label, keyword) for every keyword, indexed by declaration order
+        self.entries: List[Tuple[str, str]] = []
+
+        # Trie transitions, failure links and outputs per node (node 0 is the root)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for label, label_keywords in keywords.items():
+            for keyword in label_keywords:
+                self._add_keyword(label, keyword.lower())
+
+        self._build_failure_links()
+
+    def _add_keyword(self, label: str, keyword: str) -> None:
+        """Insert keyword into the trie"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+
+        self._output[state].append(len(self.entries))
+        self.entries.append((label, keyword))
+
+    def _build_failure_links(self) -> None:
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = list(self._goto[0].values())
+
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _scan(self, text: str) -> List[int]:
+        """Return declaration indices of all keywords occurring in text, sorted"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        found = set(output[0])
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+
+        return sorted(found)
+
+    def search(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Find all keywords contained in text
+
+        Args:
+            text: Lowercased text to scan
+
+        Returns:
+            List of (label, keyword) hits in declaration order, each keyword at most once
+        """
+        return [self.entries[index] for index in self._scan(text)]
+
+    def first_match(self, text: str) -> Optional[str]:
+        """Return label of the first declared keyword contained in text"""
+        hits = self._scan(text)
+        return self.entries[hits[0]][0] if hits else None
+
+    def contains_any(self, text: str) -> bool:
+        """Check whether text contains any keyword"""
+        return bool(self._scan(text))
+
+
+class KeywordRewriter:
+    """Replaces whole-word variations with their canonical form in a single regex scan"""
+
+    def __init__(self, replacements: Dict[str, str]):
+        """
+        Compile all replacements into one trie-shaped regex
+
+        Args:
+            replacements: Mapping of variation -> canonical form. Variations are
+                matched case-insensitively on word boundaries, leftmost-longest,
+                and replaced text is not rescanned.
+        """
+        self.replacements: Dict[str, str] = {}
+        for variation, correct in replacements.items():
+            self.replacements.setdefault(variation.lower(), correct)
+
+        self.pattern = self._compile(self.replacements.keys())
+
+    def _compile(self, variations) -> Optional[re.Pattern]:
+        """Build a regex whose alternation shares common prefixes"""
+        trie: Dict[str, Any] = {}
+        for variation in variations:
+            node = trie
+            for char in variation:
+                node = node.setdefault(char, {})
+            node[""] = {}
+
+        if not trie:
+            return None
+
+        return re.compile(r"\b(?:" + self._trie_to_regex(trie) + r")\b", re.IGNORECASE)
+
+    def _trie_to_regex(self, node: Dict[str, Any]) -> str:
+        """Render a trie node as a regex, preferring longer matches"""
+        branches = [re.escape(char) + self._trie_to_regex(child)
+                    for char, child in sorted(node.items()) if char]
+
+        if not branches:
+            return ""
+
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+        # A variation ends here but longer ones continue: try the longer ones first
+        if "" in node:
+            body = "(?:" + body + ")?"
+
+        return body
+
+    def _replace(self, match: re.Match) -> str:
+        """Look up the canonical form for a matched variation"""
+        matched = match.group(0)
+        return self.replacements.get(matched.lower(), matched)
+
+    def rewrite(self, text: str) -> str:
+        """Apply all replacements to text"""
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(self._replace, text)
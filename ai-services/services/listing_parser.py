@@ -0,0 +1,184 @@
+"""
+Listing Parser
+Extracts offers from marketplace listing pages with lxml instead of page-wide regex sweeps
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+from lxml import etree
+
+# A price is a grouped amount followed by the currency, e.g. "3 499,00 zł"
+PRICE_PATTERN = re.compile(r'(\d{1,3}(?:[ \xa0 ]\d{3})+|\d+)(?:[,.](\d{1,2}))?\s*(?:zł|PLN)')
+SELLER_RATING_PATTERN = re.compile(r'poleca[^%\d]*(\d{1,3}(?:[,.]\d+)?)\s*%', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Prices outside this range are layout noise, not offers
+MIN_PRICE = 1
+MAX_PRICE = 100000
+
+@dataclass
+class ListingOffer:
+    """One offer found on a listing page"""
+    title: str
+    price: float
+    currency: str
+    url: str
+    seller_rating: Optional[float] = None
+
+def parse_price(text: str) -> Optional[float]:
+    """Parse the first price in text, None if there is none"""
+    # Most text has no currency at all, which is cheaper to rule out than to search
+    if 'zł' not in text and 'PLN' not in text:
+        return None
+
+    match = PRICE_PATTERN.search(text)
+    if match is None:
+        return None
+
+    whole, fraction = match.groups()
+    price = float(re.sub(r'\D', '', whole) + '.' + (fraction or '0'))
+    return price if MIN_PRICE <= price <= MAX_PRICE else None
+
+def _text(element: etree._Element) -> str:
+    """Whitespace-normalized text of an element and its descendants"""
+    return WHITESPACE_PATTERN.sub(' ', ''.join(element.itertext())).strip()
+
+def parse_offer(article: etree._Element, base_url: str = "") -> Optional[ListingOffer]:
+    """
+    Extract an offer from its <article> element
+
+    The price is read from the element labelled as the price if there is
+    one, otherwise from the first amount in zł anywhere in the article.
+
+    Returns:
+        The offer, or None for articles without a title link or price
+    """
+    link = None
+    title_element = next(article.iter('h2', 'h3'), None)
+    if title_element is not None:
+        link = next(title_element.iter('a'), None)
+    if link is None:
+        link = next(article.iter('a'), None)
+    if link is None or not link.get('href'):
+        return None
+
+    title = _text(title_element if title_element is not None else link)
+    if not title:
+        return None
+
+    price = None
+    for element in article.iter():
+        label = element.get('aria-label')
+        if label and 'cena' in label.lower():
+            price = parse_price(_text(element)) or parse_price(label)
+            if price is not None:
+                break
+
+    article_text = _text(article)
+    if price is None:
+        price = parse_price(article_text)
+    if price is None:
+        return None
+
+    seller_rating = None
+    rating_match = SELLER_RATING_PATTERN.search(article_text) if '%' in article_text else None
+    if rating_match:
+        seller_rating = float(rating_match.group(1).replace(',', '.'))
+
+    url = link.get('href')
+    if url.startswith('/'):
+        url = base_url + url
+
+    return ListingOffer(title=title, price=price, currency="PLN", url=url, seller_rating=seller_rating)
+
+class AllegroListingParser:
+    """
+    Incremental parser for Allegro listing pages
+
+    HTML is fed in chunks and only <article> elements are inspected; each is
+    discarded once handled, so memory stays bounded by the largest offer
+    rather than the page.
+    """
+
+    def __init__(self, base_url: str = "https://allegro.pl", max_offers: Optional[int] = None,
+                 encoding: Optional[str] = None):
+        """
+        Initialize the parser
+
+        Args:
+            base_url: Prefix for relative offer links
+            max_offers: Stop collecting after this many offers
+            encoding: Charset of bytes fed in, detected from the page if not given
+        """
+        self.base_url = base_url
+        self.max_offers = max_offers
+        try:
+            self.parser = etree.HTMLPullParser(events=("end",), tag="article", encoding=encoding)
+        except LookupError:
+            # Unknown charset in the response headers, detect it from the page instead
+            self.parser = etree.HTMLPullParser(events=("end",), tag="article")
+        self.offers: List[ListingOffer] = []
+
+    @property
+    def done(self) -> bool:
+        """Whether max_offers offers have been collected"""
+        return self.max_offers is not None and len(self.offers) >= self.max_offers
+
+    def feed(self, data) -> List[ListingOffer]:
+        """
+        Parse the next chunk of the page
+
+        Returns:
+            Offers completed by this chunk
+        """
+        if self.done:
+            return []
+
+        self.parser.feed(data)
+        return self._drain()
+
+    def close(self) -> List[ListingOffer]:
+        """Finish parsing and return offers completed by the end of the page"""
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            pass  # Truncated or empty documents still yield the offers seen so far
+        return self._drain()
+
+    def _drain(self) -> List[ListingOffer]:
+        """Turn finished <article> elements into offers and free them"""
+        found = []
+        for _, article in self.parser.read_events():
+            if self.done:
+                continue
+
+            offer = parse_offer(article, self.base_url)
+            if offer is not None:
+                self.offers.append(offer)
+                found.append(offer)
+
+            # Nested articles are handled with their parent's subtree
+            if article.getparent() is not None and article.getparent().tag != 'article':
+                article.clear()
+                while article.getprevious() is not None:
+                    del article.getparent()[0]
+        return found
+
+def parse_allegro_listing(html, max_offers: Optional[int] = None,
+                          base_url: str = "https://allegro.pl") -> List[ListingOffer]:
+    """
+    Parse a whole Allegro listing page
+
+    Args:
+        html: Page as str or bytes
+        max_offers: Stop after this many offers
+        base_url: Prefix for relative offer links
+
+    Returns:
+        Offers in page order
+    """
+    parser = AllegroListingParser(base_url=base_url, max_offers=max_offers)
+    parser.feed(html)
+    parser.close()
+    return parser.offers
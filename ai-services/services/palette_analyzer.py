@@ -3,17 +3,278 @@ Palette Analyzer Service
 Analyzes entire palettes for profitability and risk assessment
 """
 
-from typing import Dict, List, Any
-import statistics
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Any, Optional, Sequence, Tuple
+import numpy as np
 import structlog
 from .cache_manager import cache_manager
+from .single_flight import SingleFlight
 
 logger = structlog.get_logger()
 
-class PaletteAnalyzer:
+class PaletteAggregate:
+    """
+    Running palette aggregates composed from per-product contributions
+    
+    Each product contributes its category, profitability score and risk level
+    to running totals, so products are added or removed in O(1) each, palettes
+    merge in O(#categories) and memory stays O(#categories) however many
+    products stream through.
+    """
+    
     def __init__(self):
-        """Initialize the palette analyzer"""
+        """Initialize an empty aggregate"""
+        self.total_products = 0
+        self.score_total = 0
+        self.risk_counts: Counter = Counter()
+        self.category_stats: Dict[str, Dict[str, Any]] = {}  # In first-seen order
+        self.distribution = {"excellent": 0, "good": 0, "average": 0, "poor": 0}
+    
+    @classmethod
+    def from_analyses(cls, product_analyses: Iterable[Dict[str, Any]]) -> "PaletteAggregate":
+        """Build the aggregate of a palette in one pass"""
+        aggregate = cls()
+        aggregate.add(product_analyses)
+        return aggregate
+    
+    @classmethod
+    def from_columns(cls, categories: Sequence[str], scores: Sequence[Any],
+                     risk_levels: Sequence[str]) -> "PaletteAggregate":
+        """
+        Build the aggregate from columns with vectorized NumPy counting
+        
+        Categories and risk levels are integer-coded in first-seen order, then
+        counts, per-category score sums and distribution buckets come from
+        np.bincount. Faster than add() from a few hundred products on.
+        
+        Args:
+            categories: Category per product
+            scores: Profitability score per product
+            risk_levels: Risk level per product
+        """
+        aggregate = cls()
+        if not len(scores):
+            return aggregate
+        
+        category_index: Dict[str, int] = {}
+        category_codes = np.array([category_index.setdefault(category, len(category_index))
+                                   for category in categories], dtype=np.intp)
+        risk_index: Dict[str, int] = {}
+        risk_codes = np.array([risk_index.setdefault(risk_level, len(risk_index))
+                               for risk_level in risk_levels], dtype=np.intp)
+        
+        score_array = np.asarray(scores)
+        integer_scores = score_array.dtype.kind in "iu"
+        if score_array.dtype.kind not in "iuf":
+            score_array = score_array.astype(np.float64)
+        
+        counts = np.bincount(category_codes, minlength=len(category_index))
+        totals = np.bincount(category_codes, weights=score_array, minlength=len(category_index))
+        risk_counts = np.bincount(risk_codes, minlength=len(risk_index))
+        buckets = np.bincount(np.digitize(score_array, SCORE_BUCKET_EDGES), minlength=4)
+        
+        # Integer sums are exact in float64 below 2**53; float sums run in input order like add()
+        to_score = int if integer_scores else float
+        aggregate.total_products = len(score_array)
+        aggregate.score_total = int(score_array.sum()) if integer_scores else float(np.cumsum(score_array)[-1])
+        aggregate.risk_counts = Counter({
+            risk_level: int(risk_counts[code]) for risk_level, code in risk_index.items()
+        })
+        aggregate.category_stats = {
+            category: {"count": int(counts[code]), "total_score": to_score(totals[code])}
+            for category, code in category_index.items()
+        }
+        aggregate.distribution = {
+            "excellent": int(buckets[3]),
+            "good": int(buckets[2]),
+            "average": int(buckets[1]),
+            "poor": int(buckets[0])
+        }
+        return aggregate
+    
+    def add(self, product_analyses: Iterable[Dict[str, Any]]) -> None:
+        """Add products to the palette"""
+        category_stats = self.category_stats
+        risk_counts = self.risk_counts
+        distribution = self.distribution
+        total_products = 0
+        score_total = 0
+        
+        for p in product_analyses:
+            category = p.get("category", "Unknown")
+            score = p.get("profitability_score", 0)
+            
+            total_products += 1
+            score_total += score
+            risk_counts[p.get("risk_level", "unknown")] += 1
+            
+            stats = category_stats.get(category)
+            if stats is None:
+                stats = category_stats[category] = {"count": 0, "total_score": 0}
+            stats["count"] += 1
+            stats["total_score"] += score
+            
+            distribution[score_bucket(score)] += 1
+        
+        self.total_products += total_products
+        self.score_total += score_total
+    
+    def remove(self, product_analyses: Iterable[Dict[str, Any]]) -> None:
+        """
+        Remove products from the palette
+        
+        Raises:
+            ValueError: If the products cannot all be part of the palette
+        """
+        removed = PaletteAggregate.from_analyses(product_analyses)
+        
+        # Check everything before changing anything
+        for category, stats in removed.category_stats.items():
+            if self.category_stats.get(category, {}).get("count", 0) < stats["count"]:
+                raise ValueError(f"Product not in palette: category {category}")
+        for risk_level, count in removed.risk_counts.items():
+            if self.risk_counts[risk_level] < count:
+                raise ValueError(f"Product not in palette: risk level {risk_level}")
+        
+        self._combine(removed, -1)
+    
+    def merge(self, other: "PaletteAggregate") -> "PaletteAggregate":
+        """Combine two palettes into a new aggregate"""
+        merged = PaletteAggregate()
+        merged._combine(self, 1)
+        merged._combine(other, 1)
+        return merged
+    
+    def _combine(self, other: "PaletteAggregate", sign: int) -> None:
+        """Add (sign 1) or subtract (sign -1) another aggregate's totals"""
+        self.total_products += sign * other.total_products
+        self.score_total += sign * other.score_total
+        
+        for risk_level, count in other.risk_counts.items():
+            self.risk_counts[risk_level] += sign * count
+            if not self.risk_counts[risk_level]:
+                del self.risk_counts[risk_level]
+        
+        for category, other_stats in other.category_stats.items():
+            stats = self.category_stats.get(category)
+            if stats is None:
+                stats = self.category_stats[category] = {"count": 0, "total_score": 0}
+            stats["count"] += sign * other_stats["count"]
+            stats["total_score"] += sign * other_stats["total_score"]
+            if not stats["count"]:
+                del self.category_stats[category]
+        
+        for bucket, count in other.distribution.items():
+            self.distribution[bucket] += sign * count
+    
+    def summarize(self) -> Dict[str, Any]:
+        """
+        Get palette totals
+        
+        Returns:
+            Dict with total_products, score_total, risk_counts, category_stats
+            (count and total_score per category, in first-seen order) and
+            profitability_distribution
+        """
+        return {
+            "total_products": self.total_products,
+            "score_total": self.score_total,
+            "risk_counts": Counter(self.risk_counts),
+            "category_stats": {category: dict(stats) for category, stats in self.category_stats.items()},
+            "profitability_distribution": dict(self.distribution)
+        }
+
+# Lower bounds of the average, good and excellent buckets, for np.digitize
+SCORE_BUCKET_EDGES = np.array([55, 70, 85])
+
+def score_bucket(score: Any) -> str:
+    """Profitability distribution bucket of a score"""
+    if score >= 85:
+        return "excellent"
+    if score >= 70:
+        return "good"
+    if score >= 55:
+        return "average"
+    return "poor"
+
+class PaletteState:
+    """An open palette analysis that deltas update in place"""
+    
+    def __init__(self, product_analyses: List[Dict[str, Any]], aggregate: PaletteAggregate):
+        """
+        Initialize the palette state
+        
+        Args:
+            product_analyses: Product analysis results, one per palette line
+            aggregate: Aggregate of product_analyses
+        """
+        self.aggregate = aggregate
+        self.lock = threading.Lock()
+        self.touched_at = time.time()
+        
+        # (product name, analysis) per line, in palette order (a line may repeat)
+        self.lines: List[Tuple[str, Dict[str, Any]]] = [
+            (product_analysis.get("original_name", ""), product_analysis)
+            for product_analysis in product_analyses
+        ]
+    
+    def add_lines(self, product_analyses: List[Dict[str, Any]]) -> None:
+        """Append lines to the end of the palette"""
+        self.lines.extend((product_analysis.get("original_name", ""), product_analysis)
+                          for product_analysis in product_analyses)
+    
+    def remove_lines(self, product_names: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Remove the last occurrence of each product name, in one pass
+        
+        Returns:
+            (removed analyses, names with no occurrence left to remove)
+        """
+        to_remove = Counter(product_names)
+        removed = []
+        kept = []
+        for product_name, product_analysis in reversed(self.lines):
+            if to_remove[product_name] > 0:
+                to_remove[product_name] -= 1
+                removed.append(product_analysis)
+            else:
+                kept.append((product_name, product_analysis))
+        
+        kept.reverse()
+        self.lines = kept
+        return removed, list((+to_remove).elements())
+    
+    def product_analyses(self) -> List[Dict[str, Any]]:
+        """Current product analyses in palette order"""
+        return [product_analysis for _, product_analysis in self.lines]
+
+class PaletteAnalyzer:
+    def __init__(self, max_open_palettes: int = 128, palette_ttl: float = 1800,
+                 columnar_threshold: int = 200, max_open_lines: int = 200000):
+        """
+        Initialize the palette analyzer
+        
+        Args:
+            max_open_palettes: Palette states kept for delta updates
+            palette_ttl: Seconds an unused palette state is kept
+            columnar_threshold: Palette size from which the NumPy kernel is used
+            max_open_lines: Product lines kept across all palette states
+        """
         self.logger = logger.bind(service="palette_analyzer")
+        self.in_flight = SingleFlight("palette_analysis")
+        self.columnar_threshold = columnar_threshold
+        
+        # Open palettes by analysis ID, least recently used first
+        self.max_open_palettes = max_open_palettes
+        self.palette_ttl = palette_ttl
+        self.max_open_lines = max_open_lines
+        self.palette_states: "OrderedDict[str, PaletteState]" = OrderedDict()
+        self.open_lines = 0  # Lines held by palette_states, as of their last change
+        self.states_lock = threading.Lock()
+        
         self.logger.info("Palette analyzer initialized")
     
     def analyze_palette(self, product_analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -31,39 +292,101 @@ class PaletteAnalyzer:
         if not product_analyses:
             return self._empty_analysis()
         
-        # Create cache key from product list
+        # Create cache key from product list once, for lookup and store
         product_names = [p.get("original_name", "") for p in product_analyses]
+        palette_key = cache_manager.palette_analysis_key(product_names)
         
         # Check cache first
-        cached_result = cache_manager.get_cached_palette_analysis(product_names)
+        cached_result = cache_manager.get_cached_palette_analysis(product_names, key=palette_key)
         if cached_result:
             self.logger.info("Palette analysis served from cache", product_count=len(product_analyses))
             return cached_result
         
-        # Calculate aggregate metrics
-        profitability_scores = [p.get("profitability_score", 0) for p in product_analyses]
-        risk_levels = [p.get("risk_level", "unknown") for p in product_analyses]
-        recommendations = [p.get("recommendation", "NO") for p in product_analyses]
+        # Concurrent uploads of the same manifest share one computation
+        return self.in_flight.do(palette_key, self._compute_palette,
+                                 product_analyses, product_names, palette_key)
+    
+    def _compute_palette(self, product_analyses: List[Dict[str, Any]], product_names: List[str],
+                         palette_key: str, aggregate: Optional[PaletteAggregate] = None) -> Dict[str, Any]:
+        """Aggregate an uncached palette (unless the caller already did) and cache the result"""
+        if aggregate is None:
+            aggregate = self.aggregate_palette(product_analyses)
+        result = self.summarize_palette(aggregate)
+        
+        # Cache the result
+        cache_manager.cache_palette_analysis(product_names, result, key=palette_key)
+        
+        self.logger.info("Palette analysis completed",
+                        average_profitability=result["average_profitability"],
+                        high_risk_count=result["high_risk_count"],
+                        recommendation=result["buy_recommendation"],
+                        estimated_roi=result["estimated_roi"])
+        
+        return result
+    
+    def aggregate_palette(self, product_analyses: List[Dict[str, Any]]) -> PaletteAggregate:
+        """Aggregate a palette, with the columnar NumPy kernel for large palettes"""
+        if len(product_analyses) < self.columnar_threshold:
+            return PaletteAggregate.from_analyses(product_analyses)
+        
+        return PaletteAggregate.from_columns(
+            [p.get("category", "Unknown") for p in product_analyses],
+            [p.get("profitability_score", 0) for p in product_analyses],
+            [p.get("risk_level", "unknown") for p in product_analyses]
+        )
+    
+    def analyze_palette_stream(self, product_analyses: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Analyze a palette of any size in one pass without caching
+        
+        Product analyses are consumed from the iterable one at a time, so
+        memory stays O(#categories) for very large consolidated manifests.
+        
+        Args:
+            product_analyses: Iterable of product analysis results
+            
+        Returns:
+            Dict with palette analysis, as from analyze_palette
+        """
+        aggregate = PaletteAggregate.from_analyses(product_analyses)
+        
+        self.logger.info("Palette stream analyzed", product_count=aggregate.total_products)
+        
+        return self.summarize_palette(aggregate)
+    
+    def summarize_palette(self, aggregate: PaletteAggregate) -> Dict[str, Any]:
+        """
+        Build the palette analysis from aggregated contributions
+        
+        Args:
+            aggregate: Contributions of the palette's products
+            
+        Returns:
+            Dict with palette analysis
+        """
+        totals = aggregate.summarize()
+        total_products = totals["total_products"]
+        if not total_products:
+            return self._empty_analysis()
         
         # Calculate averages and counts
-        average_profitability = statistics.mean(profitability_scores) if profitability_scores else 0
-        high_risk_count = risk_levels.count("high")
-        medium_risk_count = risk_levels.count("medium")
-        low_risk_count = risk_levels.count("low")
+        average_profitability = totals["score_total"] / total_products
+        high_risk_count = totals["risk_counts"]["high"]
+        medium_risk_count = totals["risk_counts"]["medium"]
+        low_risk_count = totals["risk_counts"]["low"]
         
         # Analyze categories
-        categories = [p.get("category", "Unknown") for p in product_analyses]
-        category_distribution = self._analyze_categories(categories, profitability_scores)
+        category_distribution = self._analyze_categories(totals["category_stats"], total_products)
         recommended_categories = self._get_recommended_categories(category_distribution)
         
         # Generate overall recommendation
         buy_recommendation = self._generate_palette_recommendation(
-            average_profitability, high_risk_count, len(product_analyses)
+            average_profitability, high_risk_count, total_products
         )
         
         # Assess overall risk
         risk_assessment = self._assess_palette_risk(
-            high_risk_count, medium_risk_count, len(product_analyses)
+            high_risk_count, medium_risk_count, total_products
         )
         
         # Calculate estimated ROI for entire palette
@@ -71,7 +394,7 @@ class PaletteAnalyzer:
             average_profitability, risk_assessment, category_distribution
         )
         
-        result = {
+        return {
             "average_profitability": round(average_profitability, 1),
             "high_risk_count": high_risk_count,
             "medium_risk_count": medium_risk_count,
@@ -81,43 +404,154 @@ class PaletteAnalyzer:
             "risk_assessment": risk_assessment,
             "estimated_roi": round(estimated_roi, 1),
             "category_distribution": category_distribution,
-            "total_products": len(product_analyses),
-            "profitability_distribution": self._analyze_profitability_distribution(profitability_scores)
+            "total_products": total_products,
+            "profitability_distribution": totals["profitability_distribution"]
         }
+    
+    def _analyze_categories(self, category_stats: Dict[str, Dict[str, Any]],
+                            total_products: int) -> Dict[str, Dict[str, Any]]:
+        """Analyze category distribution and performance"""
+        category_distribution = {}
         
-        # Cache the result
-        cache_manager.cache_palette_analysis(product_names, result)
+        # Calculate averages
+        for category, stats in category_stats.items():
+            category_distribution[category] = {
+                "count": stats["count"],
+                "total_score": stats["total_score"],
+                "average_score": round(stats["total_score"] / stats["count"], 1),
+                "percentage": round((stats["count"] / total_products) * 100, 1)
+            }
         
-        self.logger.info("Palette analysis completed",
-                        average_profitability=average_profitability,
-                        high_risk_count=high_risk_count,
-                        recommendation=buy_recommendation,
-                        estimated_roi=estimated_roi)
+        return category_distribution
+    
+    def open_palette(self, product_analyses: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Keep a palette's aggregates so later deltas avoid reanalyzing it
         
-        return result
+        Args:
+            product_analyses: Product analysis results, one per palette line
+            
+        Returns:
+            Analysis ID for apply_palette_delta, None if the palette is too large to keep
+        """
+        return self._store_palette_state(PaletteState(product_analyses, self.aggregate_palette(product_analyses)))
     
-    def _analyze_categories(self, categories: List[str], scores: List[int]) -> Dict[str, Dict[str, Any]]:
-        """Analyze category distribution and performance"""
-        category_stats = {}
-        
-        for category, score in zip(categories, scores):
-            if category not in category_stats:
-                category_stats[category] = {
-                    "count": 0,
-                    "total_score": 0,
-                    "scores": []
-                }
+    def analyze_and_open_palette(self, product_analyses: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Analyze a palette and keep it open for deltas, aggregating it once
+        
+        Args:
+            product_analyses: Product analysis results, one per palette line
             
-            category_stats[category]["count"] += 1
-            category_stats[category]["total_score"] += score
-            category_stats[category]["scores"].append(score)
+        Returns:
+            (palette analysis, analysis ID or None if the palette is too large to keep)
+        """
+        self.logger.info("Analyzing palette", product_count=len(product_analyses))
         
-        # Calculate averages
-        for category, stats in category_stats.items():
-            stats["average_score"] = round(stats["total_score"] / stats["count"], 1)
-            stats["percentage"] = round((stats["count"] / len(categories)) * 100, 1)
+        aggregate = self.aggregate_palette(product_analyses)
+        if product_analyses:
+            product_names = [p.get("original_name", "") for p in product_analyses]
+            palette_key = cache_manager.palette_analysis_key(product_names)
+            result = self._compute_palette(product_analyses, product_names, palette_key, aggregate)
+        else:
+            result = self._empty_analysis()
+        
+        # summarize_palette copies out of the aggregate, so deltas can keep updating it
+        return result, self._store_palette_state(PaletteState(product_analyses, aggregate))
+    
+    def _store_palette_state(self, state: PaletteState) -> Optional[str]:
+        """Register an open palette, evicting least recently used ones over the bounds"""
+        if len(state.lines) > self.max_open_lines:
+            self.logger.warning("Palette too large to keep open for deltas",
+                               product_count=len(state.lines),
+                               max_open_lines=self.max_open_lines)
+            return None
+        
+        analysis_id = uuid.uuid4().hex
+        with self.states_lock:
+            self._expire_palette_states(state.touched_at)
+            self.palette_states[analysis_id] = state
+            self.open_lines += len(state.lines)
+            self._evict_palette_states()
+        
+        return analysis_id
+    
+    def _evict_palette_states(self) -> None:
+        """Drop least recently used palettes over the count or line budget (caller holds states_lock)"""
+        while self.palette_states and (len(self.palette_states) > self.max_open_palettes
+                                       or self.open_lines > self.max_open_lines):
+            _, state = self.palette_states.popitem(last=False)
+            self.open_lines -= len(state.lines)
+    
+    def apply_palette_delta(self, analysis_id: str, added_analyses: List[Dict[str, Any]],
+                            removed_products: List[str]) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Add and remove palette lines, updating the open palette in place
         
-        return category_stats
+        Args:
+            analysis_id: ID from open_palette
+            added_analyses: Product analysis results of added lines
+            removed_products: Removed product lines (one occurrence each)
+            
+        Returns:
+            (palette analysis, current product analyses), None if the ID is unknown or expired
+        """
+        current_time = time.time()
+        with self.states_lock:
+            self._expire_palette_states(current_time)
+            state = self.palette_states.get(analysis_id)
+            if state is None:
+                return None
+            state.touched_at = current_time
+            self.palette_states.move_to_end(analysis_id)
+        
+        with state.lock:
+            line_count = len(state.lines)
+            removed, missing = state.remove_lines(removed_products)
+            for product_name in missing:
+                self.logger.warning("Removed product not in palette", analysis_id=analysis_id,
+                                   product_name=product_name)
+            
+            state.add_lines(added_analyses)
+            line_change = len(state.lines) - line_count
+            
+            state.aggregate.remove(removed)
+            state.aggregate.add(added_analyses)
+            
+            result = self.summarize_palette(state.aggregate)
+            product_analyses = state.product_analyses()
+        
+        # Growing palettes count against the line budget too
+        with self.states_lock:
+            if self.palette_states.get(analysis_id) is state:
+                self.open_lines += line_change
+                self._evict_palette_states()
+        
+        self.logger.info("Palette delta applied",
+                        analysis_id=analysis_id,
+                        added_count=len(added_analyses),
+                        removed_count=len(removed),
+                        product_count=result["total_products"])
+        
+        return result, product_analyses
+    
+    def close_palette(self, analysis_id: str) -> bool:
+        """Drop an open palette, returns False if it was not open"""
+        with self.states_lock:
+            state = self.palette_states.pop(analysis_id, None)
+            if state is None:
+                return False
+            self.open_lines -= len(state.lines)
+            return True
+    
+    def _expire_palette_states(self, current_time: float) -> None:
+        """Drop palettes unused for longer than the TTL (caller holds states_lock)"""
+        while self.palette_states:
+            analysis_id, state = next(iter(self.palette_states.items()))
+            if current_time - state.touched_at <= self.palette_ttl:
+                break
+            del self.palette_states[analysis_id]
+            self.open_lines -= len(state.lines)
     
     def _get_recommended_categories(self, category_distribution: Dict[str, Dict[str, Any]]) -> List[str]:
         """Get categories with high profitability"""
@@ -192,23 +626,6 @@ class PaletteAnalyzer:
         
         return max(0, min(40, base_roi))  # Cap between 0-40%
     
-    def _analyze_profitability_distribution(self, scores: List[int]) -> Dict[str, int]:
-        """Analyze distribution of profitability scores"""
-        if not scores:
-            return {}
-        
-        excellent = sum(1 for score in scores if score >= 85)
-        good = sum(1 for score in scores if 70 <= score < 85)
-        average = sum(1 for score in scores if 55 <= score < 70)
-        poor = sum(1 for score in scores if score < 55)
-        
-        return {
-            "excellent": excellent,
-            "good": good,
-            "average": average,
-            "poor": poor
-        }
-    
     def _empty_analysis(self) -> Dict[str, Any]:
         """Return empty analysis for empty palette"""
         return {
@@ -0,0 +1,213 @@
+"""
+Palette Sharding Service
+Spreads normalization and profitability scoring of large palettes across processes
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import structlog
+from .cache_manager import cache_manager
+from .product_normalizer import ProductNormalizer
+from .profitability_analyzer import ProfitabilityAnalyzer
+
+logger = structlog.get_logger()
+
+# Per-process services, created once by the pool initializer
+_worker_normalizer: Optional[ProductNormalizer] = None
+_worker_profitability_analyzer: Optional[ProfitabilityAnalyzer] = None
+
+def _init_worker(fast_mode: bool) -> None:
+    """Preload services in a worker process"""
+    global _worker_normalizer, _worker_profitability_analyzer
+    _worker_normalizer = ProductNormalizer(fast_mode=fast_mode)
+    _worker_profitability_analyzer = ProfitabilityAnalyzer()
+
+def normalize_products_isolated(normalizer: ProductNormalizer, product_names: List[str],
+                                **batch_options) -> List[Optional[Dict[str, Any]]]:
+    """
+    Normalize products in one batch, falling back to one by one if the batch fails
+
+    Returns:
+        Normalized data per product in input order, None where normalization failed
+    """
+    try:
+        return normalizer.normalize_products(product_names, **batch_options)
+    except Exception as e:
+        logger.warning("Batch normalization failed, normalizing products one by one",
+                      product_count=len(product_names),
+                      error=str(e))
+
+    normalized_products = []
+    for product_name in product_names:
+        try:
+            normalized_products.append(normalizer.normalize_product(product_name))
+        except Exception as e:
+            logger.warning("Error normalizing product in palette",
+                          product_name=product_name,
+                          error=str(e))
+            normalized_products.append(None)
+    return normalized_products
+
+def score_products(profitability_analyzer: ProfitabilityAnalyzer,
+                   normalized_products: List[Tuple[str, Optional[Dict[str, Any]]]]
+                   ) -> List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """
+    Score (product_name, normalized) pairs for profitability
+
+    Returns:
+        (normalized, profitability) per product in input order, None where analysis failed
+    """
+    results = []
+    for product_name, normalized in normalized_products:
+        if normalized is None:
+            results.append(None)
+            continue
+        try:
+            profitability = profitability_analyzer.analyze_product(
+                normalized["brand"],
+                normalized["category"],
+                normalized["model"]
+            )
+            results.append((normalized, profitability))
+        except Exception as e:
+            logger.warning("Error analyzing product in palette",
+                          product_name=product_name,
+                          error=str(e))
+            # Continue with other products
+            results.append(None)
+    return results
+
+def analyze_product_batch(normalizer: ProductNormalizer, profitability_analyzer: ProfitabilityAnalyzer,
+                          product_names: List[str], **batch_options
+                          ) -> List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """
+    Normalize and score products, isolating failures to the products that caused them
+
+    Args:
+        normalizer: Product normalizer
+        profitability_analyzer: Profitability analyzer
+        product_names: Palette product names
+        batch_options: batch_size and n_process for normalize_products
+
+    Returns:
+        (normalized, profitability) per product in input order, None where analysis failed
+    """
+    normalized_products = normalize_products_isolated(normalizer, product_names, **batch_options)
+    return score_products(profitability_analyzer, list(zip(product_names, normalized_products)))
+
+def _analyze_shard(product_names: List[str]) -> List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """
+    Normalize and score one shard of products inside a worker
+
+    Returns:
+        (normalized, profitability) per product in shard order, None where analysis failed
+    """
+    return analyze_product_batch(_worker_normalizer, _worker_profitability_analyzer, product_names)
+
+class PaletteShardPool:
+    """Process pool that analyzes large palettes in ordered shards"""
+
+    def __init__(self, max_workers: Optional[int] = None, shard_size: int = 500,
+                 threshold: int = 2000, fast_mode: bool = False,
+                 profitability_analyzer: Optional[ProfitabilityAnalyzer] = None):
+        """
+        Initialize the shard pool (worker processes start on first use)
+
+        Args:
+            max_workers: Number of worker processes, defaults to CPU count
+            shard_size: Number of products per shard
+            threshold: Minimum palette size worth sharding
+            fast_mode: Run worker normalizers in regex-only fast mode
+            profitability_analyzer: Scores products whose normalization is cached here
+        """
+        self.logger = logger.bind(service="palette_sharding")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.threshold = threshold
+        self.fast_mode = fast_mode
+        self.profitability_analyzer = profitability_analyzer or ProfitabilityAnalyzer()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        self.logger.info("Palette shard pool initialized",
+                        max_workers=self.max_workers,
+                        shard_size=shard_size,
+                        threshold=threshold)
+
+    def should_shard(self, product_count: int) -> bool:
+        """Check whether a palette is large enough to shard"""
+        return self.max_workers > 1 and product_count >= self.threshold
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool on first use"""
+        if self.executor is None:
+            # Spawn avoids forking the server's threads and loaded models
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.fast_mode,)
+            )
+        return self.executor
+
+    async def analyze_products(self, product_names: List[str]) -> List[Optional[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+        """
+        Analyze products across worker processes
+
+        Args:
+            product_names: Palette product names
+
+        Returns:
+            (normalized, profitability) per product in input order, None where analysis failed
+        """
+        loop = asyncio.get_running_loop()
+        analyzed: Dict[str, Optional[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+
+        # Products normalized before are only scored, here and off the event loop
+        unique_names = list(dict.fromkeys(product_names))
+        cached = await loop.run_in_executor(
+            None, cache_manager.get_cached_product_analyses, [(name, "") for name in unique_names]
+        )
+        hits = [(name, cached[(name, "")]) for name in unique_names if (name, "") in cached]
+        if hits:
+            scored = await loop.run_in_executor(None, score_products, self.profitability_analyzer, hits)
+            analyzed.update(zip((name for name, _ in hits), scored))
+
+        misses = [name for name in unique_names if (name, "") not in cached]
+        shards = [
+            misses[start:start + self.shard_size]
+            for start in range(0, len(misses), self.shard_size)
+        ]
+
+        self.logger.info("Analyzing palette in shards",
+                        product_count=len(product_names),
+                        cached_count=len(hits),
+                        shard_count=len(shards))
+
+        if shards:
+            executor = self._get_executor()
+            shard_results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _analyze_shard, shard) for shard in shards
+            ])
+
+            # Merge the shards and keep their normalizations in this process' cache too
+            normalized_products = {}
+            for shard, shard_result in zip(shards, shard_results):
+                for product_name, item in zip(shard, shard_result):
+                    if item is not None:
+                        normalized_products[(product_name, "")] = item[0]
+                    analyzed[product_name] = item
+
+            if normalized_products:
+                await loop.run_in_executor(None, cache_manager.cache_product_analyses, normalized_products)
+
+        return [analyzed[product_name] for product_name in product_names]
+
+    def shutdown(self) -> None:
+        """Stop worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            self.logger.info("Palette shard pool shut down")
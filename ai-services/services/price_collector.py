@@ -6,16 +6,28 @@ Handles market price data collection from various sources
 import asyncio
 import aiohttp
 import json
+import multiprocessing
 import time
-from typing import Dict, List, Optional, Any
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any, Set
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 import structlog
 import re
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlsplit
+from .cache_manager import cache_manager, canonical_key
+from .listing_parser import AllegroListingParser, ListingOffer, parse_allegro_listing
+from .rate_limiter import RateLimiter
+from .resilience import CircuitBreaker, CircuitOpenError, backoff_delay, hedged
+from .single_flight import AsyncSingleFlight
 
 logger = structlog.get_logger()
 
+# Responses worth retrying; they also count against the source's circuit breaker
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
 @dataclass
 class PriceData:
     """Price data structure"""
@@ -28,18 +40,120 @@ class PriceData:
     condition: str = "new"  # new, used, refurbished
     seller_rating: Optional[float] = None
     availability: bool = True
+    title: Optional[str] = None  # Offer title as listed by the source
+
+def decode_page(data: bytes, charset: Optional[str]) -> str:
+    """Decode a page in its declared charset, UTF-8 if none is declared or it is unknown"""
+    try:
+        return data.decode(charset or "utf-8", "replace")
+    except LookupError:
+        return data.decode("utf-8", "replace")
 
 class PriceCollector:
     """Collects price data from various market sources"""
     
-    def __init__(self):
-        """Initialize the price collector"""
+    # Shortest attempt worth starting before a scrape's deadline runs out
+    MIN_ATTEMPT_SECONDS = 0.1
+    
+    def __init__(self, max_connections: int = 64, max_connections_per_host: int = 8,
+                 keepalive_timeout: float = 30, dns_cache_ttl: int = 300,
+                 requests_per_second: float = 2.0, burst: int = 4,
+                 parse_workers: int = 2, parse_processes: bool = False,
+                 max_page_bytes: int = 3 * 1024 * 1024, stream_chunk_bytes: int = 64 * 1024,
+                 cache_ttl: int = 900, stale_ttl: int = 3600, negative_ttl: int = 60,
+                 request_timeout: float = 10, max_retries: int = 2, retry_backoff: float = 0.2,
+                 breaker_failures: int = 5, breaker_reset: float = 30, hedge_delay: float = 0,
+                 scrape_deadline: float = 15):
+        """
+        Initialize the price collector
+        
+        Args:
+            max_connections: Pooled connections across all hosts
+            max_connections_per_host: Pooled connections to one host
+            keepalive_timeout: Seconds an idle connection is kept open
+            dns_cache_ttl: Seconds resolved addresses are reused
+            requests_per_second: Request budget per source host, 0 disables limiting
+            burst: Requests a source may receive at once after being idle
+            parse_workers: Workers parsing pages off the event loop, 0 parses inline
+            parse_processes: Parse in worker processes instead of threads
+            max_page_bytes: Bytes read from a listing page before parsing stops
+            stream_chunk_bytes: Size of the chunks a page is read and parsed in
+            cache_ttl: Seconds collected prices are served as fresh, 0 disables caching
+            stale_ttl: Further seconds they are served while being refreshed
+            negative_ttl: Seconds a failed collection is remembered before retrying
+            request_timeout: Seconds one request attempt may take
+            max_retries: Retries of a failed request, with jittered exponential backoff
+            retry_backoff: Upper bound of the first backoff delay in seconds
+            breaker_failures: Consecutive failures that open a source's circuit
+            breaker_reset: Seconds an open circuit fails fast before a probe request
+            hedge_delay: Seconds before a slow request is duplicated, 0 disables hedging
+            scrape_deadline: Seconds one scrape may take across all its attempts
+        """
         self.logger = logger.bind(service="price_collector")
+        self.in_flight = AsyncSingleFlight("price_collection")
         
         # Configuration
         self.max_concurrent_requests = 5
-        self.request_delay = 0.5  # seconds between requests
-        self.timeout = 10  # seconds
+        self.timeout = request_timeout  # seconds
+        self.allegro_url = "https://allegro.pl/listing"
+        
+        # HTTP session shared by all requests, so connections, TLS sessions
+        # and DNS lookups are reused; created on the event loop that uses it
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.session_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Request pacing per source, shared by all concurrent collections
+        self.rate_limiter = RateLimiter(requests_per_second, burst)
+        
+        # Bounded pool for CPU-bound page parsing, so fetching and parsing overlap
+        self.parse_workers = parse_workers
+        self.parse_processes = parse_processes
+        self.parse_executor: Optional[ProcessPoolExecutor] = None
+        # lxml incremental parsers must stay on one thread, so the thread pool is
+        # a set of single-thread lanes and each page is parsed on one lane
+        self.parse_lanes: List[ThreadPoolExecutor] = []
+        self.lane_pages: List[int] = []
+        
+        # Listing pages are streamed and parsed as they arrive, stopping at the byte cap
+        self.max_page_bytes = max_page_bytes
+        self.stream_chunk_bytes = stream_chunk_bytes
+        
+        # Price cache in the "prices" namespace: fresh entries are served as they
+        # are, stale ones while a background refresh runs, failures briefly
+        self.cache_ttl = cache_ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_tasks: Set[asyncio.Task] = set()
+        self.cache_stats = {'stale_served': 0, 'negative_hits': 0, 'refresh_failures': 0}
+        
+        # Failure handling per source: retries, circuit breakers and hedging
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = 10 * retry_backoff
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.hedge_delay = hedge_delay
+        self.scrape_deadline = scrape_deadline
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.resilience_stats = {'retries': 0, 'failed_requests': 0, 'hedges': 0, 'hedge_wins': 0}
+        
+        # Fetch/parse pipeline gauges and totals, updated on the event loop
+        self.pipeline_stats = {
+            'fetches_in_flight': 0,
+            'parses_pending': 0,
+            'max_parse_queue_depth': 0,
+            'fetches': 0,
+            'parse_tasks': 0,
+            'fetch_seconds': 0.0,
+            'parse_seconds': 0.0,
+            'bytes_received': 0,
+            'pages_stopped_early': 0,
+            'pages_truncated': 0
+        }
         
         # User agents for web scraping
         self.user_agents = [
@@ -48,17 +162,307 @@ class PriceCollector:
             'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         ]
         
-        # Price patterns for extraction
-        self.price_patterns = [
-            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*PLN',
-            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*zł',
-            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*€',
-            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*\$',
-            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)'
-        ]
-        
         self.logger.info("Price collector initialized")
     
+    async def start(self) -> aiohttp.ClientSession:
+        """Open the shared HTTP session on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self.session is not None and not self.session.closed and self.session_loop is loop:
+            return self.session
+        
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        self.session_loop = loop
+        self.logger.info("HTTP session opened",
+                        max_connections=self.max_connections,
+                        max_connections_per_host=self.max_connections_per_host)
+        return self.session
+    
+    async def close(self) -> None:
+        """Close the shared HTTP session, its pooled connections and the parse workers"""
+        for task in list(self.refresh_tasks):
+            task.cancel()
+        
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            self.logger.info("HTTP session closed")
+        self.session = None
+        self.session_loop = None
+        
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown(wait=False)
+            self.parse_executor = None
+        for lane in self.parse_lanes:
+            lane.shutdown(wait=False)
+        self.parse_lanes = []
+        self.lane_pages = []
+    
+    def _get_parse_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Create the parse process pool on first use, None unless parsing in processes"""
+        if self.parse_workers <= 0 or not self.parse_processes:
+            return None
+        
+        if self.parse_executor is None:
+            # Spawn avoids forking the server's threads and loaded models
+            self.parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.parse_executor
+    
+    def _acquire_parse_lane(self) -> Optional[int]:
+        """Assign a page to the parse thread with the fewest pages, None when parsing inline"""
+        if self.parse_workers <= 0 or self.parse_processes:
+            return None
+        
+        if not self.parse_lanes:
+            self.parse_lanes = [
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"price_parse_{index}")
+                for index in range(self.parse_workers)
+            ]
+            self.lane_pages = [0] * self.parse_workers
+        
+        lane = min(range(len(self.lane_pages)), key=self.lane_pages.__getitem__)
+        self.lane_pages[lane] += 1
+        return lane
+    
+    def _release_parse_lane(self, lane: Optional[int]) -> None:
+        """Mark a page as no longer parsing on its lane"""
+        if lane is not None and lane < len(self.lane_pages):
+            self.lane_pages[lane] -= 1
+    
+    async def _run_parse(self, executor: Optional[Executor], func: Callable, *args) -> Any:
+        """Run a parsing step on executor, or inline without one"""
+        stats = self.pipeline_stats
+        start_time = time.perf_counter()
+        stats['parses_pending'] += 1
+        stats['max_parse_queue_depth'] = max(stats['max_parse_queue_depth'],
+                                             stats['parses_pending'] - max(self.parse_workers, 1))
+        try:
+            if executor is None:
+                return func(*args)
+            
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            stats['parses_pending'] -= 1
+            stats['parse_tasks'] += 1
+            stats['parse_seconds'] += time.perf_counter() - start_time
+    
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """
+        Get fetch and parse pipeline metrics
+        
+        A parse queue that keeps growing means parsing is the bottleneck;
+        an empty one with many fetches in flight means the network is.
+        Parse time includes time spent waiting for a worker; fetch time of
+        streamed pages includes their parsing.
+        """
+        stats = dict(self.pipeline_stats)
+        stats['parse_workers'] = self.parse_workers
+        stats['parse_queue_depth'] = max(0, stats['parses_pending'] - self.parse_workers)
+        stats['average_fetch_seconds'] = stats['fetch_seconds'] / stats['fetches'] if stats['fetches'] else 0.0
+        stats['average_parse_seconds'] = stats['parse_seconds'] / stats['parse_tasks'] if stats['parse_tasks'] else 0.0
+        for key in ('fetch_seconds', 'parse_seconds', 'average_fetch_seconds', 'average_parse_seconds'):
+            stats[key] = round(stats[key], 4)
+        return stats
+    
+    @asynccontextmanager
+    async def _request(self, url: str, headers: Dict[str, str]) -> AsyncIterator[Optional[aiohttp.ClientResponse]]:
+        """
+        Send a rate-limited GET over the shared session
+        
+        Yields:
+            The response, or None if its status is not 200
+            
+        Raises:
+            aiohttp.ClientResponseError: For statuses worth retrying
+        """
+        session = await self.start()
+        await self.rate_limiter.acquire(urlsplit(url).netloc)
+        
+        stats = self.pipeline_stats
+        start_time = time.perf_counter()
+        stats['fetches_in_flight'] += 1
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status in RETRYABLE_STATUSES:
+                    response.raise_for_status()
+                if response.status != 200:
+                    self.logger.warning("HTTP request failed", status=response.status, url=url)
+                    yield None
+                else:
+                    yield response
+        finally:
+            stats['fetches_in_flight'] -= 1
+            stats['fetches'] += 1
+            stats['fetch_seconds'] += time.perf_counter() - start_time
+    
+    async def _fetch_html(self, url: str, headers: Dict[str, str]) -> Optional[str]:
+        """
+        Fetch a whole page over the shared session
+        
+        Returns:
+            Page HTML, or None if the response status is not 200
+        """
+        async with self._request(url, headers) as response:
+            if response is None:
+                return None
+            return await response.text()
+    
+    async def _fetch_listing(self, url: str, headers: Dict[str, str],
+                             max_offers: Optional[int] = None) -> Optional[List[ListingOffer]]:
+        """
+        Stream a listing page into the incremental parser
+        
+        Reading stops once max_offers offers are found or max_page_bytes
+        have arrived; the rest of the page is never downloaded. Process
+        workers cannot share parser state, so with them the capped page is
+        parsed once it has been read.
+        
+        Returns:
+            Offers found, or None if the response status is not 200
+        """
+        async with self._request(url, headers) as response:
+            if response is None:
+                return None
+            
+            if self.parse_processes:
+                return await self._fetch_listing_whole(response, max_offers)
+            
+            lane = self._acquire_parse_lane()
+            try:
+                return await self._stream_listing(response, max_offers,
+                                                  self.parse_lanes[lane] if lane is not None else None)
+            finally:
+                self._release_parse_lane(lane)
+    
+    async def _stream_listing(self, response: aiohttp.ClientResponse, max_offers: Optional[int],
+                              executor: Optional[Executor]) -> List[ListingOffer]:
+        """Feed a listing response into an incremental parser chunk by chunk on one thread"""
+        stats = self.pipeline_stats
+        parser = AllegroListingParser(max_offers=max_offers, encoding=response.charset)
+        received = 0
+        try:
+            async for chunk in response.content.iter_chunked(self.stream_chunk_bytes):
+                received += len(chunk)
+                await self._run_parse(executor, parser.feed, chunk)
+                if parser.done:
+                    stats['pages_stopped_early'] += 1
+                    return parser.offers
+                
+                if received >= self.max_page_bytes:
+                    stats['pages_truncated'] += 1
+                    break
+        finally:
+            stats['bytes_received'] += received
+        
+        await self._run_parse(executor, parser.close)
+        return parser.offers
+    
+    async def _fetch_listing_whole(self, response: aiohttp.ClientResponse,
+                                   max_offers: Optional[int]) -> List[ListingOffer]:
+        """Read a listing response up to the byte cap and parse it in one step"""
+        stats = self.pipeline_stats
+        chunks = []
+        received = 0
+        try:
+            async for chunk in response.content.iter_chunked(self.stream_chunk_bytes):
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= self.max_page_bytes:
+                    stats['pages_truncated'] += 1
+                    break
+        finally:
+            stats['bytes_received'] += received
+        
+        html = decode_page(b"".join(chunks), response.charset)
+        return await self._run_parse(self._get_parse_executor(), parse_allegro_listing, html, max_offers)
+    
+    def _breaker(self, host: str) -> CircuitBreaker:
+        """Get the circuit breaker for a source host"""
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(host, self.breaker_failures, self.breaker_reset)
+        return breaker
+    
+    async def _fetch_with_retries(self, url: str, headers: Dict[str, str],
+                                  max_offers: Optional[int] = None) -> Optional[List[ListingOffer]]:
+        """
+        Fetch a listing through its source's circuit breaker
+        
+        Connection errors, timeouts and retryable statuses are retried with
+        jittered exponential backoff. With hedge_delay set, an attempt still
+        running after that long is duplicated and the slower copy cancelled.
+        All attempts share scrape_deadline: each may take the request timeout
+        or what is left of the deadline, whichever is shorter, and a retry is
+        skipped once the deadline cannot fit another attempt. Statuses that
+        are not retried count against the source's circuit as well.
+        
+        Returns:
+            Offers found, or None if the response status is not 200
+            
+        Raises:
+            CircuitOpenError: If the source is failing and calls fail fast
+        """
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.scrape_deadline
+        
+        def attempt():
+            return self._fetch_listing(url, headers, max_offers)
+        
+        for retry in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host}")
+            
+            try:
+                if self.hedge_delay > 0:
+                    call = hedged(attempt, self.hedge_delay, self.resilience_stats)
+                else:
+                    call = attempt()
+                offers = await asyncio.wait_for(call, min(self.timeout, deadline - loop.time()))
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                self.resilience_stats['failed_requests'] += 1
+                delay = backoff_delay(retry, self.retry_backoff, self.retry_backoff_max)
+                if retry == self.max_retries or deadline - loop.time() - delay < self.MIN_ATTEMPT_SECONDS:
+                    raise
+                
+                self.resilience_stats['retries'] += 1
+                self.logger.info("Retrying request", url=url, error=type(e).__name__,
+                               status=getattr(e, 'status', None), retry=retry + 1,
+                               delay_seconds=round(delay, 3))
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancellation or a bug on our side says nothing about the source,
+                # but a half-open probe must be handed back or the circuit sticks
+                breaker.release()
+                raise
+            else:
+                if offers is None:
+                    breaker.record_failure()
+                    self.resilience_stats['failed_requests'] += 1
+                else:
+                    breaker.record_success()
+                return offers
+    
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """Get retry and hedging counters and the circuit breaker of each source"""
+        return {
+            **self.resilience_stats,
+            'breakers': {host: breaker.get_stats() for host, breaker in self.breakers.items()}
+        }
+    
     async def collect_prices_for_product(self, product_name: str, max_results: int = 10) -> List[PriceData]:
         """
         Collect prices for a single product from multiple sources
@@ -70,6 +474,83 @@ class PriceCollector:
         Returns:
             List of PriceData objects
         """
+        # Every spelling sharing a cache entry is collected with the same query
+        query = self._normalize_query(product_name)
+        key = self._query_cache_key(query, max_results)
+        entry = cache_manager.get(key, namespace='prices') if self.cache_ttl > 0 else None
+        
+        if entry is not None:
+            if time.time() >= entry['refresh_after']:
+                # Serve stale prices now and refresh them once in the background
+                self.cache_stats['stale_served'] += 1
+                self._schedule_refresh(key, query, max_results, entry)
+            elif not entry['prices']:
+                self.cache_stats['negative_hits'] += 1
+            return list(entry['prices'])
+        
+        # Concurrent requests for the same product share one collection
+        prices = await self.in_flight.do(key, self._collect_and_cache, key, query, max_results)
+        return list(prices)
+    
+    def _price_cache_key(self, product_name: str, max_results: int) -> str:
+        """Generate the cache key for a product name"""
+        return self._query_cache_key(self._normalize_query(product_name), max_results)
+    
+    def _query_cache_key(self, query: str, max_results: int) -> str:
+        """Generate the cache key for a normalized product query"""
+        return canonical_key('prices', [query, str(max_results)])
+    
+    def _schedule_refresh(self, key: str, product_name: str, max_results: int,
+                          previous: Dict[str, Any]) -> None:
+        """Refresh a stale entry in the background, coalesced with other collections of it"""
+        if key in self.in_flight.tasks:
+            return
+        
+        task = asyncio.ensure_future(
+            self.in_flight.do(key, self._collect_and_cache, key, product_name, max_results, previous)
+        )
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+    
+    async def _collect_and_cache(self, key: str, product_name: str, max_results: int,
+                                 previous: Optional[Dict[str, Any]] = None) -> List[PriceData]:
+        """
+        Collect prices and store the outcome in the price cache
+        
+        An empty or failed collection is cached for negative_ttl. If there
+        were stale prices, they are kept and served until the next retry.
+        """
+        try:
+            prices = await self._collect_prices_for_product(product_name, max_results)
+        except Exception as e:
+            self.logger.error("Price collection failed", product=product_name, error=str(e))
+            prices = []
+        
+        if self.cache_ttl <= 0:
+            return prices
+        
+        now = time.time()
+        if prices:
+            entry = {'prices': prices, 'fetched_at': now, 'refresh_after': now + self.cache_ttl}
+            ttl = self.cache_ttl + self.stale_ttl
+        elif previous is not None:
+            self.cache_stats['refresh_failures'] += 1
+            entry = dict(previous, refresh_after=now + self.negative_ttl)
+            ttl = max(1, int(previous['fetched_at'] + self.cache_ttl + self.stale_ttl - now))
+            prices = previous['prices']
+        else:
+            entry = {'prices': [], 'fetched_at': now, 'refresh_after': now + self.negative_ttl}
+            ttl = self.negative_ttl
+        
+        cache_manager.set(key, entry, ttl=ttl, namespace='prices')
+        return prices
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get price cache counters (hits and misses are in the cache manager's prices namespace)"""
+        return {**self.cache_stats, 'refreshes_in_flight': len(self.refresh_tasks)}
+    
+    async def _collect_prices_for_product(self, product_name: str, max_results: int) -> List[PriceData]:
+        """Collect prices for a single product from all sources"""
         self.logger.info("Starting price collection", product=product_name)
         
         # Prepare search queries
@@ -108,11 +589,15 @@ class PriceCollector:
         
         return unique_prices[:max_results]
     
+    def _normalize_query(self, product_name: str) -> str:
+        """Lowercase a product name and reduce it to words separated by single spaces"""
+        cleaned_name = re.sub(r'[^\w\s]', ' ', product_name.lower())
+        return re.sub(r'\s+', ' ', cleaned_name).strip()
+    
     def _prepare_search_queries(self, product_name: str) -> List[str]:
         """Prepare optimized search queries for different sources"""
         # Clean and optimize product name
-        cleaned_name = re.sub(r'[^\w\s]', ' ', product_name.lower())
-        cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip()
+        cleaned_name = self._normalize_query(product_name)
         
         # Extract key terms
         words = cleaned_name.split()
@@ -138,13 +623,14 @@ class PriceCollector:
         prices = []
         
         try:
-            for query in queries[:2]:  # Limit to first 2 queries for Allegro
-                query_prices = await self._scrape_allegro_search(query, max_results // len(queries))
+            # Limit to first 2 queries for Allegro; the rate limiter paces them
+            results = await asyncio.gather(*[
+                self._scrape_allegro_search(query, max_results // len(queries))
+                for query in queries[:2]
+            ])
+            for query_prices in results:
                 prices.extend(query_prices)
                 
-                # Add delay between requests
-                await asyncio.sleep(self.request_delay)
-                
         except Exception as e:
             self.logger.error("Allegro search failed", error=str(e))
         
@@ -153,11 +639,13 @@ class PriceCollector:
     async def _scrape_allegro_search(self, query: str, max_results: int) -> List[PriceData]:
         """Scrape Allegro search results"""
         prices = []
+        if max_results <= 0:
+            return prices
         
         try:
             # Encode query for URL
             encoded_query = quote_plus(query)
-            url = f"https://allegro.pl/listing?string={encoded_query}&order=m&bmatch=baseline-al-product-eyesa2-uni-1-5-0327"
+            url = f"{self.allegro_url}?string={encoded_query}&order=m&bmatch=baseline-al-product-eyesa2-uni-1-5-0327"
             
             headers = {
                 'User-Agent': self.user_agents[0],
@@ -167,60 +655,48 @@ class PriceCollector:
                 'Connection': 'keep-alive',
             }
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        html = await response.text()
-                        prices = self._parse_allegro_html(html, query)
-                    else:
-                        self.logger.warning("Allegro request failed", 
-                                          status=response.status,
-                                          query=query)
-                        
+            offers = await self._fetch_with_retries(url, headers, max_offers=max_results)
+            if offers is not None:
+                prices = self._offers_to_prices(offers, query)
+            else:
+                self.logger.warning("Allegro request failed", query=query)
+                
+        except CircuitOpenError as e:
+            self.logger.warning("Allegro skipped, source circuit open", error=str(e), query=query)
         except Exception as e:
             self.logger.error("Allegro scraping error", error=str(e), query=query)
         
         return prices[:max_results]
     
     def _parse_allegro_html(self, html: str, query: str) -> List[PriceData]:
-        """Parse Allegro HTML to extract price data"""
-        prices = []
-        
+        """Parse Allegro HTML to extract price data from its offer listings"""
         try:
-            # This is a simplified parser - in production, you'd use BeautifulSoup or similar
-            # Look for price patterns in the HTML
-            
-            # Extract prices using regex patterns
-            for pattern in self.price_patterns:
-                matches = re.findall(pattern, html)
-                for match in matches:
-                    try:
-                        # Clean and convert price
-                        price_str = match.replace(' ', '').replace(',', '.')
-                        price = float(price_str)
-                        
-                        # Basic validation
-                        if 1 <= price <= 100000:  # Reasonable price range
-                            price_data = PriceData(
-                                product_name=query,
-                                price=price,
-                                currency="PLN",
-                                source="Allegro",
-                                url="https://allegro.pl",
-                                timestamp=datetime.now(),
-                                condition="new"
-                            )
-                            prices.append(price_data)
-                            
-                    except (ValueError, TypeError):
-                        continue
-            
-            self.logger.info("Parsed Allegro prices", 
-                           query=query,
-                           prices_found=len(prices))
-            
+            return self._offers_to_prices(parse_allegro_listing(html), query)
         except Exception as e:
             self.logger.error("Allegro HTML parsing error", error=str(e))
+            return []
+    
+    def _offers_to_prices(self, offers: List[ListingOffer], query: str) -> List[PriceData]:
+        """Convert parsed Allegro offers to price data"""
+        timestamp = datetime.now()
+        prices = [
+            PriceData(
+                product_name=query,
+                price=offer.price,
+                currency=offer.currency,
+                source="Allegro",
+                url=offer.url,
+                timestamp=timestamp,
+                condition="new",
+                seller_rating=offer.seller_rating,
+                title=offer.title
+            )
+            for offer in offers
+        ]
+        
+        self.logger.info("Parsed Allegro prices", 
+                       query=query,
+                       prices_found=len(prices))
         
         return prices
     
@@ -10,23 +10,36 @@ from typing import Dict, List, Any, Optional
 from pathlib import Path
 import structlog
 from .cache_manager import cache_manager
+from .keyword_automaton import KeywordAutomaton, KeywordRewriter
+from .single_flight import SingleFlight
 
 logger = structlog.get_logger()
 
 class ProductNormalizer:
-    def __init__(self):
-        """Initialize the product normalizer with NLP model and data"""
-        self.logger = logger.bind(service="product_normalizer")
+    def __init__(self, fast_mode: bool = False):
+        """
+        Initialize the product normalizer with NLP model and data
         
-        # Load Polish language model
-        try:
-            self.nlp = spacy.load("pl_core_news_sm")
-            self.logger.info("Polish language model loaded successfully")
-        except OSError:
-            self.logger.error("Polish model not found. Please install: python -m spacy download pl_core_news_sm")
-            # Fallback to English model
-            self.nlp = spacy.load("en_core_web_sm")
-            self.logger.warning("Using English model as fallback")
+        Args:
+            fast_mode: Skip spaCy entirely and use regex-only extraction
+        """
+        self.logger = logger.bind(service="product_normalizer")
+        self.fast_mode = fast_mode
+        self.in_flight = SingleFlight("product_normalization")
+        
+        if fast_mode:
+            self.nlp = None
+            self.logger.info("Fast mode enabled, spaCy model not loaded")
+        else:
+            # Load Polish language model
+            try:
+                self.nlp = spacy.load("pl_core_news_sm")
+                self.logger.info("Polish language model loaded successfully")
+            except OSError:
+                self.logger.error("Polish model not found. Please install: python -m spacy download pl_core_news_sm")
+                # Fallback to English model
+                self.nlp = spacy.load("en_core_web_sm")
+                self.logger.warning("Using English model as fallback")
         
         # Load brand and category data
         self.brands = self._load_brands()
@@ -42,7 +55,18 @@ class ProductNormalizer:
         # Load common misspellings and variations
         self.variations = self._load_variations()
         
+        # Build keyword automata so brand and category lookups scan the text once
+        self.brand_matcher = KeywordAutomaton(self.brands)
+        self.category_matcher = KeywordAutomaton(self.categories)
+        
+        # Compile variations into a single-pass rewriter
+        self.variation_rewriter = KeywordRewriter(self.variations)
+        
+        # Variations whose correct form names a known brand, for the fuzzy fallback
+        self.variation_brands = self._build_variation_brands()
+        
         self.logger.info("Product normalizer initialized", 
+                        fast_mode=fast_mode,
                         brands_count=len(self.brands),
                         categories_count=len(self.categories),
                         brand_patterns_count=len(self.brand_patterns))
@@ -194,6 +218,18 @@ class ProductNormalizer:
             "buty": "shoes"
         }
     
+    def _build_variation_brands(self) -> List[tuple]:
+        """Pair each variation with the first brand its correct form belongs to"""
+        variation_brands = []
+        
+        for variation, correct in self.variations.items():
+            for brand in self.brands.keys():
+                if correct.lower() in brand.lower():
+                    variation_brands.append((variation, brand))
+                    break
+        
+        return variation_brands
+    
     def _load_specifications(self) -> Dict[str, str]:
         """Load specification extraction patterns"""
         return {
@@ -225,20 +261,150 @@ class ProductNormalizer:
             self.logger.info("Product analysis served from cache", product_name=product_name)
             return cached_result
         
+        # Concurrent requests for the same product share one computation
+        result = self.in_flight.do((product_name, description),
+                                   self._compute_product, product_name, description)
+        
+        self.logger.info("Product normalized", 
+                        original_name=product_name,
+                        normalized_name=result["normalized_name"],
+                        brand=result["brand"],
+                        category=result["category"],
+                        confidence=result["confidence"])
+        
+        return result
+    
+    def _compute_product(self, product_name: str, description: str) -> Dict[str, Any]:
+        """Analyze one uncached product and cache the result"""
         # Clean and prepare text
-        text = f"{product_name} {description}".lower().strip()
+        text = self._prepare_text(product_name, description)
         
-        # Process with spaCy
-        doc = self.nlp(text)
+        result = self._analyze_text(product_name, description, text)
         
-        # Extract brand
-        brand = self._extract_brand(text, doc)
+        # Cache the result
+        cache_manager.cache_product_analysis(product_name, description, result)
+        
+        return result
+    
+    def normalize_products(self, product_names: List[str], descriptions: Optional[List[str]] = None,
+                           batch_size: int = 256, n_process: int = 1) -> List[Dict[str, Any]]:
+        """
+        Normalize many products at once with caching
+        
+        Uncached texts that need a spaCy doc are tokenized together with
+        nlp.pipe instead of one nlp() call per product.
+        
+        Args:
+            product_names: Original product names
+            descriptions: Optional descriptions, aligned with product_names
+            batch_size: Number of texts per nlp.pipe batch
+            n_process: Number of processes for nlp.pipe
+            
+        Returns:
+            List of normalized product data, in input order
+        """
+        if descriptions is None:
+            descriptions = [""] * len(product_names)
+        
+        self.logger.info("Normalizing products", product_count=len(product_names))
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(product_names)
+        pending: Dict[tuple, List[int]] = {}
+        
+        # Look up all products at once (one round trip for shared backends)
+        keys = list(zip(product_names, descriptions))
+        cached_results = cache_manager.get_cached_product_analyses(list(dict.fromkeys(keys)))
+        
+        # Serve cached products, grouping duplicate misses so each is computed once
+        for index, key in enumerate(keys):
+            cached_result = cached_results.get(key)
+            if cached_result:
+                results[index] = cached_result
+            else:
+                pending.setdefault(key, []).append(index)
+        
+        # Wait on products another request is already computing, compute the rest
+        owned = {}
+        waiting = {}
+        for key in pending:
+            call, is_leader = self.in_flight.begin(key)
+            (owned if is_leader else waiting)[key] = call
+        
+        try:
+            computed = self._compute_products(list(owned), batch_size, n_process)
+        except BaseException as e:
+            for key, call in owned.items():
+                self.in_flight.finish(key, call, error=e)
+            raise
+        
+        for key, call in owned.items():
+            self.in_flight.finish(key, call, result=computed[key])
+        
+        for key, indices in pending.items():
+            result = computed[key] if key in owned else waiting[key].wait()
+            for index in indices:
+                results[index] = result
+        
+        self.logger.info("Products normalized",
+                        product_count=len(product_names),
+                        cached_count=len(product_names) - sum(len(i) for i in pending.values()),
+                        computed_count=len(owned),
+                        coalesced_count=len(waiting))
+        
+        return results
+    
+    def _compute_products(self, keys: List[tuple], batch_size: int, n_process: int) -> Dict[tuple, Dict[str, Any]]:
+        """Analyze uncached (product_name, description) pairs and cache them in one write"""
+        texts = {key: self._prepare_text(*key) for key in keys}
+        normalized_texts = {key: self._apply_variations(text) for key, text in texts.items()}
+        
+        # Tokenize in batches only the texts whose brand falls back to capitalized tokens
+        docs = {}
+        if not self.fast_mode:
+            doc_keys = [key for key in keys
+                        if self._match_brand(normalized_texts[key]) is None
+                        and self._needs_doc(self._original_text(*key))]
+            if doc_keys:
+                doc_stream = self.nlp.pipe((self._original_text(*key) for key in doc_keys),
+                                           batch_size=batch_size, n_process=n_process)
+                docs = dict(zip(doc_keys, doc_stream))
+        
+        computed = {}
+        for key in keys:
+            product_name, description = key
+            computed[key] = self._analyze_text(product_name, description, texts[key],
+                                               docs.get(key), normalized_texts[key])
+        
+        # Cache the results in one write
+        if computed:
+            cache_manager.cache_product_analyses(computed)
+        
+        return computed
+    
+    def _prepare_text(self, product_name: str, description: str) -> str:
+        """Clean and prepare text for extraction"""
+        return self._original_text(product_name, description).lower()
+    
+    def _original_text(self, product_name: str, description: str) -> str:
+        """Product text with its original case, for capitalized-token extraction"""
+        return f"{product_name} {description}".strip()
+    
+    def _analyze_text(self, product_name: str, description: str, text: str, doc=None,
+                      normalized_text: Optional[str] = None) -> Dict[str, Any]:
+        """Extract normalized product data from prepared text"""
+        # Apply variations once, shared by brand and model extraction
+        if normalized_text is None:
+            normalized_text = self._apply_variations(text)
+        
+        # Extract brand (the spaCy doc is only built if its fallback needs it)
+        brand = self._extract_brand(text, doc, normalized_text,
+                                    self._original_text(product_name, description))
         
         # Extract model
-        model = self._extract_model(text, doc)
+        model = self._extract_model(text, doc, normalized_text)
         
         # Classify category
-        category = self._classify_category(text, doc)
+        category = self._classify_category(text)
         
         # Extract specifications
         specifications = self._extract_specifications(text)
@@ -249,7 +415,7 @@ class ProductNormalizer:
         # Generate normalized name
         normalized_name = self._generate_normalized_name(brand, model, specifications)
         
-        result = {
+        return {
             "original_name": product_name,
             "normalized_name": normalized_name,
             "brand": brand,
@@ -259,31 +425,38 @@ class ProductNormalizer:
             "confidence": confidence,
             "processed_text": text
         }
-        
-        # Cache the result
-        cache_manager.cache_product_analysis(product_name, description, result)
-        
-        self.logger.info("Product normalized", 
-                        original_name=product_name,
-                        normalized_name=normalized_name,
-                        brand=brand,
-                        category=category,
-                        confidence=confidence)
-        
-        return result
     
-    def _extract_brand(self, text: str, doc) -> str:
+    def _extract_brand(self, text: str, doc=None, normalized_text: Optional[str] = None,
+                       original_text: Optional[str] = None) -> str:
         """Extract brand from product text with improved accuracy"""
-        text_lower = text.lower()
+        # Apply variations first (unless the caller already did)
+        if normalized_text is None:
+            normalized_text = self._apply_variations(text.lower())
         
-        # Apply variations first
-        normalized_text = self._apply_variations(text_lower)
+        brand = self._match_brand(normalized_text)
+        if brand:
+            return brand
         
-        # Check for exact brand matches
-        for brand, keywords in self.brands.items():
-            for keyword in keywords:
-                if keyword.lower() in normalized_text:
-                    return brand
+        # Try to extract brand from capitalized words (lowercased text has none)
+        for token_text in self._title_tokens(original_text or text, doc):
+            # Check if this looks like a brand name
+            if self.brand_matcher.contains_any(token_text.lower()):
+                return token_text.title()
+        
+        # Fuzzy matching for common misspellings
+        for variation, brand in self.variation_brands:
+            if variation in normalized_text:
+                # This variation matches a known brand
+                return brand
+        
+        return "Unknown"
+    
+    def _match_brand(self, normalized_text: str) -> Optional[str]:
+        """Find a brand by keyword or pattern, None if only the fallbacks could"""
+        # Check for exact brand matches (first declared keyword wins)
+        brand = self.brand_matcher.first_match(normalized_text)
+        if brand:
+            return brand
         
         # Check for regex patterns
         for brand, patterns in self.brand_patterns.items():
@@ -291,31 +464,13 @@ class ProductNormalizer:
                 if re.search(pattern, normalized_text, re.IGNORECASE):
                     return brand
         
-        # Try to extract brand from capitalized words
-        for token in doc:
-            if token.is_alpha and token.is_title and len(token.text) > 2:
-                token_lower = token.text.lower()
-                # Check if this looks like a brand name
-                if any(keyword in token_lower for brand_keywords in self.brands.values() 
-                      for keyword in brand_keywords):
-                    return token.text.title()
-        
-        # Fuzzy matching for common misspellings
-        for variation, correct in self.variations.items():
-            if variation in normalized_text:
-                # Check if this variation matches a known brand
-                for brand in self.brands.keys():
-                    if correct.lower() in brand.lower():
-                        return brand
-        
-        return "Unknown"
+        return None
     
-    def _extract_model(self, text: str, doc) -> str:
+    def _extract_model(self, text: str, doc=None, normalized_text: Optional[str] = None) -> str:
         """Extract model from product text with improved patterns"""
-        text_lower = text.lower()
-        
-        # Apply variations first
-        normalized_text = self._apply_variations(text_lower)
+        # Apply variations first (unless the caller already did)
+        if normalized_text is None:
+            normalized_text = self._apply_variations(text.lower())
         
         # Try specific model patterns first
         for pattern_name, pattern in self.model_patterns.items():
@@ -353,25 +508,21 @@ class ProductNormalizer:
         
         return "Unknown"
     
-    def _classify_category(self, text: str, doc) -> str:
+    def _classify_category(self, text: str, doc=None) -> str:
         """Classify product category based on text content"""
         text_lower = text.lower()
         
         # Score each category based on keyword matches
         category_scores = {}
+        words = set(text.split())
         
-        for category, keywords in self.categories.items():
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in text_lower:
-                    # Give more weight to exact matches
-                    if keyword.lower() in text.split():
-                        score += 2
-                    else:
-                        score += 1
-            
-            if score > 0:
-                category_scores[category] = score
+        # Hits come back in declaration order, which keeps tie-breaking stable
+        for category, keyword in self.category_matcher.search(text_lower):
+            # Give more weight to exact matches
+            if keyword in words:
+                category_scores[category] = category_scores.get(category, 0) + 2
+            else:
+                category_scores[category] = category_scores.get(category, 0) + 1
         
         # Return category with highest score
         if category_scores:
@@ -381,6 +532,25 @@ class ProductNormalizer:
         
         return "Inne/Inne"
     
+    def _needs_doc(self, text: str) -> bool:
+        """Check whether capitalized-token extraction could find anything in text"""
+        # Title-case tokens need an uppercase letter
+        return text != text.lower()
+    
+    def _title_tokens(self, text: str, doc=None) -> List[str]:
+        """Get capitalized alphabetic tokens longer than two characters"""
+        if not self._needs_doc(text):
+            return []
+        
+        if doc is None:
+            if self.fast_mode:
+                return [word for word in re.findall(r"[^\W\d_]+", text)
+                        if word.istitle() and len(word) > 2]
+            doc = self.nlp(text)
+        
+        return [token.text for token in doc
+                if token.is_alpha and token.is_title and len(token.text) > 2]
+    
     def _extract_specifications(self, text: str) -> Dict[str, str]:
         """Extract product specifications"""
         specifications = {}
@@ -440,13 +610,7 @@ class ProductNormalizer:
     
     def _apply_variations(self, text: str) -> str:
         """Apply common variations and misspellings to text"""
-        normalized_text = text
-        
-        for variation, correct in self.variations.items():
-            # Replace variation with correct form
-            normalized_text = re.sub(r'\b' + re.escape(variation) + r'\b', correct, normalized_text, flags=re.IGNORECASE)
-        
-        return normalized_text
+        return self.variation_rewriter.rewrite(text)
     
     def get_available_brands(self) -> List[str]:
         """Get list of available brands"""
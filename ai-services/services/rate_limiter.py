@@ -0,0 +1,113 @@
+"""
+Rate Limiter
+Per-host token buckets that pace outgoing requests to a requests-per-second budget
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict
+import structlog
+
+logger = structlog.get_logger()
+
+class TokenBucket:
+    """Token bucket refilled at a fixed rate, shared by every caller of one host"""
+    
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the bucket
+        
+        Args:
+            rate: Tokens added per second, 0 disables limiting
+            burst: Tokens that can accumulate while idle
+            clock: Monotonic time source in seconds
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self.lock = threading.Lock()
+        
+        # Counters for stats
+        self.requests = 0
+        self.delayed = 0
+        self.waited_seconds = 0.0
+    
+    def reserve(self) -> float:
+        """
+        Take a token, going into debt if none is left
+        
+        Callers are paced in reservation order without holding a lock while
+        they wait: each one sleeps until its share of the debt is refilled.
+        
+        Returns:
+            Seconds to wait before the request may be sent
+        """
+        with self.lock:
+            self.requests += 1
+            if self.rate <= 0:
+                return 0.0
+            
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            
+            delay = -self.tokens / self.rate
+            self.delayed += 1
+            self.waited_seconds += delay
+            return delay
+    
+    async def acquire(self) -> None:
+        """Wait until a request may be sent"""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get request counters"""
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'delayed': self.delayed,
+                'waited_seconds': round(self.waited_seconds, 3)
+            }
+
+class RateLimiter:
+    """One token bucket per host, created on first use"""
+    
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the rate limiter
+        
+        Args:
+            rate: Requests per second allowed to each host, 0 disables limiting
+            burst: Requests a host can receive at once after being idle
+            clock: Monotonic time source in seconds
+        """
+        self.logger = logger.bind(service="rate_limiter")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, TokenBucket] = {}
+    
+    def bucket(self, host: str) -> TokenBucket:
+        """Get the bucket for a host"""
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.setdefault(host, TokenBucket(self.rate, self.burst, self.clock))
+        return bucket
+    
+    async def acquire(self, host: str) -> None:
+        """Wait until a request to host fits the budget"""
+        await self.bucket(host).acquire()
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get request counters per host"""
+        return {host: bucket.get_stats() for host, bucket in list(self.buckets.items())}
@@ -0,0 +1,154 @@
+"""
+Resilience
+Circuit breakers, jittered retry backoff and hedged requests for calls to external sources
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a source whose circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Per-source circuit breaker
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast. Once reset_timeout has passed, a single probe call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    Used from one event loop, so no locking.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            name: Source name used in logs
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+        """
+        self.logger = logger.bind(service="circuit_breaker", source=name)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+        # Counters for stats
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Check whether a call may go ahead, claiming the probe when half-open"""
+        if self.state == "closed":
+            return True
+
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = False
+
+        if self.probe_in_flight:
+            self.rejected += 1
+            return False
+
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call"""
+        if self.state != "closed":
+            self.logger.info("Circuit closed")
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit at the threshold or on a failed probe"""
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                self.logger.warning("Circuit opened", consecutive_failures=self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def release(self) -> None:
+        """Give back an unfinished probe, e.g. when the caller was cancelled"""
+        if self.state == "half_open":
+            self.probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state and counters"""
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Full-jitter exponential backoff
+
+    Args:
+        attempt: Retry number, starting at 0
+        base: Upper bound of the first delay in seconds
+        cap: Largest upper bound in seconds
+
+    Returns:
+        Random delay between 0 and min(cap, base * 2 ** attempt)
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+async def hedged(call: Callable[[], Awaitable], delay: float,
+                 stats: Optional[Dict[str, int]] = None) -> Any:
+    """
+    Await call(), starting a duplicate if it has not finished after delay
+
+    The first successful result wins and the other call is cancelled. If
+    the first call fails before the hedge starts, its error is raised
+    without hedging; once both run, an error is raised only if both fail.
+
+    Args:
+        call: Starts one attempt
+        delay: Seconds to wait before hedging
+        stats: Optional counters, 'hedges' and 'hedge_wins' are incremented
+    """
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(call())
+        tasks.add(second)
+        if stats is not None:
+            stats['hedges'] = stats.get('hedges', 0) + 1
+
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second and stats is not None:
+                        stats['hedge_wins'] = stats.get('hedge_wins', 0) + 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,127 @@
+"""
+Single Flight
+Coalesces concurrent computations of the same key so only one runs at a time
+"""
+
+import asyncio
+import functools
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import structlog
+
+logger = structlog.get_logger()
+
+class InFlightCall:
+    """A computation in progress that other callers can wait on"""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self) -> Any:
+        """Block until the leader finishes, then return its result or raise its error"""
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    """In-flight deduplication for blocking code running in worker threads"""
+
+    def __init__(self, name: str):
+        """
+        Initialize the single-flight group
+
+        Args:
+            name: Label used in logs
+        """
+        self.logger = logger.bind(service="single_flight", group=name)
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, InFlightCall] = {}
+        self.coalesced = 0  # Callers that waited instead of computing
+
+    def begin(self, key: Hashable) -> Tuple[InFlightCall, bool]:
+        """
+        Join the computation for a key, starting it if none is running
+
+        Returns:
+            (call, is_leader); the leader must compute and then call finish()
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+
+            call = self.calls[key] = InFlightCall()
+            return call, True
+
+    def finish(self, key: Hashable, call: InFlightCall, result: Any = None,
+               error: Optional[BaseException] = None) -> None:
+        """Publish the leader's outcome and wake waiting callers"""
+        with self.lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+
+        call.result = result
+        call.error = error
+        call.event.set()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Run func once per key among concurrent callers and share its result"""
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            self.logger.debug("Waiting on in-flight computation")
+            return call.wait()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+
+        self.finish(key, call, result=result)
+        return result
+
+class AsyncSingleFlight:
+    """In-flight deduplication for coroutines on one event loop"""
+
+    def __init__(self, name: str):
+        """
+        Initialize the single-flight group
+
+        Args:
+            name: Label used in logs
+        """
+        self.logger = logger.bind(service="single_flight", group=name)
+        self.tasks: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0  # Callers that awaited instead of computing
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """
+        Await func once per key among concurrent callers and share its result
+
+        The computation runs as its own task, so a cancelled caller does not
+        cancel it for the others.
+        """
+        task = self.tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self.tasks[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        else:
+            self.coalesced += 1
+            self.logger.debug("Awaiting in-flight computation")
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        """Drop a finished task so later calls start fresh"""
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+
+        # Mark the error as retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
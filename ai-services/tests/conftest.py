@@ -0,0 +1,22 @@
+"""
+Pytest configuration
+Slow benchmarks only run with --runslow
+"""
+
+import pytest
+
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", default=False,
+                     help="run benchmarks marked slow")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running benchmark, skipped unless --runslow is given")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+
+    skip_slow = pytest.mark.skip(reason="slow benchmark, run with --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
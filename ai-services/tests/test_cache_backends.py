@@ -0,0 +1,466 @@
+"""
+Tests for Cache Backends
+"""
+
+import fnmatch
+import os
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.cache_backends import (
+    dump_value, MemoryCacheBackend, RedisCacheBackend, SqliteCacheBackend,
+    TwoTierCacheBackend, create_cache_backend
+)
+from services.cache_manager import CacheManager
+
+class FakeRedis:
+    """In-process stand-in for the subset of redis.Redis used by RedisCacheBackend"""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def _live(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and time.time() >= expires_at:
+            del self.data[key]
+            return None
+        return value
+
+    def get(self, key):
+        self.round_trips += 1
+        return self._live(key)
+
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self._live(key) for key in keys]
+
+    def set(self, key, value, px=None):
+        self.round_trips += 1
+        self.data[key] = (value, time.time() + px / 1000 if px else None)
+
+    def pttl(self, key):
+        self.round_trips += 1
+        if self._live(key) is None:
+            return -2
+        expires_at = self.data[key][1]
+        return int((expires_at - time.time()) * 1000) if expires_at is not None else -1
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        self.round_trips += 1
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match="*", count=None):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match) and self._live(key) is not None]
+
+    def dbsize(self):
+        return len(self.data)
+
+    def info(self, section=None):
+        return {"used_memory": sum(len(value) for value, _ in self.data.values())}
+
+class FakePipeline:
+    """Buffers commands and applies them in a single round trip"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, px=None):
+        self.commands.append((self.client.set, (key, value, px)))
+
+    def mget(self, keys):
+        self.commands.append((self.client.mget, (keys,)))
+
+    def pttl(self, key):
+        self.commands.append((self.client.pttl, (key,)))
+
+    def execute(self):
+        round_trips = self.client.round_trips
+        results = [command(*args) for command, args in self.commands]
+        self.client.round_trips = round_trips + 1
+        self.commands = []
+        return results
+
+def redis_server_client():
+    """Client for a local redis-server, None when unavailable"""
+    try:
+        import redis
+        client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/15"))
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+@pytest.fixture(params=["fake", "server"])
+def redis_backend(request):
+    """RedisCacheBackend against the in-process fake and, if running, a real server"""
+    if request.param == "fake":
+        client = FakeRedis()
+    else:
+        client = redis_server_client()
+        if client is None:
+            pytest.skip("redis-server not available")
+
+    backend = RedisCacheBackend(client=client, prefix="paleta:test")
+    backend.clear()
+    yield backend
+    backend.clear()
+
+class TestRedisCacheBackend:
+    """Test cases for RedisCacheBackend"""
+
+    def test_round_trip_preserves_values(self, redis_backend):
+        """Test that values survive serialization including tuples"""
+        value = {"brand": "Apple", "specifications": {"storage": ("256", "gb")}, "confidence": 0.9}
+        redis_backend.set("key", value, ttl=60, namespace="product_analysis")
+
+        assert redis_backend.get("key", namespace="product_analysis") == value
+        assert redis_backend.get("key", namespace="palette_analysis") is None
+
+    def test_large_values_are_compressed(self, redis_backend):
+        """Test compact encoding of large values"""
+        value = {"products": ["iPhone 15 Pro Max 256GB Space Black"] * 500}
+        encoded = dump_value(value)
+
+        assert encoded[:1] == b"z"
+        assert len(encoded) < len(str(value)) / 10
+        redis_backend.set("large", value, ttl=60)
+        assert redis_backend.get("large") == value
+
+    def test_server_side_ttl(self, redis_backend):
+        """Test that entries expire in Redis"""
+        redis_backend.set("short", "value", ttl=0.05)
+        assert redis_backend.get("short") == "value"
+        time.sleep(0.1)
+        assert redis_backend.get("short") is None
+
+    def test_batch_operations_use_one_round_trip(self):
+        """Test that multi-get and multi-set are pipelined"""
+        client = FakeRedis()
+        backend = RedisCacheBackend(client=client, prefix="paleta:test")
+
+        backend.set_many({f"key-{i}": i for i in range(100)}, ttl=60)
+        assert client.round_trips == 1
+
+        found = backend.get_many([f"key-{i}" for i in range(150)])
+        assert client.round_trips == 2
+        assert found == {f"key-{i}": i for i in range(100)}
+
+    def test_clear_only_removes_prefixed_keys(self, redis_backend):
+        """Test that clear leaves foreign keys alone"""
+        redis_backend.set("key", "value", ttl=60)
+        redis_backend.client.set("other:key", b"value")
+
+        redis_backend.clear()
+
+        assert redis_backend.get("key") is None
+        assert redis_backend.client.get("other:key") == b"value"
+        redis_backend.client.delete("other:key")
+
+    def test_stats_only_count_prefixed_keys(self, redis_backend):
+        """Test that entry counts leave out foreign keys in the same database"""
+        redis_backend.set_many({"a": 1, "b": 2}, ttl=60, namespace="prices")
+        redis_backend.client.set("other:key", b"value")
+
+        stats = redis_backend.get_stats()
+
+        assert stats["total_entries"] == 2
+        assert stats["total_entries_approximate"]
+        redis_backend.client.delete("other:key")
+
+    def test_cache_manager_with_redis_backend(self, redis_backend):
+        """Test typed cache helpers and stats on top of Redis"""
+        cache = CacheManager(redis_backend)
+        cache.cache_product_analysis("iPhone 15", "", {"brand": "Apple"})
+
+        assert cache.get_cached_product_analysis("iPhone 15", "") == {"brand": "Apple"}
+        assert cache.get_cached_product_analyses([("iPhone 15", ""), ("Galaxy", "")]) == {
+            ("iPhone 15", ""): {"brand": "Apple"}
+        }
+
+        stats = cache.get_stats()
+        assert stats["backend"] == "redis"
+        assert stats["namespaces"]["product_analysis"]["hits"] == 2
+        assert stats["namespaces"]["product_analysis"]["misses"] == 1
+
+    def test_errors_degrade_to_misses(self):
+        """Test that an unreachable Redis behaves like an empty cache"""
+        class BrokenRedis:
+            def __getattr__(self, name):
+                def fail(*args, **kwargs):
+                    raise ConnectionError("redis down")
+                return fail
+
+        backend = RedisCacheBackend(client=BrokenRedis())
+        backend.set("key", "value", ttl=60)
+        backend.set_many({"key": "value"}, ttl=60)
+
+        assert backend.get("key") is None
+        assert backend.get_many(["key"]) == {}
+
+class TestSqliteCacheBackend:
+    """Test cases for SqliteCacheBackend"""
+
+    @pytest.fixture(autouse=True)
+    def setup_backend(self, tmp_path):
+        """Set up a backend on a temporary database file"""
+        self.path = str(tmp_path / "cache" / "test.db")
+        self.backend = SqliteCacheBackend(self.path)
+
+    def test_round_trip_and_namespaces(self):
+        """Test values survive serialization and namespaces are separate"""
+        value = {"brand": "Apple", "specifications": {"storage": ("256", "gb")}}
+        self.backend.set("key", value, ttl=60, namespace="product_analysis")
+
+        assert self.backend.get("key", namespace="product_analysis") == value
+        assert self.backend.get("key", namespace="prices") is None
+
+    def test_entries_and_ttls_survive_reopen(self):
+        """Test persistence across a restart"""
+        self.backend.set("long", "value", ttl=60)
+        self.backend.set("short", "value", ttl=0.05)
+
+        reopened = SqliteCacheBackend(self.path)
+        assert reopened.get("long") == "value"
+        assert reopened.get("short") == "value"
+        time.sleep(0.1)
+        assert reopened.get("short") is None
+
+    def test_wal_mode(self):
+        """Test that the database runs in WAL mode"""
+        journal_mode = self.backend._connection().execute("PRAGMA journal_mode").fetchone()[0]
+        assert journal_mode == "wal"
+
+    def test_batch_operations(self):
+        """Test multi-get across query batches"""
+        self.backend.set_many({f"key-{i}": i for i in range(1200)}, ttl=60)
+
+        found = self.backend.get_many([f"key-{i}" for i in range(1500)])
+        assert found == {f"key-{i}": i for i in range(1200)}
+
+    def test_expired_rows_are_purged(self):
+        """Test periodic purge of expired rows and its counter"""
+        self.backend.PURGE_INTERVAL = 3
+        self.backend.set("a", 1, ttl=0, namespace="prices")
+        self.backend.set("b", 2, ttl=60, namespace="prices")
+        time.sleep(0.01)
+        self.backend.set("c", 3, ttl=60, namespace="prices")
+
+        count = self.backend._connection().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        stats = self.backend.get_stats()
+        assert count == 2
+        assert stats["total_entries"] == 2
+        assert stats["namespaces"]["prices"]["expirations"] == 1
+        assert stats["namespaces"]["prices"]["bytes"] > 0
+
+    def test_delete_and_clear(self):
+        """Test removal"""
+        self.backend.set("a", 1, ttl=60)
+        self.backend.set("b", 2, ttl=60)
+
+        self.backend.delete("a")
+        assert self.backend.get("a") is None
+
+        self.backend.clear()
+        assert self.backend.get("b") is None
+
+    def test_stats_counters_follow_writes(self):
+        """Test that maintained counters match a full scan after overwrites and deletes"""
+        self.backend.set_many({f"key-{i}": "x" * i for i in range(10)}, ttl=60, namespace="prices")
+        self.backend.set("key-3", "y" * 100, ttl=60, namespace="prices")
+        self.backend.delete("key-4", namespace="prices")
+        self.backend.set("key", "value", ttl=60, namespace="product_analysis")
+
+        scanned = self.backend._connection().execute(
+            "SELECT namespace, COUNT(*), SUM(LENGTH(value)) FROM cache_entries GROUP BY namespace"
+        ).fetchall()
+        stats = self.backend.get_stats()
+        assert {namespace: (entries, size) for namespace, entries, size in scanned} == {
+            namespace: (counters["entries"], counters["bytes"])
+            for namespace, counters in stats["namespaces"].items()
+        }
+        assert stats["total_entries"] == 10
+
+        self.backend.clear()
+        assert self.backend.get_stats()["total_entries"] == 0
+
+    def test_stats_counters_for_existing_database(self):
+        """Test that a database written before the counters existed is counted on open"""
+        self.backend.set_many({"a": 1, "b": 2}, ttl=60)
+        connection = self.backend._connection()
+        connection.execute("DROP TABLE cache_namespace_stats")
+        for trigger in ("inserted", "updated", "deleted"):
+            connection.execute(f"DROP TRIGGER cache_entries_{trigger}")
+        connection.commit()
+
+        reopened = SqliteCacheBackend(self.path)
+        reopened.set("c", 3, ttl=60)
+        assert reopened.get_stats()["total_entries"] == 3
+
+    def test_load_entries_newest_first(self):
+        """Test bulk read for warm-loading"""
+        self.backend.set("old", 1, ttl=60)
+        time.sleep(0.01)
+        self.backend.set("new", 2, ttl=60, namespace="prices")
+        self.backend.set("expired", 3, ttl=0)
+        time.sleep(0.01)
+
+        entries = self.backend.load_entries()
+        assert [(namespace, key, value) for namespace, key, value, _ in entries] == [
+            ("prices", "new", 2), ("default", "old", 1)
+        ]
+        assert len(self.backend.load_entries(limit=1)) == 1
+
+    def test_warm_load_into_l1_after_restart(self):
+        """Test that a restarted two-tier cache serves persisted entries from L1"""
+        cache = CacheManager(TwoTierCacheBackend(MemoryCacheBackend(), self.backend))
+        cache.cache_product_analysis("iPhone 15", "", {"brand": "Apple"})
+
+        restarted = TwoTierCacheBackend(MemoryCacheBackend(max_size=10), SqliteCacheBackend(self.path), l1_ttl=60)
+        cache = CacheManager(restarted)
+        assert cache.warm_load() == 1
+        assert restarted.l1.cache
+
+        assert cache.get_cached_product_analysis("iPhone 15", "") == {"brand": "Apple"}
+        assert cache.get_stats()["namespaces"]["product_analysis"]["l1_hits"] == 1
+
+    def test_memory_backend_has_nothing_to_warm(self):
+        """Test that non-persistent backends skip warm-loading"""
+        assert CacheManager(MemoryCacheBackend()).warm_load() == 0
+
+class TestTwoTierCacheBackend:
+    """Test cases for TwoTierCacheBackend"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.client = FakeRedis()
+        self.l1 = MemoryCacheBackend(max_size=2)
+        self.l2 = RedisCacheBackend(client=self.client, prefix="paleta:test")
+        self.backend = TwoTierCacheBackend(self.l1, self.l2, l1_ttl=60)
+
+    def test_set_writes_through_both_tiers(self):
+        """Test write-through with the L1 ttl capped"""
+        self.backend.set("key", "value", ttl=3600)
+
+        assert self.l2.get("key") == "value"
+        assert self.l1.cache["key"].expires_at <= time.time() + 60
+
+    def test_l1_hits_skip_l2(self):
+        """Test that hot keys are served without a round trip"""
+        self.backend.set("key", "value", ttl=3600)
+        round_trips = self.client.round_trips
+
+        for _ in range(10):
+            assert self.backend.get("key") == "value"
+        assert self.client.round_trips == round_trips
+
+    def test_l2_hits_are_promoted(self):
+        """Test read-through population of L1 from L2"""
+        self.l2.set("key", "value", ttl=3600, namespace="prices")
+
+        assert self.backend.get("key", namespace="prices") == "value"
+        round_trips = self.client.round_trips
+        assert self.backend.get("key", namespace="prices") == "value"
+        assert self.client.round_trips == round_trips
+
+        hits = self.backend.get_stats()["namespaces"]["prices"]
+        assert hits["l1_hits"] == 1
+        assert hits["l2_hits"] == 1
+
+    def test_get_many_fetches_l1_misses_in_one_batch(self):
+        """Test that L1 misses go to L2 in a single round trip and get promoted"""
+        self.backend.set("a", 1, ttl=3600)
+        self.l2.set_many({"b": 2, "c": 3}, ttl=3600)
+        round_trips = self.client.round_trips
+
+        assert self.backend.get_many(["a", "b", "c", "d"]) == {"a": 1, "b": 2, "c": 3}
+        assert self.client.round_trips == round_trips + 1
+        assert len(self.l1.cache) == 2
+
+    def test_l1_expiry_falls_back_to_l2(self):
+        """Test that a short L1 ttl re-reads from the shared tier"""
+        backend = TwoTierCacheBackend(self.l1, self.l2, l1_ttl=0.01)
+        backend.set("key", "old", ttl=3600)
+        self.l2.set("key", "new", ttl=3600)
+        time.sleep(0.02)
+
+        assert backend.get("key") == "new"
+
+    def test_promoted_entries_keep_l2_expiry(self):
+        """Test that an L2 hit is not kept in L1 longer than it lives in L2"""
+        self.l2.set("key", "value", ttl=0.05)
+
+        assert self.backend.get("key") == "value"
+        assert self.l1.cache["key"].expires_at <= time.time() + 0.05
+        time.sleep(0.06)
+        assert self.backend.get("key") is None
+
+        self.l2.set_many({"a": 1, "b": 2}, ttl=0.05)
+        assert self.backend.get_many(["a", "b"]) == {"a": 1, "b": 2}
+        assert all(entry.expires_at <= time.time() + 0.05 for entry in self.l1.cache.values())
+
+    def test_promotion_from_sqlite_keeps_expiry(self, tmp_path):
+        """Test the remaining lifetime read from the on-disk tier"""
+        l2 = SqliteCacheBackend(str(tmp_path / "cache.db"))
+        backend = TwoTierCacheBackend(self.l1, l2, l1_ttl=60)
+        l2.set("key", "value", ttl=5)
+
+        assert backend.get("key") == "value"
+        assert time.time() + 4 < self.l1.cache["key"].expires_at <= time.time() + 5
+
+    def test_delete_and_clear_apply_to_both_tiers(self):
+        """Test invalidation of both tiers"""
+        self.backend.set("a", 1, ttl=3600)
+        self.backend.set("b", 2, ttl=3600)
+
+        self.backend.delete("a")
+        assert self.backend.get("a") is None
+
+        self.backend.clear()
+        assert self.backend.get("b") is None
+        assert self.client.data == {}
+
+    def test_cache_manager_reports_tiers(self):
+        """Test that stats expose both tiers"""
+        cache = CacheManager(self.backend)
+        cache.cache_product_analysis("iPhone 15", "", {"brand": "Apple"})
+        cache.get_cached_product_analysis("iPhone 15", "")
+
+        stats = cache.get_stats()
+        assert stats["backend"] == "tiered"
+        assert stats["namespaces"]["product_analysis"]["l1_hits"] == 1
+        assert stats["tiers"]["l1"]["total_entries"] == 1
+        assert stats["tiers"]["l2"]["total_entries"] == 1
+
+    def test_create_from_environment(self, monkeypatch, tmp_path):
+        """Test backend selection from configuration"""
+        monkeypatch.setenv("CACHE_BACKEND", "tiered")
+        monkeypatch.setenv("CACHE_L1_MAX_ENTRIES", "50")
+        monkeypatch.setenv("CACHE_L1_TTL", "30")
+
+        backend = create_cache_backend()
+        assert isinstance(backend, TwoTierCacheBackend)
+        assert isinstance(backend.l2, RedisCacheBackend)
+        assert backend.l1.max_size == 50
+        assert backend.l1_ttl == 30
+
+        monkeypatch.setenv("CACHE_L2_BACKEND", "sqlite")
+        monkeypatch.setenv("CACHE_SQLITE_PATH", str(tmp_path / "cache.db"))
+        assert isinstance(create_cache_backend().l2, SqliteCacheBackend)
+
+        monkeypatch.setenv("CACHE_L2_BACKEND", "tiered")
+        with pytest.raises(ValueError):
+            create_cache_backend()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,278 @@
+"""
+Tests for Cache Manager Service
+"""
+
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services import cache_backends
+from services.cache_manager import CacheManager, canonical_key
+from services.cache_backends import MemoryCacheBackend, estimate_size, memory_backend_from_env
+
+class TestCacheManager:
+    """Test cases for CacheManager"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.backend = MemoryCacheBackend(max_size=3)
+        self.cache = CacheManager(self.backend)
+
+    def test_set_and_get(self):
+        """Test basic set and get"""
+        self.cache.set("a", {"value": 1})
+        assert self.cache.get("a") == {"value": 1}
+        assert self.cache.get("missing") is None
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.set("c", 3)
+
+        # Touch "a" so "b" becomes least recently used
+        assert self.cache.get("a") == 1
+        self.cache.set("d", 4)
+
+        assert self.cache.get("b") is None
+        assert self.cache.get("a") == 1
+        assert self.cache.get("c") == 3
+        assert self.cache.get("d") == 4
+        assert len(self.backend.cache) == 3
+
+    def test_overwrite_refreshes_recency(self):
+        """Test that overwriting a key marks it as recently used"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.set("c", 3)
+        self.cache.set("a", 10)
+        self.cache.set("d", 4)
+
+        assert self.cache.get("a") == 10
+        assert self.cache.get("b") is None
+
+    def test_expired_entries_are_not_served(self):
+        """Test that expired entries are dropped on read"""
+        self.cache.set("a", 1, ttl=0)
+        time.sleep(0.01)
+        assert self.cache.get("a") is None
+        assert "a" not in self.backend.cache
+
+    def test_expired_entries_are_removed_on_write(self):
+        """Test that writes lazily purge expired entries via the expiry heap"""
+        self.cache.set("a", 1, ttl=0)
+        self.cache.set("b", 2, ttl=0)
+        time.sleep(0.01)
+        self.cache.set("c", 3)
+
+        assert list(self.backend.cache) == ["c"]
+
+    def test_overwritten_ttl_is_respected(self):
+        """Test that a stale expiry from an earlier write does not remove a refreshed key"""
+        self.cache.set("a", 1, ttl=0)
+        self.cache.set("a", 2, ttl=60)
+        time.sleep(0.01)
+        self.cache.set("b", 3)
+
+        assert self.cache.get("a") == 2
+
+    def test_expiry_heap_stays_bounded(self):
+        """Test that stale heap items are compacted"""
+        self.backend.max_size = 10
+        for i in range(5000):
+            self.cache.set(f"key-{i}", i)
+
+        assert len(self.backend.cache) == 10
+        assert len(self.backend.expiry_heap) <= 2 * 10 + 1024 + 1
+
+    def test_clear(self):
+        """Test clearing the cache"""
+        self.cache.set("a", 1)
+        self.cache.clear()
+        assert self.cache.get("a") is None
+        assert self.backend.expiry_heap == []
+
+    def test_namespace_hit_miss_counters(self):
+        """Test hit and miss accounting per namespace"""
+        self.cache.cache_product_analysis("iPhone 15", "", {"brand": "Apple"})
+        self.cache.get_cached_product_analysis("iPhone 15", "")
+        self.cache.get_cached_product_analysis("Galaxy S23", "")
+        self.cache.get_cached_palette_analysis(["iPhone 15"])
+
+        stats = self.cache.get_stats()
+        products = stats["namespaces"]["product_analysis"]
+        palettes = stats["namespaces"]["palette_analysis"]
+
+        assert products["hits"] == 1
+        assert products["misses"] == 1
+        assert products["sets"] == 1
+        assert products["hit_rate"] == 50.0
+        assert palettes["misses"] == 1
+        assert stats["namespaces"]["prices"]["hits"] == 0
+        assert stats["hit_rate"] == pytest.approx(100 / 3)
+
+    def test_eviction_and_expiration_counters(self):
+        """Test that evictions and expirations are attributed to the entry's namespace"""
+        self.cache.set("a", 1, ttl=0, namespace="prices")
+        self.cache.set("b", 2, namespace="prices")
+        self.cache.set("c", 3, namespace="prices")
+        time.sleep(0.01)
+        self.cache.set("d", 4, namespace="prices")
+        self.cache.set("e", 5, namespace="prices")
+
+        prices = self.cache.get_stats()["namespaces"]["prices"]
+        assert prices["expirations"] == 1
+        assert prices["evictions"] == 1
+        assert prices["entries"] == 3
+
+    def test_resident_bytes_follow_entries(self):
+        """Test that resident bytes grow on set and shrink on removal"""
+        # Values are only sized under a byte budget
+        self.cache = CacheManager(MemoryCacheBackend(max_size=3, max_bytes=1024 * 1024))
+        self.cache.set("small", "x", namespace="prices")
+        small_bytes = self.cache.get_stats()["resident_bytes"]
+        self.cache.set("large", ["x" * 1000] * 10, namespace="prices")
+        assert self.cache.get_stats()["resident_bytes"] > small_bytes + 10000
+
+        self.cache.delete("large")
+        self.cache.set("small", "x", namespace="prices")
+        assert self.cache.get_stats()["resident_bytes"] == small_bytes
+
+        self.cache.clear()
+        assert self.cache.get_stats()["resident_bytes"] == 0
+
+    def test_stats_average_age(self):
+        """Test average age computed from running totals"""
+        assert self.cache.get_stats()["average_age_seconds"] == 0
+        self.cache.set("a", 1)
+        time.sleep(0.02)
+        assert self.cache.get_stats()["average_age_seconds"] >= 0.02
+
+class TestCacheKeys:
+    """Test cases for canonical cache keys"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.cache = CacheManager(MemoryCacheBackend())
+
+    def test_keys_are_stable_and_distinct(self):
+        """Test that keys depend on every field, its position and the key kind"""
+        key = canonical_key("product_analysis", ["iPhone 15", ""])
+
+        assert key == canonical_key("product_analysis", ["iPhone 15", ""])
+        assert len(key) == 32
+        assert key != canonical_key("product_analysis", ["", "iPhone 15"])
+        assert key != canonical_key("palette_analysis", ["iPhone 15", ""])
+        assert canonical_key("k", ["a", "bc"]) != canonical_key("k", ["ab", "c"])
+
+    def test_fields_containing_separator_stay_unambiguous(self):
+        """Test that NUL inside a field cannot collide with a field boundary"""
+        assert canonical_key("k", ["a\0b"]) != canonical_key("k", ["a", "b"])
+        assert canonical_key("k", ["a\0", "b"]) != canonical_key("k", ["a", "\0b"])
+
+    def test_palette_key_ignores_order(self):
+        """Test that reordered palettes share a cache entry"""
+        products = ["iPhone 15", "Galaxy S23", "MacBook Air"]
+        self.cache.cache_palette_analysis(products, {"total_products": 3})
+
+        assert self.cache.palette_analysis_key(products) == self.cache.palette_analysis_key(products[::-1])
+        assert self.cache.get_cached_palette_analysis(products[::-1]) == {"total_products": 3}
+
+    def test_palette_key_can_be_reused(self):
+        """Test get and set with a precomputed key"""
+        products = ["iPhone 15", "Galaxy S23"]
+        key = self.cache.palette_analysis_key(products)
+        self.cache.cache_palette_analysis(products, {"total_products": 2}, key=key)
+
+        assert self.cache.get_cached_palette_analysis(products, key=key) == {"total_products": 2}
+        assert self.cache.get_cached_palette_analysis(products) == {"total_products": 2}
+
+class TestCacheMemoryBudgets:
+    """Test cases for byte-bounded caching"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.value_size = estimate_size("x" * 1000)
+        self.backend = MemoryCacheBackend(
+            max_size=1000,
+            max_bytes=self.value_size * 10,
+            namespace_budgets={"palette_analysis": self.value_size * 3}
+        )
+        self.cache = CacheManager(self.backend)
+
+    def test_total_bytes_are_bounded(self):
+        """Test LRU eviction against the global memory budget"""
+        for i in range(20):
+            self.cache.set(f"key-{i}", "x" * 1000, namespace="prices")
+
+        stats = self.cache.get_stats()
+        assert stats["resident_bytes"] <= stats["max_bytes"]
+        assert stats["total_entries"] == 10
+        assert stats["namespaces"]["prices"]["evictions"] == 10
+        assert self.cache.get("key-19", namespace="prices") is not None
+        assert self.cache.get("key-0", namespace="prices") is None
+
+    def test_namespace_budget_evicts_only_its_own_entries(self):
+        """Test that large palette results cannot push out product analyses"""
+        self.cache.set("product", "x" * 1000, namespace="product_analysis")
+        for i in range(5):
+            self.cache.set(f"palette-{i}", "x" * 1000, namespace="palette_analysis")
+
+        stats = self.cache.get_stats()["namespaces"]
+        assert stats["palette_analysis"]["entries"] == 3
+        assert stats["palette_analysis"]["bytes"] <= stats["palette_analysis"]["budget_bytes"]
+        assert stats["palette_analysis"]["evictions"] == 2
+        assert self.cache.get("product", namespace="product_analysis") is not None
+
+    def test_namespace_eviction_follows_recency(self):
+        """Test that reads refresh recency within a namespace"""
+        for i in range(3):
+            self.cache.set(f"palette-{i}", "x" * 1000, namespace="palette_analysis")
+        self.cache.get("palette-0", namespace="palette_analysis")
+        self.cache.set("palette-3", "x" * 1000, namespace="palette_analysis")
+
+        assert self.cache.get("palette-0", namespace="palette_analysis") is not None
+        assert self.cache.get("palette-1", namespace="palette_analysis") is None
+
+    def test_values_are_sized_only_under_a_budget(self, monkeypatch):
+        """Test that without a budget for the value no size is estimated"""
+        sized = []
+        monkeypatch.setattr(cache_backends, "estimate_size", lambda value: sized.append(value) or 1)
+
+        unbounded = CacheManager(MemoryCacheBackend(max_size=1000))
+        unbounded.set("key", "x" * 1000, namespace="prices")
+        assert sized == []
+        assert unbounded.get_stats()["resident_bytes"] == 0
+
+        backend = MemoryCacheBackend(max_size=1000, namespace_budgets={"palette_analysis": 100})
+        backend.set("key", "x" * 1000, ttl=60, namespace="prices")
+        backend.set("palette", "x" * 1000, ttl=60, namespace="palette_analysis")
+        assert sized == ["x" * 1000]
+
+    def test_oversized_values_are_not_cached(self):
+        """Test that a value above its budget neither stays nor flushes the namespace"""
+        self.cache.set("small", "x" * 1000, namespace="palette_analysis")
+        self.cache.set("huge", "x" * 1000, namespace="palette_analysis")
+        self.cache.set("huge", "x" * 5000, namespace="palette_analysis")
+
+        assert self.cache.get("huge", namespace="palette_analysis") is None
+        assert self.cache.get("small", namespace="palette_analysis") is not None
+
+    def test_budgets_from_environment(self, monkeypatch):
+        """Test budget configuration"""
+        monkeypatch.setenv("CACHE_MAX_MEMORY_MB", "256")
+        monkeypatch.setenv("CACHE_NAMESPACE_BUDGETS_MB", "product_analysis=64, palette_analysis=0.5")
+
+        backend = memory_backend_from_env(max_size=100)
+        assert backend.max_bytes == 256 * 1024 * 1024
+        assert backend.namespace_budgets == {
+            "product_analysis": 64 * 1024 * 1024,
+            "palette_analysis": 512 * 1024
+        }
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,107 @@
+"""
+Tests for Keyword Automaton
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.keyword_automaton import KeywordAutomaton, KeywordRewriter
+
+class TestKeywordAutomaton:
+    """Test cases for KeywordAutomaton"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.keywords = {
+            "Apple": ["apple", "iphone", "macbook"],
+            "Samsung": ["samsung", "galaxy", "note"],
+            "Xiaomi": ["xiaomi", "mi "],
+            "MAC": ["mac cosmetics", "mac "]
+        }
+        self.automaton = KeywordAutomaton(self.keywords)
+
+    def naive_search(self, text):
+        """Reference implementation using plain substring tests"""
+        return [
+            (label, keyword)
+            for label, keywords in self.keywords.items()
+            for keyword in keywords
+            if keyword in text
+        ]
+
+    def test_first_match_follows_declaration_order(self):
+        """Test that the first declared keyword wins, not the first in text"""
+        assert self.automaton.first_match("galaxy note vs iphone") == "Apple"
+        assert self.automaton.first_match("samsung galaxy") == "Samsung"
+        assert self.automaton.first_match("generic charger") is None
+
+    def test_search_finds_overlapping_keywords(self):
+        """Test that overlapping and nested keywords are all reported"""
+        text = "xiaomi mi band and mac cosmetics"
+        assert self.automaton.search(text) == self.naive_search(text)
+        assert ("MAC", "mac cosmetics") in self.automaton.search(text)
+        assert ("MAC", "mac ") in self.automaton.search(text)
+
+    def test_search_matches_naive_substring_scan(self):
+        """Test equivalence with substring tests over many texts"""
+        texts = [
+            "",
+            "iphone 15 pro max",
+            "macbook air m2",
+            "samsunggalaxynote",
+            "appleapple",
+            "premium macbookmi note",
+            "ximac mi mac",
+        ]
+        for text in texts:
+            assert self.automaton.search(text) == self.naive_search(text), f"Failed for {text!r}"
+
+    def test_keywords_are_lowercased(self):
+        """Test that keywords are matched case-insensitively against lowercased text"""
+        automaton = KeywordAutomaton({"L'Oréal": ["L'Oréal", "LOREAL"]})
+        assert automaton.first_match("l'oréal paris") == "L'Oréal"
+        assert automaton.search("loreal") == [("L'Oréal", "loreal")]
+
+    def test_contains_any(self):
+        """Test keyword presence check"""
+        assert self.automaton.contains_any("galaxy")
+        assert not self.automaton.contains_any("nokia")
+
+class TestKeywordRewriter:
+    """Test cases for KeywordRewriter"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.rewriter = KeywordRewriter({
+            "iphone": "iPhone",
+            "ps5": "PlayStation 5",
+            "galaxy s": "Galaxy S",
+            "galaxy": "Galaxy",
+            "telefon": "smartphone"
+        })
+
+    def test_whole_word_replacement(self):
+        """Test that only whole words are replaced"""
+        assert self.rewriter.rewrite("iphone 15") == "iPhone 15"
+        assert self.rewriter.rewrite("iphones") == "iphones"
+        assert self.rewriter.rewrite("konsola ps5 slim") == "konsola PlayStation 5 slim"
+
+    def test_case_insensitive_match(self):
+        """Test that variations match regardless of case"""
+        assert self.rewriter.rewrite("IPHONE Telefon") == "iPhone smartphone"
+
+    def test_longest_variation_wins(self):
+        """Test that longer variations take precedence over their prefixes"""
+        assert self.rewriter.rewrite("galaxy s case") == "Galaxy S case"
+        assert self.rewriter.rewrite("galaxy s23") == "Galaxy s23"
+
+    def test_empty_table(self):
+        """Test that an empty table leaves text unchanged"""
+        assert KeywordRewriter({}).rewrite("iphone") == "iphone"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
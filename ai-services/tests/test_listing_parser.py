@@ -0,0 +1,80 @@
+"""
+Tests for Listing Parser
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.listing_parser import AllegroListingParser, parse_allegro_listing, parse_price
+
+LISTING_PATH = Path(__file__).parent.parent / "data" / "allegro_listing.html"
+
+class TestListingParser:
+    """Test cases for the Allegro listing parser"""
+    
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.html = LISTING_PATH.read_text(encoding="utf-8")
+    
+    def test_extracts_offers_from_listing(self):
+        """Test that only offer articles are read, with title, price, URL and rating"""
+        offers = parse_allegro_listing(self.html)
+        
+        assert [offer.price for offer in offers] == [3499.0, 4199.0, 2849.99, 49.9]
+        assert offers[0].title == "Apple iPhone 15 128GB Czarny"
+        assert offers[0].url == "https://allegro.pl/oferta/apple-iphone-15-128gb-czarny-15233401231"
+        assert [offer.seller_rating for offer in offers] == [99.4, 98.7, None, 100.0]
+    
+    def test_relative_links_are_resolved(self):
+        """Test that relative offer links get the site prefix"""
+        offers = parse_allegro_listing(self.html, base_url="https://allegro.pl")
+        assert offers[1].url == "https://allegro.pl/oferta/apple-iphone-15-256gb-niebieski-15233401232"
+    
+    def test_chunked_feed_matches_whole_page(self):
+        """Test that feeding the page in small chunks gives the same offers"""
+        data = self.html.encode("utf-8")
+        parser = AllegroListingParser()
+        found = []
+        for start in range(0, len(data), 97):
+            found.extend(parser.feed(data[start:start + 97]))
+        found.extend(parser.close())
+        
+        assert found == parse_allegro_listing(self.html)
+    
+    def test_max_offers_stops_early(self):
+        """Test that parsing stops collecting at max_offers"""
+        parser = AllegroListingParser(max_offers=2)
+        parser.feed(self.html)
+        
+        assert parser.done
+        assert len(parser.offers) == 2
+        assert parser.feed("<article><h2><a href='/x'>X</a></h2>10 zł</article>") == []
+    
+    def test_unknown_charset_is_detected_from_page(self):
+        """Test that an unknown declared charset does not stop parsing"""
+        parser = AllegroListingParser(encoding="x-unknown")
+        parser.feed(self.html.encode("utf-8"))
+        parser.close()
+        
+        assert parser.offers == parse_allegro_listing(self.html)
+    
+    def test_empty_and_truncated_pages(self):
+        """Test that broken input yields what was parsed, without errors"""
+        assert parse_allegro_listing("") == []
+        assert len(parse_allegro_listing(self.html[:self.html.index("Etui")])) == 3
+    
+    def test_parse_price(self):
+        """Test price formats"""
+        assert parse_price("3 499,00 zł") == 3499.0
+        assert parse_price("3\xa0499,00\xa0zł") == 3499.0
+        assert parse_price("49,9 zł") == 49.9
+        assert parse_price("1299 PLN") == 1299.0
+        assert parse_price("128 GB") is None
+        assert parse_price("0,50 zł") is None
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -4,12 +4,14 @@ Tests for Palette Analyzer Service
 
 import pytest
 import sys
+import time
 from pathlib import Path
 
 # Add the parent directory to the path so we can import our modules
 sys.path.append(str(Path(__file__).parent.parent))
 
-from services.palette_analyzer import PaletteAnalyzer
+from services.palette_analyzer import PaletteAnalyzer, PaletteAggregate
+from services.cache_manager import cache_manager
 
 class TestPaletteAnalyzer:
     """Test cases for PaletteAnalyzer"""
@@ -225,6 +227,218 @@ class TestPaletteAnalyzer:
             ["Test Product"], products, palette_analysis
         )
 
+class TestPaletteAggregate:
+    """Test cases for PaletteAggregate"""
+    
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.analyzer = PaletteAnalyzer()
+        cache_manager.clear()
+        categories = ["Elektronika/Telefony", "Odzież/Obuwie", "Kosmetyki/Twarz"]
+        risks = ["low", "medium", "high"]
+        self.products = [
+            {
+                "original_name": f"Product {i}",
+                "category": categories[i % 3],
+                "profitability_score": 40 + (i % 6) * 10,
+                "risk_level": risks[(i // 3) % 3],
+                "recommendation": "YES"
+            }
+            for i in range(30)
+        ]
+    
+    def test_summary_matches_full_analysis(self):
+        """Test that aggregated contributions give the full analysis"""
+        expected = self.analyzer.analyze_palette(self.products)
+        aggregate = PaletteAggregate.from_analyses(self.products)
+        
+        assert self.analyzer.summarize_palette(aggregate) == expected
+        assert aggregate.total_products == 30
+        assert len(aggregate.category_stats) == 3
+    
+    def test_edits_match_recomputation(self):
+        """Test that adding and removing lines equals analyzing the edited palette"""
+        aggregate = PaletteAggregate.from_analyses(self.products[:20])
+        aggregate.remove(self.products[:5])
+        aggregate.add(self.products[20:])
+        
+        expected = self.analyzer.analyze_palette(self.products[5:])
+        assert self.analyzer.summarize_palette(aggregate) == expected
+    
+    def test_merge_combines_palettes(self):
+        """Test that palettes compose from their parts"""
+        merged = PaletteAggregate.from_analyses(self.products[:12]).merge(
+            PaletteAggregate.from_analyses(self.products[12:])
+        )
+        assert merged.summarize() == PaletteAggregate.from_analyses(self.products).summarize()
+    
+    def test_stream_matches_full_analysis(self):
+        """Test single-pass analysis of a generator"""
+        expected = self.analyzer.analyze_palette(self.products)
+        
+        assert self.analyzer.analyze_palette_stream(iter(self.products)) == expected
+        assert self.analyzer.analyze_palette_stream(iter([])) == self.analyzer._empty_analysis()
+    
+    def test_removing_unknown_product_fails(self):
+        """Test that removals are checked before applying"""
+        aggregate = PaletteAggregate.from_analyses(self.products[:3])
+        unknown = dict(self.products[0], category="Dom/Kuchnia")
+        
+        with pytest.raises(ValueError):
+            aggregate.remove([self.products[1], unknown])
+        assert aggregate.total_products == 3
+    
+    def test_removing_everything_gives_empty_analysis(self):
+        """Test an emptied palette"""
+        aggregate = PaletteAggregate.from_analyses(self.products[:3])
+        aggregate.remove(self.products[:3])
+        
+        assert aggregate.total_products == 0
+        assert aggregate.category_stats == {}
+        assert self.analyzer.summarize_palette(aggregate) == self.analyzer._empty_analysis()
+    
+    def test_columnar_kernel_matches_python_aggregate(self):
+        """Test that the NumPy kernel gives the same aggregate, for integer and float scores"""
+        float_products = [dict(p, profitability_score=p["profitability_score"] + 0.25) for p in self.products]
+        for products in (self.products, float_products):
+            columnar = PaletteAggregate.from_columns(
+                [p["category"] for p in products],
+                [p["profitability_score"] for p in products],
+                [p["risk_level"] for p in products]
+            )
+            assert columnar.summarize() == PaletteAggregate.from_analyses(products).summarize()
+        
+        assert PaletteAggregate.from_columns([], [], []).summarize() == PaletteAggregate().summarize()
+    
+    def test_large_palettes_use_columnar_kernel(self):
+        """Test that the analyzer switches kernels at the threshold without changing results"""
+        columnar_analyzer = PaletteAnalyzer(columnar_threshold=10)
+        python_analyzer = PaletteAnalyzer(columnar_threshold=1000)
+        
+        assert columnar_analyzer.summarize_palette(columnar_analyzer.aggregate_palette(self.products)) == \
+            python_analyzer.summarize_palette(python_analyzer.aggregate_palette(self.products))
+        
+        analysis_id = columnar_analyzer.open_palette(self.products)
+        result, _ = columnar_analyzer.apply_palette_delta(analysis_id, [], ["Product 0"])
+        assert result == python_analyzer.analyze_palette(self.products[1:])
+
+class TestPaletteDeltas:
+    """Test cases for open palettes updated by deltas"""
+    
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.analyzer = PaletteAnalyzer(max_open_palettes=2)
+        cache_manager.clear()
+        self.products = [
+            {
+                "original_name": f"Product {i % 8}",
+                "category": ["Elektronika/Telefony", "Odzież/Obuwie"][i % 2],
+                "profitability_score": 50 + i * 4,
+                "risk_level": ["low", "medium", "high"][i % 3],
+                "recommendation": "YES"
+            }
+            for i in range(10)
+        ]
+    
+    def test_delta_matches_full_analysis(self):
+        """Test that a delta gives the same result as analyzing the edited palette"""
+        analysis_id = self.analyzer.open_palette(self.products[:8])
+        
+        result, product_analyses = self.analyzer.apply_palette_delta(
+            analysis_id, self.products[8:], ["Product 1", "Product 2"]
+        )
+        
+        remaining = [p for p in self.products if p["original_name"] not in ("Product 1", "Product 2")
+                     or p in self.products[8:]]
+        assert result == self.analyzer.analyze_palette(remaining)
+        assert len(product_analyses) == 8
+    
+    def test_deltas_accumulate_in_place(self):
+        """Test that consecutive deltas build on each other"""
+        analysis_id = self.analyzer.open_palette(self.products[:4])
+        
+        self.analyzer.apply_palette_delta(analysis_id, self.products[4:6], [])
+        result, product_analyses = self.analyzer.apply_palette_delta(analysis_id, [], ["Product 0"])
+        
+        assert result["total_products"] == 5
+        assert [p["original_name"] for p in product_analyses] == [f"Product {i}" for i in range(1, 6)]
+    
+    def test_repeated_lines_are_removed_one_at_a_time(self):
+        """Test that a line present twice stays after one removal"""
+        analysis_id = self.analyzer.open_palette(self.products)
+        
+        result, product_analyses = self.analyzer.apply_palette_delta(analysis_id, [], ["Product 0"])
+        
+        assert result["total_products"] == 9
+        assert [p["original_name"] for p in product_analyses].count("Product 0") == 1
+    
+    def test_unknown_removals_are_ignored(self):
+        """Test that removing a line not in the palette changes nothing"""
+        analysis_id = self.analyzer.open_palette(self.products[:3])
+        
+        result, _ = self.analyzer.apply_palette_delta(analysis_id, [], ["Missing Product"])
+        assert result == self.analyzer.analyze_palette(self.products[:3])
+    
+    def test_unknown_and_closed_ids(self):
+        """Test that deltas need an open palette"""
+        analysis_id = self.analyzer.open_palette(self.products)
+        
+        assert self.analyzer.apply_palette_delta("missing", [], []) is None
+        assert self.analyzer.close_palette(analysis_id)
+        assert not self.analyzer.close_palette(analysis_id)
+        assert self.analyzer.apply_palette_delta(analysis_id, [], []) is None
+    
+    def test_open_palettes_are_bounded(self):
+        """Test LRU and idle expiry of open palettes"""
+        first = self.analyzer.open_palette(self.products[:2])
+        second = self.analyzer.open_palette(self.products[2:4])
+        self.analyzer.apply_palette_delta(first, [], [])
+        self.analyzer.open_palette(self.products[4:6])
+        
+        assert self.analyzer.apply_palette_delta(second, [], []) is None
+        assert self.analyzer.apply_palette_delta(first, [], []) is not None
+        
+        self.analyzer.palette_ttl = 0.01
+        time.sleep(0.02)
+        assert self.analyzer.apply_palette_delta(first, [], []) is None
+    
+    def test_palette_order_survives_deltas(self):
+        """Test that repeated lines keep their positions"""
+        a, b, c = self.products[0], self.products[1], self.products[2]
+        analysis_id = self.analyzer.open_palette([a, b, a, c])
+        
+        _, product_analyses = self.analyzer.apply_palette_delta(analysis_id, [], [])
+        assert product_analyses == [a, b, a, c]
+        
+        _, product_analyses = self.analyzer.apply_palette_delta(analysis_id, [b], [a["original_name"]])
+        assert product_analyses == [a, b, c, b]
+    
+    def test_open_lines_are_bounded(self):
+        """Test that palette states are evicted by total line count"""
+        analyzer = PaletteAnalyzer(max_open_lines=10)
+        first = analyzer.open_palette(self.products[:6])
+        second = analyzer.open_palette(self.products[:4])
+        
+        assert analyzer.open_palette(self.products + self.products[:1]) is None
+        
+        analyzer.apply_palette_delta(second, self.products[4:6], [])
+        assert analyzer.apply_palette_delta(first, [], []) is None
+        assert analyzer.apply_palette_delta(second, [], []) is not None
+        assert analyzer.open_lines == 6
+        
+        assert analyzer.close_palette(second)
+        assert analyzer.open_lines == 0
+    
+    def test_analyze_and_open_palette(self):
+        """Test that the opened palette matches a plain analysis and takes deltas"""
+        result, analysis_id = self.analyzer.analyze_and_open_palette(self.products[:8])
+        
+        assert result == self.analyzer.analyze_palette(self.products[:8])
+        delta_result, _ = self.analyzer.apply_palette_delta(analysis_id, self.products[8:], [])
+        cache_manager.clear()
+        assert delta_result == self.analyzer.analyze_palette(self.products)
+        assert result == self.analyzer.analyze_palette(self.products[:8])
+
 if __name__ == "__main__":
     pytest.main([__file__])
 
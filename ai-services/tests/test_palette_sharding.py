@@ -0,0 +1,125 @@
+"""
+Tests for Palette Sharding Service
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.palette_sharding import PaletteShardPool, analyze_product_batch
+from services.product_normalizer import ProductNormalizer
+from services.profitability_analyzer import ProfitabilityAnalyzer
+from services.cache_manager import cache_manager
+
+class TestPaletteShardPool:
+    """Test cases for PaletteShardPool"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.pool = PaletteShardPool(max_workers=2, shard_size=3, threshold=5, fast_mode=True)
+        cache_manager.clear()
+
+    def teardown_method(self):
+        """Stop worker processes"""
+        self.pool.shutdown()
+
+    def test_should_shard(self):
+        """Test sharding threshold"""
+        assert not self.pool.should_shard(4)
+        assert self.pool.should_shard(5)
+        assert not PaletteShardPool(max_workers=1, threshold=5).should_shard(100)
+
+    def test_sharded_results_match_local_analysis(self):
+        """Test that sharded analysis preserves order and matches in-process results"""
+        products = [
+            "iPhone 15 Pro Max 256GB Space Black",
+            "Samsung Galaxy S23 Ultra 512GB Phantom Black",
+            "MacBook Air M2 13-inch 256GB Space Gray",
+            "Sony WH-1000XM5 Wireless Headphones Black",
+            "Nike Air Max 270 React White Black",
+            "Random Product Name",
+            "L'Oréal Paris True Match Foundation 30ml",
+        ]
+
+        sharded = asyncio.run(self.pool.analyze_products(products))
+
+        normalizer = ProductNormalizer(fast_mode=True)
+        profitability_analyzer = ProfitabilityAnalyzer()
+        cache_manager.clear()
+        for product, (normalized, profitability) in zip(products, sharded):
+            expected = normalizer.normalize_product(product)
+            assert normalized == expected
+            assert profitability == profitability_analyzer.analyze_product(
+                expected["brand"], expected["category"], expected["model"]
+            )
+
+    def test_sharded_results_are_cached_locally(self):
+        """Test that worker normalizations populate this process' cache"""
+        products = [f"iPhone {i} 128GB Black" for i in range(6)]
+
+        asyncio.run(self.pool.analyze_products(products))
+
+        for product in products:
+            assert cache_manager.get_cached_product_analysis(product, "") is not None
+
+    def test_cached_products_are_not_sharded(self):
+        """Test that only products missing from this process' cache go to workers"""
+        normalizer = ProductNormalizer(fast_mode=True)
+        products = [f"iPhone {i} 128GB Black" for i in range(6)]
+        normalizer.normalize_products(products)
+
+        analyzed = asyncio.run(self.pool.analyze_products(products + products[:2]))
+
+        assert self.pool.executor is None
+        assert [normalized["original_name"] for normalized, _ in analyzed] == products + products[:2]
+
+    def test_cache_hits_merge_with_sharded_misses(self):
+        """Test that cached and sharded products come back in palette order"""
+        normalizer = ProductNormalizer(fast_mode=True)
+        products = [f"Samsung Galaxy S{i} 256GB" for i in range(8)]
+        normalizer.normalize_products(products[::2])
+        cached = {product: cache_manager.get_cached_product_analysis(product, "") for product in products[::2]}
+
+        analyzed = asyncio.run(self.pool.analyze_products(products))
+
+        assert self.pool.executor is not None
+        assert [normalized["original_name"] for normalized, _ in analyzed] == products
+        assert all(analyzed[index][0] == cached[products[index]] for index in range(0, 8, 2))
+
+class TestAnalyzeProductBatch:
+    """Test cases for analyze_product_batch"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.normalizer = ProductNormalizer(fast_mode=True)
+        self.profitability_analyzer = ProfitabilityAnalyzer()
+        cache_manager.clear()
+
+    def test_failing_product_does_not_fail_batch(self):
+        """Test that a product failing normalization is skipped on its own"""
+        normalize_product = self.normalizer.normalize_product
+
+        def failing_normalize_product(product_name, description=""):
+            if product_name == "Broken":
+                raise ValueError("unparseable")
+            return normalize_product(product_name, description)
+
+        def failing_normalize_products(product_names, **batch_options):
+            raise ValueError("unparseable")
+
+        self.normalizer.normalize_product = failing_normalize_product
+        self.normalizer.normalize_products = failing_normalize_products
+
+        analyzed = analyze_product_batch(self.normalizer, self.profitability_analyzer,
+                                         ["iPhone 15 128GB", "Broken", "Nike Air Max 270"])
+
+        assert analyzed[1] is None
+        assert analyzed[0][0]["brand"] == "Apple"
+        assert analyzed[2][0]["original_name"] == "Nike Air Max 270"
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -4,10 +4,13 @@ Tests caching, response times, and accuracy improvements
 """
 
 import pytest
+import asyncio
+import tempfile
 import time
 import sys
 from pathlib import Path
 import json
+import structlog
 
 # Add the parent directory to the path so we can import our modules
 sys.path.append(str(Path(__file__).parent.parent))
@@ -15,7 +18,10 @@ sys.path.append(str(Path(__file__).parent.parent))
 from services.product_normalizer import ProductNormalizer
 from services.profitability_analyzer import ProfitabilityAnalyzer
 from services.palette_analyzer import PaletteAnalyzer
-from services.cache_manager import cache_manager
+from services.cache_manager import cache_manager, CacheManager
+from services.cache_backends import MemoryCacheBackend, SqliteCacheBackend, TwoTierCacheBackend
+from services.keyword_automaton import KeywordRewriter
+from services.price_collector import PriceCollector
 
 class TestPerformance:
     """Performance test cases for AI services"""
@@ -87,6 +93,7 @@ class TestPerformance:
         
         print(f"✅ Category classification accuracy: {accuracy}%")
     
+    @pytest.mark.slow
     def test_caching_performance(self):
         """Test caching performance and hit rates"""
         # Test product normalization caching
@@ -264,6 +271,658 @@ class TestPerformance:
         
         print(f"✅ Model extraction accuracy: {accuracy}%")
 
+    def test_variation_rewriter_scaling(self):
+        """Test that per-product variation cost stays flat as the table grows"""
+        texts = [
+            f"{product['name']} {product['description']}".lower()
+            for product in self.test_data["extended_test_products"]
+        ]
+        
+        # Synthetic SKU-like variations, deterministic across runs
+        extra_variations = {
+            f"{chr(97 + i % 26)}{chr(97 + (i // 26) % 26)}x{i}": f"Variant {i}"
+            for i in range(10000)
+        }
+        
+        timings = {}
+        for table_size in (0, 1000, 10000):
+            variations = dict(self.normalizer.variations)
+            variations.update(dict(list(extra_variations.items())[:table_size]))
+            rewriter = KeywordRewriter(variations)
+            
+            start_time = time.perf_counter()
+            for _ in range(20):
+                for text in texts:
+                    rewriter.rewrite(text)
+            timings[len(variations)] = (time.perf_counter() - start_time) / (20 * len(texts))
+        
+        smallest, largest = min(timings), max(timings)
+        growth = timings[largest] / timings[smallest]
+        
+        # Table grows ~500x; a per-entry re.sub would grow with it
+        assert growth < 5, f"Variation cost grew {growth:.1f}x from {smallest} to {largest} entries"
+        
+        for size, per_product in sorted(timings.items()):
+            print(f"✅ {size} variations: {per_product * 1e6:.1f}µs per product")
+    
+    def test_fast_mode_accuracy(self):
+        """Test that regex-only fast mode keeps accuracy of the spaCy path"""
+        fast_normalizer = ProductNormalizer(fast_mode=True)
+        products = self.test_data["extended_test_products"]
+        
+        # Count docs spaCy builds, to check the modes really take different paths
+        docs_built = []
+        nlp = self.normalizer.nlp
+        
+        class CountingNlp:
+            def __call__(self, text):
+                docs_built.append(text)
+                return nlp(text)
+        
+        self.normalizer.nlp = CountingNlp()
+        
+        modes = {}
+        try:
+            for mode, normalizer in (("spacy", self.normalizer), ("fast", fast_normalizer)):
+                cache_manager.clear()
+                correct_brands = 0
+                correct_categories = 0
+                
+                start_time = time.perf_counter()
+                for product in products:
+                    result = normalizer.normalize_product(product["name"], product.get("description", ""))
+                    correct_brands += result["brand"] == product["expected_brand"]
+                    correct_categories += result["category"] == product["expected_category"]
+                elapsed = time.perf_counter() - start_time
+                
+                modes[mode] = {
+                    "brand_accuracy": correct_brands / len(products) * 100,
+                    "category_accuracy": correct_categories / len(products) * 100,
+                    "per_product_ms": elapsed / len(products) * 1000,
+                    "docs_built": len(docs_built)
+                }
+                docs_built.clear()
+        finally:
+            self.normalizer.nlp = nlp
+        
+        # Only products no brand keyword or pattern matches fall back to spaCy tokens
+        fallback_products = [
+            product for product in products
+            if self.normalizer._match_brand(self.normalizer._apply_variations(
+                self.normalizer._prepare_text(product["name"], product.get("description", "")))) is None
+        ]
+        
+        assert fast_normalizer.nlp is None, "Fast mode should not load spaCy"
+        assert fallback_products, "Test products should exercise the capitalized-token fallback"
+        assert modes["spacy"]["docs_built"] == len(fallback_products)
+        assert modes["fast"]["docs_built"] == 0
+        assert modes["fast"]["brand_accuracy"] >= modes["spacy"]["brand_accuracy"] - 5, \
+            f"Fast mode brand accuracy dropped: {modes}"
+        assert modes["fast"]["category_accuracy"] >= modes["spacy"]["category_accuracy"] - 5, \
+            f"Fast mode category accuracy dropped: {modes}"
+        
+        for mode, stats in modes.items():
+            print(f"✅ {mode}: brand {stats['brand_accuracy']:.1f}%, "
+                  f"category {stats['category_accuracy']:.1f}%, "
+                  f"{stats['per_product_ms']:.2f}ms per product, {stats['docs_built']} spaCy docs")
+    
+    @pytest.mark.slow
+    def test_health_latency_under_palette_load(self):
+        """Benchmark /health latency during concurrent palette analyses, inline vs offloaded"""
+        from fastapi import BackgroundTasks
+        import main
+        
+        names = [product["name"] for product in self.test_data["extended_test_products"]]
+        
+        async def measure_health_latency(run: str):
+            latencies = []
+            palettes = [
+                asyncio.create_task(main.analyze_palette(
+                    main.PaletteRequest(products=[f"{name} {run}{i}-{j}" for j in range(10) for name in names]),
+                    BackgroundTasks()
+                ))
+                for i in range(4)
+            ]
+            
+            while not all(palette.done() for palette in palettes):
+                start_time = time.perf_counter()
+                await asyncio.sleep(0)
+                await main.health_check()
+                latencies.append(time.perf_counter() - start_time)
+                await asyncio.sleep(0.005)
+            
+            await asyncio.gather(*palettes)
+            return max(latencies)
+        
+        original_executor = main.analysis_executor
+        try:
+            # Before: CPU work runs on the event loop
+            main.analysis_executor = None
+            inline_latency = asyncio.run(measure_health_latency("inline"))
+            
+            # After: CPU work runs in the bounded analysis executor
+            main.analysis_executor = original_executor
+            offloaded_latency = asyncio.run(measure_health_latency("offloaded"))
+        finally:
+            main.analysis_executor = original_executor
+        
+        assert offloaded_latency < inline_latency, \
+            f"Offloading did not reduce /health latency ({offloaded_latency:.3f}s vs {inline_latency:.3f}s)"
+        
+        print(f"✅ Max /health latency under palette load: "
+              f"{inline_latency * 1000:.1f}ms inline, {offloaded_latency * 1000:.1f}ms offloaded")
+    
+    @pytest.mark.slow
+    def test_cache_set_throughput(self):
+        """Benchmark steady-state set throughput of a full cache at growing sizes"""
+        throughput = {}
+        
+        for size in (10_000, 100_000, 1_000_000):
+            cache = CacheManager(MemoryCacheBackend(max_size=size))
+            # Measure the cache itself, not log output
+            cache.backend.logger = structlog.wrap_logger(structlog.ReturnLogger(), processors=[])
+            
+            for i in range(size):
+                cache.set(f"fill-{i}", i)
+            
+            # Every set below evicts one entry
+            operations = 20_000
+            start_time = time.perf_counter()
+            for i in range(operations):
+                cache.set(f"new-{i}", i)
+            throughput[size] = operations / (time.perf_counter() - start_time)
+            
+            assert len(cache.backend.cache) == size
+            del cache
+        
+        slowdown = throughput[10_000] / throughput[1_000_000]
+        assert slowdown < 3, f"Set throughput dropped {slowdown:.1f}x from 10k to 1M entries"
+        
+        for size, sets_per_second in throughput.items():
+            print(f"✅ {size} entries: {sets_per_second:,.0f} sets/s")
+    
+    def test_cold_vs_warm_start_palette_latency(self, monkeypatch):
+        """Benchmark palette normalization right after a restart, without and with a persisted cache"""
+        import services.product_normalizer as product_normalizer_module
+        
+        palette = [product["name"] for product in self.test_data["extended_test_products"]] * 10
+        palette = [f"{name} {i}" for i, name in enumerate(palette)]
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "cache.db")
+            
+            def start_process():
+                """Fresh process-level cache on the persisted database"""
+                cache = CacheManager(TwoTierCacheBackend(MemoryCacheBackend(), SqliteCacheBackend(path)))
+                monkeypatch.setattr(product_normalizer_module, "cache_manager", cache)
+                return cache
+            
+            start_process()
+            start_time = time.perf_counter()
+            cold_results = self.normalizer.normalize_products(palette)
+            cold_time = time.perf_counter() - start_time
+            
+            # Restart: new process memory, same database file
+            cache = start_process()
+            start_time = time.perf_counter()
+            loaded = cache.warm_load()
+            warm_load_time = time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            warm_results = self.normalizer.normalize_products(palette)
+            warm_time = time.perf_counter() - start_time
+        
+        assert loaded == len(palette)
+        assert warm_results == cold_results
+        assert warm_time < cold_time
+        
+        print(f"✅ Cold start: {cold_time*1000:.0f}ms for {len(palette)} products")
+        print(f"✅ Warm start: {warm_time*1000:.0f}ms (+{warm_load_time*1000:.0f}ms warm-load)")
+    
+    @pytest.mark.slow
+    def test_cache_key_generation_speed(self):
+        """Benchmark palette and product key generation against JSON + MD5 keys"""
+        import hashlib
+        
+        def json_md5_key(data):
+            return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+        
+        cache = CacheManager(MemoryCacheBackend())
+        names = [product["name"] for product in self.test_data["extended_test_products"]]
+        
+        for size in (10, 1_000, 50_000):
+            palette = [f"{names[i % len(names)]} #{i}" for i in range(size)]
+            repeats = max(1, 20_000 // size)
+            
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                json_md5_key({'type': 'palette_analysis', 'products': sorted(palette)})
+            json_time = (time.perf_counter() - start_time) / repeats
+            
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                cache.palette_analysis_key(palette)
+            key_time = (time.perf_counter() - start_time) / repeats
+            
+            # Product keys for the whole palette, as in one batch lookup
+            start_time = time.perf_counter()
+            for name in palette:
+                json_md5_key({'type': 'product_analysis', 'product_name': name, 'description': ''})
+            json_products_time = time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            for name in palette:
+                cache._product_analysis_key(name, "")
+            products_time = time.perf_counter() - start_time
+            
+            assert products_time < json_products_time
+            if size >= 1_000:
+                assert key_time < json_time
+            
+            print(f"✅ {size} products: palette key {key_time*1000:.3f}ms (json+md5 {json_time*1000:.3f}ms), "
+                  f"product keys {products_time*1000:.2f}ms (json+md5 {json_products_time*1000:.2f}ms)")
+    
+    @pytest.mark.slow
+    def test_streaming_palette_memory(self):
+        """Benchmark single-pass palette analysis of a 1M-line manifest in bounded memory"""
+        import tracemalloc
+        
+        categories = [f"Kategoria {i}" for i in range(50)]
+        risk_levels = ["low", "medium", "high"]
+        
+        def manifest(size):
+            for i in range(size):
+                yield {
+                    "original_name": f"Product {i}",
+                    "category": categories[i % len(categories)],
+                    "profitability_score": (i * 37) % 101,
+                    "risk_level": risk_levels[i % 3],
+                    "recommendation": "YES"
+                }
+        
+        # Memory does not grow with the number of lines
+        peaks = {}
+        for size in (10_000, 100_000):
+            tracemalloc.start()
+            self.palette_analyzer.analyze_palette_stream(manifest(size))
+            peaks[size] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        
+        assert peaks[100_000] < peaks[10_000] * 2
+        
+        start_time = time.perf_counter()
+        result = self.palette_analyzer.analyze_palette_stream(manifest(1_000_000))
+        stream_time = time.perf_counter() - start_time
+        
+        assert result["total_products"] == 1_000_000
+        assert len(result["category_distribution"]) == len(categories)
+        assert sum(result["profitability_distribution"].values()) == 1_000_000
+        
+        print(f"✅ Streamed 1M lines in {stream_time:.2f}s, "
+              f"peak memory {peaks[10_000] // 1024}KB at 10k and {peaks[100_000] // 1024}KB at 100k lines")
+    
+    def test_columnar_palette_crossover(self):
+        """Benchmark the NumPy palette kernel against the pure-Python aggregate by palette size"""
+        
+        categories = [f"Kategoria {i}" for i in range(50)]
+        risk_levels = ["low", "medium", "high"]
+        python_analyzer = PaletteAnalyzer(columnar_threshold=10**9)
+        columnar_analyzer = PaletteAnalyzer(columnar_threshold=0)
+        
+        def best_of(func, arg, repeats):
+            timings = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                func(arg)
+                timings.append(time.perf_counter() - start_time)
+            return min(timings)
+        
+        crossover = None
+        for size in (10, 100, 1_000, 10_000, 100_000):
+            palette = [
+                {
+                    "original_name": f"Product {i}",
+                    "category": categories[(i * 7) % len(categories)],
+                    "profitability_score": (i * 37) % 101,
+                    "risk_level": risk_levels[i % 3],
+                    "recommendation": "YES"
+                }
+                for i in range(size)
+            ]
+            assert columnar_analyzer.aggregate_palette(palette).summarize() == \
+                python_analyzer.aggregate_palette(palette).summarize()
+            
+            repeats = max(3, 20_000 // size)
+            python_time = best_of(python_analyzer.aggregate_palette, palette, repeats)
+            columnar_time = best_of(columnar_analyzer.aggregate_palette, palette, repeats)
+            if crossover is None and columnar_time < python_time:
+                crossover = size
+            
+            print(f"  {size:>7} lines: python {python_time * 1000:.3f}ms, "
+                  f"numpy {columnar_time * 1000:.3f}ms ({python_time / columnar_time:.1f}x)")
+        
+        # The kernel must win clearly on large palettes
+        assert columnar_time < python_time
+        print(f"✅ NumPy kernel faster from {crossover} lines "
+              f"(threshold {PaletteAnalyzer().columnar_threshold})")
+    
+    def test_pooled_http_session_throughput(self):
+        """Benchmark requests per second with a shared pooled session vs a session per request"""
+        import aiohttp
+        from tests.test_price_collector import LocalMarket
+        
+        request_count = 300
+        concurrency = 8
+        
+        async def run_concurrently(fetch):
+            semaphore = asyncio.Semaphore(concurrency)
+            
+            async def bounded():
+                async with semaphore:
+                    return await fetch()
+            
+            start_time = time.perf_counter()
+            pages = await asyncio.gather(*[bounded() for _ in range(request_count)])
+            assert all(pages)
+            return request_count / (time.perf_counter() - start_time)
+        
+        async def run():
+            async with LocalMarket() as market:
+                async def fresh_session_fetch():
+                    async with aiohttp.ClientSession() as session:
+                        async with session.get(market.url) as response:
+                            return await response.text()
+                
+                collector = PriceCollector(max_connections_per_host=concurrency, requests_per_second=0)
+                
+                async def pooled_fetch():
+                    return await collector._fetch_html(market.url, {})
+                
+                fresh_rps = await run_concurrently(fresh_session_fetch)
+                fresh_connections = len(market.peers)
+                market.peers.clear()
+                pooled_rps = await run_concurrently(pooled_fetch)
+                pooled_connections = len(market.peers)
+                await collector.close()
+                return fresh_rps, fresh_connections, pooled_rps, pooled_connections
+        
+        fresh_rps, fresh_connections, pooled_rps, pooled_connections = asyncio.run(run())
+        
+        assert pooled_connections <= concurrency < fresh_connections
+        assert pooled_rps > fresh_rps
+        
+        print(f"✅ Pooled session: {pooled_rps:.0f} req/s over {pooled_connections} connections, "
+              f"session per request: {fresh_rps:.0f} req/s over {fresh_connections} connections "
+              f"({pooled_rps / fresh_rps:.1f}x)")
+    
+    @pytest.mark.slow
+    def test_rate_limited_collection_throughput(self):
+        """Benchmark batch price collection reaching the per-source request budget"""
+        from tests.test_price_collector import LocalMarket
+        
+        requests_per_second = 40
+        product_names = [f"Produkt testowy {i}" for i in range(30)]
+        
+        async def run():
+            async with LocalMarket() as market:
+                collector = PriceCollector(requests_per_second=requests_per_second, burst=1)
+                collector.allegro_url = market.url
+                
+                start_time = time.perf_counter()
+                await collector.collect_prices_for_products(product_names, 5)
+                elapsed = time.perf_counter() - start_time
+                await collector.close()
+                return market.requests, elapsed
+        
+        request_count, elapsed = asyncio.run(run())
+        achieved_rate = (request_count - 1) / elapsed
+        
+        # A fixed 0.5s sleep after each query capped 5 concurrent products at 10 req/s
+        assert request_count == 2 * len(product_names)
+        assert 0.75 * requests_per_second <= achieved_rate <= 1.1 * requests_per_second
+        
+        print(f"✅ {request_count} requests at {achieved_rate:.1f} req/s "
+              f"against a budget of {requests_per_second} req/s")
+    
+    @pytest.mark.slow
+    def test_listing_parser_speed(self):
+        """Benchmark the lxml listing parser against the old page-wide regex sweep on 1-3 MB pages"""
+        import random
+        import re
+        from services.listing_parser import parse_allegro_listing
+        
+        fixture = (Path(__file__).parent.parent / "data" / "allegro_listing.html").read_text(encoding="utf-8")
+        head, rest = fixture.split("<main>", 1)
+        offers_html = rest[:rest.index("</section>")]
+        
+        def listing_page(size_bytes):
+            # Real listing pages carry large inline state and markup around ~60 offers
+            rnd = random.Random(size_bytes)
+            state = ",".join(f'"k{i}":{rnd.randint(0, 10**6)}' for i in range(size_bytes // 40))
+            filler = "".join(f'<div class="m{i % 50}">{rnd.randint(1, 999)} osób kupiło</div>'
+                             for i in range(size_bytes // 80))
+            return (head + f"<script>window.__state__ = {{{state}}};</script><main>"
+                    + offers_html * 15 + filler + "</section></main></body></html>")
+        
+        old_patterns = [
+            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*PLN',
+            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*zł',
+            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*€',
+            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)\s*\$',
+            r'(\d+(?:\s?\d{3})*(?:[,.]\d{2})?)'
+        ]
+        
+        def regex_sweep(html):
+            prices = []
+            for pattern in old_patterns:
+                for match in re.findall(pattern, html):
+                    try:
+                        price = float(match.replace(' ', '').replace(',', '.'))
+                    except ValueError:
+                        continue
+                    if 1 <= price <= 100000:
+                        prices.append(price)
+            return prices
+        
+        for size_mb in (1, 2, 3):
+            html = listing_page(size_mb * 1_000_000)
+            
+            start_time = time.perf_counter()
+            regex_prices = regex_sweep(html)
+            regex_time = time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
+            offers = parse_allegro_listing(html)
+            parser_time = time.perf_counter() - start_time
+            
+            assert len(offers) == 4 * 15
+            assert parser_time < regex_time
+            
+            print(f"  {len(html) / 1e6:.1f}MB: regex {regex_time * 1000:.0f}ms ({len(regex_prices)} prices), "
+                  f"lxml {parser_time * 1000:.0f}ms ({len(offers)} offers)")
+        
+        print("✅ Listing parser reads only offer nodes")
+    
+    @pytest.mark.slow
+    def test_off_loop_parsing_latency(self):
+        """Benchmark event loop responsiveness while concurrent scrapes parse large pages"""
+        from tests.test_price_collector import ALLEGRO_HTML, LocalMarket
+        
+        head, rest = ALLEGRO_HTML.split("<main>", 1)
+        offers_html = rest[:rest.index("</section>")]
+        filler = "".join(f'<div class="m{i % 50}">{i} osób kupiło</div>' for i in range(40_000))
+        page = head + "<main>" + offers_html * 15 + filler + "</section></main></body></html>"
+        
+        async def scrape_all(parse_workers):
+            async with LocalMarket(page) as market:
+                collector = PriceCollector(requests_per_second=0, parse_workers=parse_workers)
+                collector.allegro_url = market.url
+                max_lag = 0.0
+                running = True
+                
+                async def ticker():
+                    nonlocal max_lag
+                    while running:
+                        start_time = time.perf_counter()
+                        await asyncio.sleep(0.005)
+                        max_lag = max(max_lag, time.perf_counter() - start_time - 0.005)
+                
+                ticker_task = asyncio.ensure_future(ticker())
+                start_time = time.perf_counter()
+                results = await asyncio.gather(*[
+                    collector._scrape_allegro_search(f"produkt {i}", 100) for i in range(12)
+                ])
+                elapsed = time.perf_counter() - start_time
+                running = False
+                await ticker_task
+                stats = collector.get_pipeline_stats()
+                await collector.close()
+                
+                assert all(len(prices) == 60 for prices in results)
+                return elapsed, max_lag, stats
+        
+        inline_time, inline_lag, _ = asyncio.run(scrape_all(0))
+        pooled_time, pooled_lag, stats = asyncio.run(scrape_all(2))
+        
+        assert pooled_lag < inline_lag
+        
+        print(f"✅ 12 scrapes of {len(page) / 1e6:.1f}MB pages: inline {inline_time:.2f}s with "
+              f"{inline_lag * 1000:.0f}ms max loop stall, pooled {pooled_time:.2f}s with "
+              f"{pooled_lag * 1000:.0f}ms (peak parse queue {stats['max_parse_queue_depth']})")
+    
+    def test_streaming_listing_fetch(self):
+        """Benchmark time-to-result and bytes read for streamed listing pages that stop early"""
+        from services.listing_parser import parse_allegro_listing
+        from tests.test_price_collector import ALLEGRO_HTML, LocalMarket
+        
+        head, rest = ALLEGRO_HTML.split("<main>", 1)
+        offers_html = rest[:rest.index("</section>")]
+        filler = "".join(f'<div class="m{i % 50}">{i} osób kupiło</div>' for i in range(20))
+        page = head + "<main>" + (offers_html + filler * 40) * 40 + "</section></main></body></html>"
+        page_bytes = len(page.encode("utf-8"))
+        max_results = 10
+        
+        async def run():
+            async with LocalMarket(page) as market:
+                collector = PriceCollector(requests_per_second=0, parse_workers=1)
+                
+                start_time = time.perf_counter()
+                for _ in range(5):
+                    html = await collector._fetch_html(market.url, {})
+                    whole_offers = parse_allegro_listing(html)[:max_results]
+                whole_time = (time.perf_counter() - start_time) / 5
+                
+                start_time = time.perf_counter()
+                for _ in range(5):
+                    streamed_offers = await collector._fetch_listing(market.url, {}, max_offers=max_results)
+                streamed_time = (time.perf_counter() - start_time) / 5
+                
+                stats = collector.get_pipeline_stats()
+                await collector.close()
+                return whole_offers, whole_time, streamed_offers, streamed_time, stats
+        
+        whole_offers, whole_time, streamed_offers, streamed_time, stats = asyncio.run(run())
+        streamed_bytes = stats['bytes_received'] / 5
+        
+        assert streamed_offers == whole_offers
+        assert stats['pages_stopped_early'] == 5
+        assert streamed_bytes < page_bytes / 2
+        assert streamed_time < whole_time
+        
+        print(f"✅ First {max_results} offers of a {page_bytes / 1e6:.1f}MB page: whole page "
+              f"{whole_time * 1000:.0f}ms, streamed {streamed_time * 1000:.0f}ms reading "
+              f"{streamed_bytes / 1e3:.0f}KB")
+    
+    def test_price_cache_speed(self):
+        """Benchmark repeated price collection cold, from fresh cache and from stale cache"""
+        from tests.test_price_collector import LocalMarket
+        
+        product_names = [f"Produkt testowy {i}" for i in range(20)]
+        
+        async def run():
+            async with LocalMarket() as market:
+                collector = PriceCollector(requests_per_second=0)
+                collector.allegro_url = market.url
+                timings = {}
+                
+                start_time = time.perf_counter()
+                cold = await collector.collect_prices_for_products(product_names, 5)
+                timings['cold'] = time.perf_counter() - start_time
+                cold_requests = market.requests
+                
+                start_time = time.perf_counter()
+                warm = await collector.collect_prices_for_products(product_names, 5)
+                timings['warm'] = time.perf_counter() - start_time
+                warm_requests = market.requests - cold_requests
+                
+                for name in product_names:
+                    key = collector._price_cache_key(name, 5)
+                    entry = cache_manager.get(key, namespace='prices')
+                    cache_manager.set(key, dict(entry, refresh_after=0), namespace='prices')
+                
+                start_time = time.perf_counter()
+                stale = await collector.collect_prices_for_products(product_names, 5)
+                timings['stale'] = time.perf_counter() - start_time
+                await asyncio.gather(*collector.refresh_tasks)
+                refresh_requests = market.requests - cold_requests
+                
+                await collector.close()
+                return cold, warm, stale, timings, warm_requests, refresh_requests
+        
+        cold, warm, stale, timings, warm_requests, refresh_requests = asyncio.run(run())
+        
+        assert warm.keys() == stale.keys() == cold.keys()
+        assert all(prices and [p.price for p in prices] == [p.price for p in cold[name]]
+                   for name, prices in warm.items())
+        assert warm_requests == 0
+        assert refresh_requests == 2 * len(product_names)
+        assert timings['warm'] < timings['cold'] / 5
+        assert timings['stale'] < timings['cold'] / 5
+        
+        print(f"✅ {len(product_names)} products: cold {timings['cold'] * 1000:.0f}ms, "
+              f"cached {timings['warm'] * 1000:.1f}ms, stale (refreshing) {timings['stale'] * 1000:.1f}ms")
+    
+    @pytest.mark.slow
+    def test_hedged_request_tail_latency(self):
+        """Benchmark scrape tail latency against a source where every fifth response stalls"""
+        from tests.test_price_collector import LocalMarket
+        
+        stall_seconds = 0.5
+        
+        async def every_fifth_stalls(number):
+            if number % 5 == 0:
+                await asyncio.sleep(stall_seconds)
+            return None
+        
+        async def scrape_latencies(hedge_delay):
+            async with LocalMarket(behaviour=every_fifth_stalls) as market:
+                collector = PriceCollector(requests_per_second=0, hedge_delay=hedge_delay)
+                collector.allegro_url = market.url
+                latencies = []
+                for i in range(20):
+                    start_time = time.perf_counter()
+                    prices = await collector._scrape_allegro_search(f"produkt {i}", 10)
+                    latencies.append(time.perf_counter() - start_time)
+                    assert len(prices) == 4
+                stats = collector.get_resilience_stats()
+                await collector.close()
+                return sorted(latencies), stats
+        
+        plain, _ = asyncio.run(scrape_latencies(0))
+        hedged, stats = asyncio.run(scrape_latencies(0.05))
+        
+        def p95(latencies):
+            return latencies[int(len(latencies) * 0.95) - 1]
+        
+        assert stats['hedges'] >= 4
+        assert stats['hedge_wins'] == stats['hedges']
+        assert plain[-1] >= stall_seconds
+        assert hedged[-1] < stall_seconds / 2
+        
+        print(f"✅ Scrape latency with 1 in 5 responses stalled {stall_seconds * 1000:.0f}ms: "
+              f"p95 {p95(plain) * 1000:.0f}ms / max {plain[-1] * 1000:.0f}ms unhedged, "
+              f"p95 {p95(hedged) * 1000:.0f}ms / max {hedged[-1] * 1000:.0f}ms hedged")
+    
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
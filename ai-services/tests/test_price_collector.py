@@ -0,0 +1,492 @@
+"""
+Tests for Price Collector
+"""
+
+import asyncio
+import pytest
+import sys
+import threading
+from pathlib import Path
+from aiohttp import web
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from datetime import datetime
+from services import price_collector
+from services.cache_manager import cache_manager
+from services.price_collector import PriceCollector, PriceData
+from services.rate_limiter import RateLimiter
+
+ALLEGRO_HTML = (Path(__file__).parent.parent / "data" / "allegro_listing.html").read_text(encoding="utf-8")
+
+class LocalMarket:
+    """Local stand-in for the scraped market sites"""
+    
+    def __init__(self, html: str = ALLEGRO_HTML, behaviour=None):
+        self.html = html
+        self.behaviour = behaviour  # async (request number) -> response to send instead, or None
+        self.requests = 0
+        self.peers = set()
+        self.runner = None
+        self.url = None
+    
+    async def listing(self, request):
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        if self.behaviour is not None:
+            response = await self.behaviour(self.requests)
+            if response is not None:
+                return response
+        return web.Response(text=self.html, content_type="text/html")
+    
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/listing", self.listing)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/listing"
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+class TestPriceCollector:
+    """Test cases for PriceCollector"""
+    
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.collector = PriceCollector(requests_per_second=0)
+    
+    def test_requests_reuse_pooled_connections(self):
+        """Test that sequential requests go over one kept-alive connection"""
+        async def run():
+            async with LocalMarket() as market:
+                self.collector.allegro_url = market.url
+                results = [await self.collector._scrape_allegro_search("iphone 15", 10) for _ in range(5)]
+                await self.collector.close()
+                return market, results
+        
+        market, results = asyncio.run(run())
+        assert market.requests == 5
+        assert len(market.peers) == 1
+        assert all(results)
+    
+    def test_session_lifecycle(self):
+        """Test that start is idempotent and close releases the session"""
+        async def run():
+            session = await self.collector.start()
+            assert await self.collector.start() is session
+            await self.collector.close()
+            assert session.closed and self.collector.session is None
+            await self.collector.close()
+        
+        asyncio.run(run())
+    
+    def test_session_follows_event_loop(self):
+        """Test that a collector reused across event loops gets a fresh session"""
+        sessions = []
+        
+        async def run():
+            sessions.append(await self.collector.start())
+        
+        asyncio.run(run())
+        asyncio.run(run())
+        assert sessions[0] is not sessions[1]
+        asyncio.run(self.collector.close())
+    
+    def test_failed_status_returns_no_prices(self):
+        """Test that non-200 responses are reported as no prices"""
+        async def run():
+            async with LocalMarket() as market:
+                self.collector.allegro_url = market.url.replace("/listing", "/missing")
+                prices = await self.collector._scrape_allegro_search("iphone 15", 10)
+                await self.collector.close()
+                return prices
+        
+        assert asyncio.run(run()) == []
+        assert self.collector.get_resilience_stats()['retries'] == 0
+    
+    def test_transient_failure_is_retried(self):
+        """Test that a 503 is retried after a backoff and the retry's prices are returned"""
+        collector = PriceCollector(requests_per_second=0, retry_backoff=0.01)
+        
+        async def unavailable_once(number):
+            return web.Response(status=503) if number == 1 else None
+        
+        async def run():
+            async with LocalMarket(behaviour=unavailable_once) as market:
+                collector.allegro_url = market.url
+                prices = await collector._scrape_allegro_search("iphone 15", 10)
+                await collector.close()
+                return market, prices
+        
+        market, prices = asyncio.run(run())
+        assert len(prices) == 4
+        assert market.requests == 2
+        stats = collector.get_resilience_stats()
+        assert stats['retries'] == 1
+        (breaker,) = stats['breakers'].values()
+        assert breaker['state'] == "closed"
+    
+    def test_failing_source_trips_circuit_breaker(self):
+        """Test that a source failing repeatedly is skipped without further requests"""
+        collector = PriceCollector(requests_per_second=0, max_retries=1, retry_backoff=0.01,
+                                   breaker_failures=3, breaker_reset=60)
+        
+        async def unavailable(number):
+            return web.Response(status=502)
+        
+        async def run():
+            async with LocalMarket(behaviour=unavailable) as market:
+                collector.allegro_url = market.url
+                results = [await collector._scrape_allegro_search(f"produkt {i}", 10) for i in range(4)]
+                await collector.close()
+                return market, results
+        
+        market, results = asyncio.run(run())
+        assert results == [[], [], [], []]
+        assert market.requests == 3
+        (breaker,) = collector.get_resilience_stats()['breakers'].values()
+        assert breaker['state'] == "open"
+        assert breaker['rejected'] == 3
+    
+    def test_rejected_status_trips_circuit_breaker(self):
+        """Test that statuses which are not retried still count as source failures"""
+        collector = PriceCollector(requests_per_second=0, breaker_failures=3, breaker_reset=60)
+
+        async def forbidden(number):
+            return web.Response(status=403)
+
+        async def run():
+            async with LocalMarket(behaviour=forbidden) as market:
+                collector.allegro_url = market.url
+                results = [await collector._scrape_allegro_search(f"produkt {i}", 10) for i in range(4)]
+                await collector.close()
+                return market, results
+
+        market, results = asyncio.run(run())
+        assert results == [[], [], [], []]
+        assert market.requests == 3
+        stats = collector.get_resilience_stats()
+        assert stats['retries'] == 0
+        (breaker,) = stats['breakers'].values()
+        assert breaker['state'] == "open"
+        assert breaker['rejected'] == 1
+
+    def test_retries_stay_within_scrape_deadline(self):
+        """Test that a source slower than the timeout is given up on at the scrape deadline"""
+        collector = PriceCollector(requests_per_second=0, request_timeout=0.2, max_retries=5,
+                                   retry_backoff=0.01, scrape_deadline=0.35)
+
+        async def stalls(number):
+            await asyncio.sleep(5)
+            return None
+
+        async def run():
+            async with LocalMarket(behaviour=stalls) as market:
+                collector.allegro_url = market.url
+                start_time = asyncio.get_running_loop().time()
+                prices = await collector._scrape_allegro_search("iphone 15", 10)
+                elapsed = asyncio.get_running_loop().time() - start_time
+                await collector.close()
+                return market, prices, elapsed
+
+        market, prices, elapsed = asyncio.run(run())
+        assert prices == []
+        # A full timeout, then a retry cut short by the deadline, and no more
+        assert market.requests == 2
+        assert collector.get_resilience_stats()['retries'] == 1
+        assert elapsed < 1
+
+    def test_unexpected_error_during_probe_releases_circuit(self):
+        """Test that a half-open probe failing on our side does not leave the circuit stuck"""
+        collector = PriceCollector(requests_per_second=0, max_retries=0,
+                                   breaker_failures=1, breaker_reset=0.05)
+        fetch_listing = collector._fetch_listing
+        probes = []
+        
+        async def unavailable_once(number):
+            return web.Response(status=503) if number == 1 else None
+        
+        async def failing_probe(*args, **kwargs):
+            probes.append(args)
+            raise ValueError("parser bug")
+        
+        async def run():
+            async with LocalMarket(behaviour=unavailable_once) as market:
+                collector.allegro_url = market.url
+                await collector._scrape_allegro_search("iphone 15", 10)
+                await asyncio.sleep(0.06)
+                
+                collector._fetch_listing = failing_probe
+                failed = await collector._scrape_allegro_search("iphone 15", 10)
+                collector._fetch_listing = fetch_listing
+                
+                recovered = await collector._scrape_allegro_search("iphone 15", 10)
+                await collector.close()
+                return failed, recovered
+        
+        failed, recovered = asyncio.run(run())
+        assert failed == []
+        assert len(probes) == 1
+        assert len(recovered) == 4
+        (breaker,) = collector.get_resilience_stats()['breakers'].values()
+        assert breaker['state'] == "closed"
+    
+    def test_unknown_charset_falls_back(self):
+        """Test that a response declaring an unknown charset is still parsed"""
+        async def unknown_charset(number):
+            return web.Response(body=ALLEGRO_HTML.encode("utf-8"),
+                                headers={"Content-Type": "text/html; charset=x-unknown"})
+        
+        async def run():
+            results = []
+            for collector in (PriceCollector(requests_per_second=0),
+                              PriceCollector(requests_per_second=0, parse_processes=True)):
+                async with LocalMarket(behaviour=unknown_charset) as market:
+                    collector.allegro_url = market.url
+                    results.append(await collector._scrape_allegro_search("iphone 15", 10))
+                    await collector.close()
+            return results
+        
+        streamed, whole = asyncio.run(run())
+        assert [price.price for price in streamed] == [3499.0, 4199.0, 2849.99, 49.9]
+        assert [price.price for price in whole] == [price.price for price in streamed]
+    
+    def test_slow_request_is_hedged(self):
+        """Test that a stalled request is duplicated and the faster copy's prices returned"""
+        collector = PriceCollector(requests_per_second=0, hedge_delay=0.05)
+        
+        async def first_stalls(number):
+            if number == 1:
+                await asyncio.sleep(2)
+            return None
+        
+        async def run():
+            async with LocalMarket(behaviour=first_stalls) as market:
+                collector.allegro_url = market.url
+                start_time = asyncio.get_running_loop().time()
+                prices = await collector._scrape_allegro_search("iphone 15", 10)
+                elapsed = asyncio.get_running_loop().time() - start_time
+                await collector.close()
+                return prices, elapsed
+        
+        prices, elapsed = asyncio.run(run())
+        assert len(prices) == 4
+        assert elapsed < 1
+        stats = collector.get_resilience_stats()
+        assert stats['hedges'] == 1
+        assert stats['hedge_wins'] == 1
+
+    def test_concurrent_collections_share_source_budget(self):
+        """Test that requests from concurrent collections are paced together per host"""
+        collector = PriceCollector(requests_per_second=20, burst=1)
+        # A frozen clock keeps the reservations independent of scheduling delays
+        collector.rate_limiter = RateLimiter(20, 1, clock=lambda: 0.0)
+        
+        async def run():
+            async with LocalMarket() as market:
+                collector.allegro_url = market.url
+                results = await asyncio.gather(*[
+                    collector._scrape_allegro_search(f"produkt {i}", 10) for i in range(6)
+                ])
+                await collector.close()
+                return results
+        
+        assert all(asyncio.run(run()))
+        (stats,) = collector.rate_limiter.get_stats().values()
+        assert stats['requests'] == 6
+        assert stats['delayed'] == 5
+        # Each queued request waits one more interval: 0.05 + 0.10 + ... + 0.25
+        assert stats['waited_seconds'] == pytest.approx(0.75)
+    
+    def test_listing_prices_carry_offer_details(self):
+        """Test that scraped prices come from offers only, with their title and URL"""
+        prices = self.collector._parse_allegro_html(ALLEGRO_HTML, "iphone 15")
+        
+        assert [price.price for price in prices] == [3499.0, 4199.0, 2849.99, 49.9]
+        assert prices[0].title == "Apple iPhone 15 128GB Czarny"
+        assert prices[0].url.startswith("https://allegro.pl/oferta/")
+        assert prices[0].seller_rating == 99.4
+        assert all(price.product_name == "iphone 15" for price in prices)
+    
+    def test_parsing_runs_in_worker_pool(self):
+        """Test that pages are parsed off the event loop and pipeline metrics are kept"""
+        collector = PriceCollector(requests_per_second=0, parse_workers=2)
+        parse_threads = []
+        feed = price_collector.AllegroListingParser.feed
+        
+        def tracked_feed(parser, data):
+            parse_threads.append(threading.current_thread().name)
+            return feed(parser, data)
+        
+        async def run():
+            async with LocalMarket() as market:
+                collector.allegro_url = market.url
+                results = await asyncio.gather(*[
+                    collector._scrape_allegro_search(f"produkt {i}", 10) for i in range(4)
+                ])
+                await collector.close()
+                return results
+        
+        price_collector.AllegroListingParser.feed = tracked_feed
+        try:
+            results = asyncio.run(run())
+        finally:
+            price_collector.AllegroListingParser.feed = feed
+        
+        assert all(len(prices) == 4 for prices in results)
+        assert parse_threads
+        assert all(name.startswith("price_parse") for name in parse_threads)
+        
+        stats = collector.get_pipeline_stats()
+        assert stats['fetches'] == 4 and stats['parse_tasks'] >= 4
+        assert stats['fetches_in_flight'] == 0 and stats['parses_pending'] == 0
+        assert stats['parse_queue_depth'] == 0
+        assert stats['bytes_received'] == 4 * len(ALLEGRO_HTML.encode("utf-8"))
+        assert collector.parse_lanes == []
+    
+    def test_streaming_stops_at_max_results(self):
+        """Test that reading stops once enough offers have been parsed"""
+        page = ALLEGRO_HTML.replace("</section>", ALLEGRO_HTML.split("<main>")[1].split("</section>")[0] * 200 + "</section>")
+        collector = PriceCollector(requests_per_second=0, parse_workers=0, stream_chunk_bytes=4096)
+        
+        async def run():
+            async with LocalMarket(page) as market:
+                collector.allegro_url = market.url
+                prices = await collector._scrape_allegro_search("iphone 15", 6)
+                await collector.close()
+                return prices
+        
+        prices = asyncio.run(run())
+        stats = collector.get_pipeline_stats()
+        
+        assert len(prices) == 6
+        assert stats['pages_stopped_early'] == 1
+        assert stats['bytes_received'] < len(page.encode("utf-8")) / 10
+    
+    def test_streaming_respects_byte_cap(self):
+        """Test that pages are cut off at max_page_bytes, keeping offers found before it"""
+        offers_html = ALLEGRO_HTML.split("<main>")[1].split("</section>")[0]
+        page = ALLEGRO_HTML.replace("</section>", offers_html * 100 + "</section>")
+        
+        for parse_processes in (False, True):
+            collector = PriceCollector(requests_per_second=0, parse_workers=1, parse_processes=parse_processes,
+                                       max_page_bytes=16 * 1024, stream_chunk_bytes=4096)
+            
+            async def run():
+                async with LocalMarket(page) as market:
+                    collector.allegro_url = market.url
+                    offers = await collector._fetch_listing(market.url, {})
+                    await collector.close()
+                    return offers
+            
+            offers = asyncio.run(run())
+            stats = collector.get_pipeline_stats()
+            
+            assert stats['pages_truncated'] == 1
+            assert 16 * 1024 <= stats['bytes_received'] < 20 * 1024
+            assert 4 <= len(offers) < 4 * 100
+            assert offers[0].title == "Apple iPhone 15 128GB Czarny"
+    
+class TestPriceCache:
+    """Test cases for the price cache"""
+    
+    def setup_method(self):
+        """Set up test fixtures"""
+        cache_manager.clear()
+        self.collector = PriceCollector(cache_ttl=900, stale_ttl=3600, negative_ttl=60)
+        self.collections = []
+        self.failing = False
+        self.collector._collect_prices_for_product = self.collect
+    
+    async def collect(self, product_name, max_results):
+        """Stand-in collection that counts calls"""
+        self.collections.append(product_name)
+        await asyncio.sleep(0.01)
+        if self.failing:
+            return []
+        return [PriceData(product_name, 100.0 + len(self.collections), "PLN", "test", "", datetime.now())]
+    
+    def expire(self, product_name, max_results=5):
+        """Make a cached entry due for refresh"""
+        key = self.collector._price_cache_key(product_name, max_results)
+        entry = cache_manager.get(key, namespace='prices')
+        cache_manager.set(key, dict(entry, refresh_after=0), ttl=60, namespace='prices')
+    
+    def test_fresh_prices_are_served_from_cache(self):
+        """Test that repeated and differently written queries reuse one collection"""
+        async def run():
+            first = await self.collector.collect_prices_for_product("iPhone 15", 5)
+            second = await self.collector.collect_prices_for_product("iphone-15 ", 5)
+            return first, second
+        
+        first, second = asyncio.run(run())
+        # Collected with the normalized query the entry is keyed on
+        assert self.collections == ["iphone 15"]
+        assert [p.price for p in first] == [p.price for p in second] == [101.0]
+    
+    def test_stale_prices_are_served_while_refreshing(self):
+        """Test that stale entries return at once and are refreshed once in the background"""
+        async def run():
+            await self.collector.collect_prices_for_product("iPhone 15", 5)
+            self.expire("iPhone 15")
+            stale = await asyncio.gather(*[
+                self.collector.collect_prices_for_product("iPhone 15", 5) for _ in range(3)
+            ])
+            await asyncio.gather(*self.collector.refresh_tasks)
+            fresh = await self.collector.collect_prices_for_product("iPhone 15", 5)
+            return stale, fresh
+        
+        stale, fresh = asyncio.run(run())
+        assert all(prices[0].price == 101.0 for prices in stale)
+        assert fresh[0].price == 102.0
+        assert len(self.collections) == 2
+        assert self.collector.get_cache_stats()['stale_served'] == 3
+    
+    def test_failures_are_negative_cached(self):
+        """Test that a failed collection is not retried until the negative TTL passes"""
+        self.failing = True
+        
+        async def run():
+            results = [await self.collector.collect_prices_for_product("Nieznany produkt", 5) for _ in range(3)]
+            self.expire("Nieznany produkt")
+            self.failing = False
+            return results
+        
+        assert asyncio.run(run()) == [[], [], []]
+        assert len(self.collections) == 1
+        assert self.collector.get_cache_stats()['negative_hits'] == 2
+    
+    def test_failed_refresh_keeps_stale_prices(self):
+        """Test that a failing source does not replace prices that are merely stale"""
+        async def run():
+            await self.collector.collect_prices_for_product("iPhone 15", 5)
+            self.expire("iPhone 15")
+            self.failing = True
+            await self.collector.collect_prices_for_product("iPhone 15", 5)
+            await asyncio.gather(*self.collector.refresh_tasks)
+            return await self.collector.collect_prices_for_product("iPhone 15", 5)
+        
+        prices = asyncio.run(run())
+        assert prices[0].price == 101.0
+        assert len(self.collections) == 2
+        assert self.collector.get_cache_stats()['refresh_failures'] == 1
+    
+    def test_zero_ttl_disables_cache(self):
+        """Test that cache_ttl=0 collects every time"""
+        self.collector.cache_ttl = 0
+        
+        async def run():
+            for _ in range(2):
+                await self.collector.collect_prices_for_product("iPhone 15", 5)
+        
+        asyncio.run(run())
+        assert len(self.collections) == 2
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -10,6 +10,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from services.product_normalizer import ProductNormalizer
+from services.cache_manager import cache_manager
 
 class TestProductNormalizer:
     """Test cases for ProductNormalizer"""
@@ -120,6 +121,69 @@ class TestProductNormalizer:
         assert "Odzież/Obuwie" in categories
         assert "Kosmetyki/Twarz" in categories
 
+    def test_batch_normalization(self):
+        """Test batch normalization preserves order and matches single calls"""
+        products = [
+            "iPhone 15 Pro Max 256GB Space Black",
+            "Nike Air Max 270 React White Black",
+            "Random Product Name",
+            "iPhone 15 Pro Max 256GB Space Black",
+        ]
+        
+        cache_manager.clear()
+        batch_results = self.normalizer.normalize_products(products, batch_size=2)
+        
+        assert [r["original_name"] for r in batch_results] == products
+        for product, result in zip(products, batch_results):
+            assert cache_manager.get_cached_product_analysis(product, "") == result
+        
+        cache_manager.clear()
+        single_results = [self.normalizer.normalize_product(p) for p in products]
+        assert batch_results == single_results
+    
+    def test_batch_normalization_pipes_unmatched_brands(self, monkeypatch):
+        """Test that texts needing a doc are tokenized together with nlp.pipe"""
+        piped = []
+        pipe = self.normalizer.nlp.pipe
+        
+        def spy_pipe(texts, **kwargs):
+            texts = list(texts)
+            piped.append((texts, kwargs))
+            return pipe(texts, **kwargs)
+        
+        monkeypatch.setattr(self.normalizer.nlp, "pipe", spy_pipe)
+        products = [
+            "iPhone 15 Pro Max 256GB Space Black",
+            "Random Product Name",
+            "bezmarkowy kabel usb",
+            "Drewniany Stolik Kawowy",
+        ]
+        
+        cache_manager.clear()
+        self.normalizer.normalize_products(products, batch_size=2)
+        
+        assert piped == [(["Random Product Name", "Drewniany Stolik Kawowy"],
+                          {"batch_size": 2, "n_process": 1})]
+
+    def test_capitalized_brand_fallback(self):
+        """Test that brands the keyword stage misses are found among capitalized words"""
+        # Variations capitalize brand names, so only the fallback sees them
+        products = {
+            "Huawei P50": "Huawei",
+            "Adidas Superstar": "Adidas",
+            "Telefon Samsung A52": "Samsung",
+            "Buty Nike Pegasus": "Nike",
+            "Drewniany Stolik Kawowy": "Unknown",
+        }
+
+        cache_manager.clear()
+        batch_results = self.normalizer.normalize_products(list(products))
+        cache_manager.clear()
+        single_results = [self.normalizer.normalize_product(p) for p in products]
+
+        assert [r["brand"] for r in batch_results] == list(products.values())
+        assert [r["brand"] for r in single_results] == list(products.values())
+
 if __name__ == "__main__":
     pytest.main([__file__])
 
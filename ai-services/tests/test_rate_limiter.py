@@ -0,0 +1,62 @@
+"""
+Tests for Rate Limiter
+"""
+
+import asyncio
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.rate_limiter import TokenBucket, RateLimiter
+
+class TestTokenBucket:
+    """Test cases for TokenBucket"""
+    
+    def test_burst_is_free_then_paced(self):
+        """Test that idle tokens are spent at once and later requests queue at the rate"""
+        bucket = TokenBucket(rate=10, burst=3)
+        delays = [bucket.reserve() for _ in range(6)]
+        
+        assert delays[:3] == [0.0, 0.0, 0.0]
+        assert delays[3:] == pytest.approx([0.1, 0.2, 0.3], abs=0.01)
+        assert bucket.get_stats()['delayed'] == 3
+    
+    def test_zero_rate_disables_limiting(self):
+        """Test that rate 0 never delays"""
+        bucket = TokenBucket(rate=0)
+        assert all(bucket.reserve() == 0.0 for _ in range(100))
+    
+    def test_concurrent_acquires_hold_the_rate(self):
+        """Test that concurrent callers together stay within the budget"""
+        # A frozen clock keeps the reservations independent of scheduling delays
+        bucket = TokenBucket(rate=100, burst=1, clock=lambda: 0.0)
+        
+        async def run():
+            start_time = time.monotonic()
+            await asyncio.gather(*[bucket.acquire() for _ in range(21)])
+            return time.monotonic() - start_time
+        
+        elapsed = asyncio.run(run())
+        assert elapsed >= 0.18
+        stats = bucket.get_stats()
+        assert stats['delayed'] == 20
+        assert stats['waited_seconds'] == pytest.approx(sum(0.01 * n for n in range(1, 21)))
+
+class TestRateLimiter:
+    """Test cases for RateLimiter"""
+    
+    def test_hosts_have_separate_budgets(self):
+        """Test that one busy host does not delay another"""
+        limiter = RateLimiter(rate=1, burst=1)
+        
+        assert limiter.bucket("allegro.pl").reserve() == 0.0
+        assert limiter.bucket("allegro.pl").reserve() > 0
+        assert limiter.bucket("ceneo.pl").reserve() == 0.0
+        assert set(limiter.get_stats()) == {"allegro.pl", "ceneo.pl"}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
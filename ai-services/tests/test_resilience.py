@@ -0,0 +1,156 @@
+"""
+Tests for Resilience
+"""
+
+import asyncio
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.resilience import CircuitBreaker, backoff_delay, hedged
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker"""
+
+    def test_opens_after_consecutive_failures(self):
+        """Test that the circuit opens at the threshold and then rejects calls"""
+        breaker = CircuitBreaker("allegro.pl", failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == "closed"
+
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+        assert breaker.get_stats()['rejected'] == 1
+
+    def test_success_resets_failure_count(self):
+        """Test that only consecutive failures count"""
+        breaker = CircuitBreaker("allegro.pl", failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        assert breaker.state == "closed"
+        assert breaker.get_stats()['consecutive_failures'] == 1
+
+    def test_half_open_lets_one_probe_through(self):
+        """Test that after the reset timeout a single probe decides the state"""
+        breaker = CircuitBreaker("allegro.pl", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow()
+        assert breaker.state == "half_open"
+        assert not breaker.allow()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        """Test that a failing probe opens the circuit for another reset timeout"""
+        breaker = CircuitBreaker("allegro.pl", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        assert breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+        assert breaker.get_stats()['times_opened'] == 2
+
+    def test_released_probe_can_be_retaken(self):
+        """Test that a cancelled probe does not leave the circuit stuck half-open"""
+        breaker = CircuitBreaker("allegro.pl", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.allow()
+
+        breaker.release()
+        assert breaker.allow()
+
+class TestBackoff:
+    """Test cases for backoff_delay"""
+
+    def test_delay_grows_within_cap(self):
+        """Test that delays stay within the doubling bound and the cap"""
+        for attempt in range(8):
+            delays = [backoff_delay(attempt, 0.1, 1.0) for _ in range(200)]
+            assert all(0 <= delay <= min(1.0, 0.1 * 2 ** attempt) for delay in delays)
+
+        assert max(backoff_delay(5, 0.1, 1.0) for _ in range(200)) > 0.5
+
+class TestHedged:
+    """Test cases for hedged"""
+
+    def test_fast_call_is_not_hedged(self):
+        """Test that a call finishing before the delay runs once"""
+        calls = []
+        stats = {}
+
+        async def call():
+            calls.append(1)
+            return "ok"
+
+        assert asyncio.run(hedged(call, 0.05, stats)) == "ok"
+        assert len(calls) == 1
+        assert stats == {}
+
+    def test_slow_call_loses_to_hedge(self):
+        """Test that a duplicate wins over a stalled call, which is cancelled"""
+        delays = [1.0, 0.01]
+        cancelled = []
+        stats = {}
+
+        async def call():
+            delay = delays.pop(0)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+            return delay
+
+        async def run():
+            start_time = time.monotonic()
+            result = await hedged(call, 0.05, stats)
+            return result, time.monotonic() - start_time
+
+        result, elapsed = asyncio.run(run())
+        assert result == 0.01
+        assert elapsed < 0.5
+        assert cancelled == [1.0]
+        assert stats == {'hedges': 1, 'hedge_wins': 1}
+
+    def test_error_is_raised_when_both_fail(self):
+        """Test that the error surfaces only after both attempts failed"""
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            raise ConnectionError("refused")
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(hedged(call, 0.01))
+        assert len(calls) == 2
+
+    def test_early_error_is_not_hedged(self):
+        """Test that a call failing before the delay is not duplicated"""
+        calls = []
+
+        async def call():
+            calls.append(1)
+            raise ConnectionError("refused")
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(hedged(call, 0.05))
+        assert len(calls) == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__])
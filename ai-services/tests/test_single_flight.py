@@ -0,0 +1,165 @@
+"""
+Tests for Single Flight
+"""
+
+import asyncio
+import pytest
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.single_flight import SingleFlight, AsyncSingleFlight
+from services.product_normalizer import ProductNormalizer
+from services.price_collector import PriceCollector, PriceData
+from services.cache_manager import cache_manager
+
+class TestSingleFlight:
+    """Test cases for SingleFlight"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.group = SingleFlight("test")
+        self.calls = 0
+
+    def slow_compute(self, value):
+        """Count calls and take long enough for callers to overlap"""
+        self.calls += 1
+        time.sleep(0.05)
+        return value * 2
+
+    def test_concurrent_callers_share_one_computation(self):
+        """Test that only one caller computes per key"""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: self.group.do("key", self.slow_compute, 21), range(8)))
+
+        assert results == [42] * 8
+        assert self.calls == 1
+        assert self.group.coalesced == 7
+        assert self.group.calls == {}
+
+    def test_different_keys_run_independently(self):
+        """Test that distinct keys are not coalesced"""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: self.group.do(i, self.slow_compute, i), range(4)))
+
+        assert results == [0, 2, 4, 6]
+        assert self.calls == 4
+
+    def test_errors_reach_waiting_callers(self):
+        """Test that the leader's exception is raised for every caller and not remembered"""
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.05)
+            raise ValueError("boom")
+
+        def follower():
+            started.wait()
+            return self.group.do("key", fail)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(self.group.do, "key", fail)
+            waiter = executor.submit(follower)
+            with pytest.raises(ValueError):
+                leader.result()
+            with pytest.raises(ValueError):
+                waiter.result()
+
+        assert self.group.do("key", lambda: "ok") == "ok"
+
+class TestAsyncSingleFlight:
+    """Test cases for AsyncSingleFlight"""
+
+    def test_concurrent_awaiters_share_one_task(self):
+        """Test that only one coroutine runs per key"""
+        group = AsyncSingleFlight("test")
+        calls = []
+
+        async def fetch(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        async def run():
+            return await asyncio.gather(*[group.do("key", fetch, 1) for _ in range(5)])
+
+        assert asyncio.run(run()) == [1] * 5
+        assert calls == [1]
+        assert group.coalesced == 4
+        assert group.tasks == {}
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """Test that the shared task survives one caller going away"""
+        group = AsyncSingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            first = asyncio.ensure_future(group.do("key", fetch))
+            second = asyncio.ensure_future(group.do("key", fetch))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(run()) == "done"
+
+class TestCoalescedServices:
+    """Test coalescing in the services that use it"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        cache_manager.clear()
+
+    def test_concurrent_batches_compute_shared_products_once(self):
+        """Test that overlapping palettes normalize each product once"""
+        normalizer = ProductNormalizer(fast_mode=True)
+        analyzed = []
+        analyze_text = normalizer._analyze_text
+
+        def slow_analyze(product_name, *args):
+            analyzed.append(product_name)
+            time.sleep(0.01)
+            return analyze_text(product_name, *args)
+
+        normalizer._analyze_text = slow_analyze
+        palette = [f"iPhone {i} 128GB Black" for i in range(10)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(normalizer.normalize_products, [palette] * 4))
+
+        assert sorted(analyzed) == sorted(palette)
+        assert all(result == results[0] for result in results)
+
+    def test_concurrent_price_collection_is_coalesced(self):
+        """Test that concurrent requests for one product run a single collection"""
+        collector = PriceCollector()
+        collections = []
+
+        async def collect(product_name, max_results):
+            collections.append(product_name)
+            await asyncio.sleep(0.05)
+            return [PriceData(product_name, 100.0, "PLN", "test", "", datetime.now())]
+
+        collector._collect_prices_for_product = collect
+
+        async def run():
+            return await asyncio.gather(*[
+                collector.collect_prices_for_product("iPhone 15", 5) for _ in range(3)
+            ])
+
+        results = asyncio.run(run())
+        assert collections == ["iphone 15"]
+        assert all(len(prices) == 1 for prices in results)
+        assert results[0] is not results[1]
+
+if __name__ == "__main__":
+    pytest.main([__file__])